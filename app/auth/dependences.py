@@ -1,17 +1,22 @@
-from typing import Optional
+from typing import Iterator, Optional, Tuple
+from functools import lru_cache
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 
-from jose import jwt, JWTError
-
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from starlette.datastructures import Headers
 from fastapi.security.oauth2 import OAuth2PasswordBearer
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.user import models as user_models
-from core.database import get_db
+from core.database import get_db, db_session
+from core.idempotency import idempotency_key
+from core.log import bind
+from core.ratelimit import enforce
+from core.timing import phase
 
 from . import schemas
 
@@ -21,17 +26,32 @@ SECRET_KEY = "YOUR_SECRET_KEY_CHANGE_THIS_IN_PRODUCTION"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 24 * 60
 
-# 密码处理
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
 
+# passlib 与 jose 导入时会加载全部哈希与签名后端（合计约 90ms），推迟到首次使用时在函数内导入，缩短启动时间
+@lru_cache(maxsize=None)
+def pwd_context():
+    """密码处理"""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@lru_cache(maxsize=None)
+def _jose():
+    # 函数内的 from-import 每次调用都要经过导入系统，缓存后只在首次调用时导入
+    from jose import jwt, JWTError
+
+    return jwt, JWTError
+
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 
 async def get_user_by_username(db: AsyncSession, username: str):
@@ -49,6 +69,7 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    jwt, _ = _jose()
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -59,23 +80,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+# 已认证的 (令牌, 用户)，批量请求的子请求携带相同令牌时直接复用，不再重复校验令牌与查询用户
+_shared_user: ContextVar[Optional[Tuple[str, user_models.User]]] = ContextVar("shared_user", default=None)
+
+
+@contextmanager
+def share_current_user(token: str, user: user_models.User) -> Iterator[None]:
+    """在 with 块内（含其中创建的任务）复用已认证的用户，只读取用户的标量属性时可安全跨会话使用"""
+    reset = _shared_user.set((token, user))
+    try:
+        yield
+    finally:
+        _shared_user.reset(reset)
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    shared = _shared_user.get()
+    if shared is not None and shared[0] == token:
+        return shared[1]
+    jwt, JWTError = _jose()
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    with phase("auth"):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = schemas.TokenPayload(sub=username, exp=payload.get("exp"))
+        except JWTError:
             raise credentials_exception
-        token_data = schemas.TokenPayload(sub=username, exp=payload.get("exp"))
-    except JWTError:
-        raise credentials_exception
-    user = await get_user_by_username(db, username=token_data.sub)
+        user = await get_user_by_username(db, username=token_data.sub)
     if user is None:
         raise credentials_exception
+    bind(user_id=user.id)
     return user
 
 
@@ -86,3 +127,34 @@ async def get_current_superuser(current_user: user_models.User = Depends(get_cur
             detail="Not enough permissions"
         )
     return current_user
+
+
+def user_rate_limit(policy_name: str):
+    """按当前用户限流的依赖（策略见 core.ratelimit.RATE_LIMIT_POLICIES），与路由自身的 get_current_user 共享同一次认证"""
+
+    async def dependency(current_user: user_models.User = Depends(get_current_user)) -> None:
+        enforce(policy_name, str(current_user.id))
+
+    return dependency
+
+
+async def idempotent(request: Request, current_user: user_models.User = Depends(get_current_user)) -> None:
+    """按当前用户与请求头 Idempotency-Key 去重的依赖（见 core.idempotency），重试时重放首次执行的响应"""
+    await idempotency_key(request, str(current_user.id))
+
+
+async def is_superuser_request(headers: Headers) -> bool:
+    """根据请求头中的 Bearer 令牌判断是否为超级用户，供中间件等依赖注入之外的场景使用"""
+    jwt, JWTError = _jose()
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return False
+    if username is None:
+        return False
+    async with db_session() as db:
+        user = await get_user_by_username(db, username)
+    return bool(user and user.is_superuser)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import Response
+
+from app.auth.dependences import get_current_user, oauth2_scheme, share_current_user
+from core.log import bind
+from core.timing import TimedRoute
+
+from . import schemas, services
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.post("", response_model=schemas.BatchResponse)
+async def batch(
+    payload: schemas.BatchRequest,
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    current_user=Depends(get_current_user),
+):
+    """
+    在一次往返中执行多个 API 请求
+
+    子请求沿用本请求的令牌，令牌校验与用户查询只执行一次；各子请求照常经过路由上的权限校验与限流。
+    子响应的状态码、响应头与响应体按顺序放在 data 中。
+    """
+    bind(batch=len(payload.requests))
+    with share_current_user(token, current_user):
+        body = await services.BatchService.execute(request, payload.requests)
+    return Response(body, media_type="application/json")
@@ -0,0 +1,31 @@
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+from core.responses import ResponseBase
+
+# 单个批量请求最多包含的子请求数
+BATCH_MAX_REQUESTS = 20
+
+
+class SubRequest(BaseModel):
+    id: Optional[str] = Field(None, max_length=64, description="调用方自定义的编号，原样返回")
+    method: Literal["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str = Field(..., min_length=1, max_length=2048, description="如 /workspaces/1?fields=id,name，可省略 /api/v1 前缀")
+    headers: Dict[str, str] = Field(default_factory=dict, description="附加请求头，认证信息沿用批量请求本身的令牌")
+    body: Optional[Any] = Field(None, description="JSON 请求体")
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest] = Field(..., min_length=1, max_length=BATCH_MAX_REQUESTS)
+
+
+class SubResponse(BaseModel):
+    id: Optional[str] = None
+    status: int
+    headers: Dict[str, str]
+    body: Optional[Any] = None
+    body_encoding: Optional[Literal["base64"]] = None
+
+
+class BatchResponse(ResponseBase[List[SubResponse]]):
+    pass
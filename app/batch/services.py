@@ -0,0 +1,227 @@
+import base64
+import asyncio
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, status
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.admission import AdmissionMiddleware
+from core.idempotency import IdempotencyMiddleware
+from core.log import AccessLogMiddleware
+from core.metrics import MetricsMiddleware
+from core.querylog import QueryLogMiddleware
+from core.responses import dumps
+from core.timing import ServerTimingMiddleware
+
+from . import schemas
+
+# 批量请求的总执行时间上限（秒），到时仍未完成的子请求返回 504
+BATCH_TIMEOUT = 10.0
+# 连续的读请求并发执行时的最大并发数
+BATCH_READ_CONCURRENCY = 8
+API_PREFIX = "/api/v1"
+BATCH_PATH = API_PREFIX + "/batch"
+
+_READ_METHODS = frozenset({"GET", "HEAD"})
+# 不从批量请求继承到子请求的请求头
+_SKIPPED_HEADERS = frozenset({
+    b"content-length", b"content-type", b"transfer-encoding", b"expect", b"accept-encoding",
+    b"if-none-match", b"if-match", b"if-range", b"range", b"x-profile", b"x-profile-secret",
+})
+# 不返回给调用方的子响应头
+_DROPPED_RESPONSE_HEADERS = frozenset({"content-length", "date", "server"})
+
+logger = logging.getLogger("app.batch")
+
+
+class SubResult(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+def _error(status_code: int, message: str) -> SubResult:
+    return SubResult(status_code, [(b"content-type", b"application/json")], dumps({"message": message}))
+
+
+class BatchService:
+    @staticmethod
+    async def execute(request: Request, subrequests: List[schemas.SubRequest]) -> bytes:
+        """
+        在进程内依次分发子请求，返回序列化后的批量响应
+
+        连续的读请求（GET/HEAD）并发执行，写请求单独执行且等待之前的请求全部完成，
+        因此写之后的读能看到写的结果。超过 BATCH_TIMEOUT 时取消未完成的子请求并返回 504；
+        被取消的写请求未提交的事务会回滚，但已提交的不会撤销。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + BATCH_TIMEOUT
+        semaphore = asyncio.Semaphore(BATCH_READ_CONCURRENCY)
+        results: List[Optional[SubResult]] = [None] * len(subrequests)
+
+        async def run(index: int) -> None:
+            async with semaphore:
+                results[index] = await BatchService._dispatch(request, subrequests[index])
+
+        index = 0
+        while index < len(subrequests) and loop.time() < deadline:
+            end = index + 1
+            if subrequests[index].method in _READ_METHODS:
+                while end < len(subrequests) and subrequests[end].method in _READ_METHODS:
+                    end += 1
+            tasks = [asyncio.ensure_future(run(position)) for position in range(index, end)]
+            _, pending = await asyncio.wait(tasks, timeout=deadline - loop.time())
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            index = end
+
+        return BatchService._encode(subrequests, [
+            result if result is not None else _error(status.HTTP_504_GATEWAY_TIMEOUT, "批量请求执行超时")
+            for result in results
+        ])
+
+    @staticmethod
+    def _build_scope(request: Request, sub: schemas.SubRequest, body: bytes) -> Optional[dict]:
+        path, _, query = sub.path.partition("?")
+        if not path.startswith("/"):
+            return None
+        if not path.startswith(API_PREFIX + "/"):
+            path = API_PREFIX + path
+        if path.rstrip("/") == BATCH_PATH:
+            return None
+
+        headers = [(name, value) for name, value in request.scope["headers"] if name not in _SKIPPED_HEADERS]
+        overridden = {name.lower().encode("latin-1") for name in sub.headers}
+        headers = [(name, value) for name, value in headers if name not in overridden]
+        headers.extend((name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in sub.headers.items())
+        if body:
+            headers.append((b"content-type", b"application/json"))
+            headers.append((b"content-length", str(len(body)).encode()))
+
+        scope = {
+            key: value for key, value in request.scope.items()
+            if key not in ("route", "endpoint", "path_params", "router", "state")
+        }
+        scope.update({
+            "method": sub.method,
+            "path": path,
+            "raw_path": quote(path).encode(),
+            "query_string": query.encode(),
+            "headers": headers,
+            "state": dict(request.scope.get("state", {})),
+        })
+        return scope
+
+    @staticmethod
+    async def _dispatch(request: Request, sub: schemas.SubRequest) -> SubResult:
+        body = dumps(sub.body) if sub.body is not None else b""
+        try:
+            scope = BatchService._build_scope(request, sub, body)
+        except UnicodeEncodeError:
+            return _error(status.HTTP_400_BAD_REQUEST, "请求头只能包含 latin-1 字符")
+        if scope is None:
+            return _error(status.HTTP_400_BAD_REQUEST, "子请求路径无效或不允许嵌套批量请求")
+
+        response_status = status.HTTP_500_INTERNAL_SERVER_ERROR
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        body_sent = False
+
+        async def receive() -> dict:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # 子请求不会断开连接，等待直到被取消
+            await asyncio.Future()
+
+        async def send(message: dict) -> None:
+            nonlocal response_status, response_headers
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await BatchService._subrequest_app(request.app)(scope, receive, send)
+        except Exception:
+            logger.exception("batch_subrequest_failed", extra={"method": sub.method, "path": sub.path})
+            return _error(status.HTTP_500_INTERNAL_SERVER_ERROR, "Internal Server Error")
+        return SubResult(response_status, response_headers, b"".join(chunks))
+
+    @staticmethod
+    def _subrequest_app(app) -> ASGIApp:
+        """
+        子请求的处理链，按应用中间件栈的顺序计时、记录访问日志与请求指标、按子请求统计 SQL（N+1 告警），
+        写类子请求另外占用所属类别的准入名额；压缩、CORS 与限流响应头只作用于批量请求本身
+        """
+        async def handle(scope: Scope, receive: Receive, send: Send) -> None:
+            response_started = False
+
+            async def send_wrapper(message: Message) -> None:
+                nonlocal response_started
+                if message["type"] == "http.response.start":
+                    response_started = True
+                await send(message)
+
+            # 子请求可以各自携带 Idempotency-Key
+            try:
+                await IdempotencyMiddleware(app.router)(scope, receive, send_wrapper)
+            except Exception as exc:
+                # 路由层抛出的异常（如未匹配路由的 404）交给应用注册的异常处理器
+                handler = BatchService._exception_handler(app, exc)
+                if handler is None or response_started:
+                    raise
+                if asyncio.iscoroutinefunction(handler):
+                    response = await handler(Request(scope, receive), exc)
+                else:
+                    response = await run_in_threadpool(handler, Request(scope, receive), exc)
+                await response(scope, receive, send_wrapper)
+
+        chain = AdmissionMiddleware(handle, nested=True)
+        chain = QueryLogMiddleware(chain)
+        chain = MetricsMiddleware(chain)
+        chain = AccessLogMiddleware(chain)
+        return ServerTimingMiddleware(chain)
+
+    @staticmethod
+    def _exception_handler(app, exc: Exception):
+        """按与 Starlette 相同的规则查找应用的异常处理器：HTTPException 先按状态码，再按异常类型的 MRO"""
+        handlers = app.exception_handlers
+        if isinstance(exc, StarletteHTTPException) and exc.status_code in handlers:
+            return handlers[exc.status_code]
+        for cls in type(exc).__mro__:
+            if cls in handlers:
+                return handlers[cls]
+        return None
+
+    @staticmethod
+    def _encode(subrequests: List[schemas.SubRequest], results: List[SubResult]) -> bytes:
+        """JSON 子响应体原样拼接进批量响应，不做解析与重新序列化"""
+        items = []
+        for sub, result in zip(subrequests, results):
+            headers = {}
+            for name, value in result.headers:
+                name = name.decode("latin-1")
+                if name not in _DROPPED_RESPONSE_HEADERS:
+                    headers[name] = value.decode("latin-1")
+            head = {"id": sub.id, "status": result.status, "headers": headers}
+            content_type = headers.get("content-type", "")
+            if not result.body:
+                body = b"null"
+            elif content_type.startswith("application/json"):
+                body = result.body
+            elif content_type.startswith("text/"):
+                body = dumps(result.body.decode("utf-8", errors="replace"))
+            else:
+                head["body_encoding"] = "base64"
+                body = dumps(base64.b64encode(result.body).decode())
+            items.append(dumps(head)[:-1] + b',"body":' + body + b"}")
+        return b'{"message":"OK","data":[' + b",".join(items) + b"]}"
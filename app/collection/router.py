@@ -1,15 +1,19 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependences import get_current_user, get_current_superuser
 
 from core.database import get_db
+from core.fields import sparse_fields, sparse_response
+from core.cache import response_cache
+from core.responses import trusted_response, weak_etag
+from core.timing import TimedRoute
 from . import schemas, services
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post("", response_model=schemas.CollectionResponse)
@@ -24,11 +28,15 @@ async def create_collection(
 
 @router.get("", response_model=List[schemas.CollectionResponse])
 async def get_collections(
+    fields: Optional[List[str]] = Depends(sparse_fields(schemas.CollectionResponse)),
     current_user=Depends(get_current_superuser),
     db: AsyncSession = Depends(get_db),
 ):
     """获取集合列表"""
-    return await services.CollectionService.get_collections(db)
+    collections = await services.CollectionService.get_collections(db, fields=fields)
+    if fields:
+        return sparse_response(collections)
+    return trusted_response(schemas.CollectionResponse, collections)
 
 
 @router.get("/{collection_id}", response_model=schemas.CollectionResponse)
@@ -55,9 +63,24 @@ async def create_collection_item(
 
 @router.get("/{collection_id}/items", response_model=List[schemas.CollectionItemResponse])
 async def get_collection_items(
+    request: Request,
     collection_id: int,
+    fields: Optional[List[str]] = Depends(sparse_fields(schemas.CollectionItemResponse)),
     current=Depends(get_current_superuser),
     db: AsyncSession = Depends(get_db)
 ):
     """获取集合中的所有项"""
-    return await services.CollectionService.get_collection_items(db, collection_id)
+    collection = await services.CollectionService.get_collection_by_id(db, collection_id)
+    # 仅超级用户可访问，授权指纹固定
+    cache_key = weak_etag(collection.version, "superuser", request.url.path, sorted(request.query_params.multi_items()))
+    cached = response_cache.get_response(cache_key)
+    if cached is not None:
+        return cached
+
+    items = await services.CollectionService.get_collection_items(db, collection_id, fields=fields)
+    if fields:
+        response = sparse_response(items)
+    else:
+        response = trusted_response(schemas.CollectionItemResponse, items)
+    response_cache.put(cache_key, response, tags=(f"workspace:{collection.workspace_id}", f"collection:{collection_id}"))
+    return response
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 
 
 class CollectionBase(BaseModel):
@@ -13,6 +14,8 @@ class CollectionCreate(CollectionBase):
 
 class CollectionResponse(CollectionBase):
     id: int
+    item_count: int = 0
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes: bool = True
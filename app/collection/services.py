@@ -1,9 +1,17 @@
+from typing import List, Optional
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from fastapi import HTTPException, status
 
 from app.workspace import models as workspace_models
+from app.workspace.services import WorkspaceStatsService
+from core import storage
+from core.database import upsert
+from core.groupcommit import apply_write
+from core.sharding import use_workspace_shard
+from core.fields import project_columns
 
 from . import schemas
 
@@ -12,21 +20,16 @@ class CollectionService:
 
     @staticmethod
     async def create_collection(db: AsyncSession, collection_data: schemas.CollectionCreate):
-        """创建集合"""
-        # 检查集合是否已存在
-        stmt = select(workspace_models.WorkspaceCollection).where(
-            workspace_models.WorkspaceCollection.name == collection_data.name,
-            workspace_models.WorkspaceCollection.workspace_id == collection_data.workspace_id
+        """创建集合，同一工作区内集合名称唯一"""
+        use_workspace_shard(db, collection_data.workspace_id)
+        collection = await upsert(
+            db, workspace_models.WorkspaceCollection, collection_data.dict(), conflict=("workspace_id", "name")
         )
-        existing_collection = await db.scalar(stmt)
-        if existing_collection:
+        if collection is None:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="集合已存在")
 
-        # 创建新集合
-        collection = workspace_models.WorkspaceCollection(**collection_data.dict())
-        db.add(collection)
+        await WorkspaceStatsService.collection_added(db, collection_data.workspace_id)
         await db.commit()
-        await db.refresh(collection)
         return collection
 
     @staticmethod
@@ -39,36 +42,39 @@ class CollectionService:
         return collection
 
     @staticmethod
-    async def get_collections(db: AsyncSession):
-        """获取集合列表"""
-        stmt = select(workspace_models.WorkspaceCollection)
+    async def get_collections(db: AsyncSession, fields: Optional[List[str]] = None):
+        """获取集合列表，指定 fields 时仅查询对应列并返回行映射"""
+        model = workspace_models.WorkspaceCollection
+        stmt = select(*project_columns(model, fields)) if fields else select(model)
+        if fields:
+            return (await db.execute(stmt)).mappings().all()
         collections = await db.scalars(stmt)
         return collections
 
     @staticmethod
     async def create_collection_item(db: AsyncSession, item_data: schemas.CollectionItemCreate):
-        """创建集合项"""
-        # 检查集合项是否已存在
-        stmt = select(workspace_models.WorkspaceCollectionItem).where(
-            workspace_models.WorkspaceCollectionItem.name == item_data.name,
-            workspace_models.WorkspaceCollectionItem.collection_id == item_data.collection_id
-        )
-        existing_item = await db.scalar(stmt)
-        if existing_item:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="集合项已存在")
+        """创建集合项，同一集合内集合项名称唯一"""
+        values = item_data.dict()
+        values["image_hash"] = await storage.media_digest(item_data.image_path)
 
-        # 创建新集合项
-        item = workspace_models.WorkspaceCollectionItem(**item_data.dict())
-        db.add(item)
-        await db.commit()
-        await db.refresh(item)
-        return item
+        async def write(session: AsyncSession):
+            item = await upsert(
+                session, workspace_models.WorkspaceCollectionItem, values, conflict=("collection_id", "name")
+            )
+            if item is None:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="集合项已存在")
+            await WorkspaceStatsService.items_changed(session, item_data.collection_id, 1)
+            return item
+
+        return await apply_write(db, write)
 
     @staticmethod
-    async def get_collection_items(db: AsyncSession, collection_id: int):
-        """获取集合中的所有项"""
-        stmt = select(workspace_models.WorkspaceCollectionItem).where(
-            workspace_models.WorkspaceCollectionItem.collection_id == collection_id
-        )
+    async def get_collection_items(db: AsyncSession, collection_id: int, fields: Optional[List[str]] = None):
+        """获取集合中的所有项，指定 fields 时仅查询对应列并返回行映射"""
+        model = workspace_models.WorkspaceCollectionItem
+        columns = project_columns(model, fields) if fields else [model]
+        stmt = select(*columns).where(model.collection_id == collection_id)
+        if fields:
+            return (await db.execute(stmt)).mappings().all()
         items = await db.scalars(stmt)
         return items.all()
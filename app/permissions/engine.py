@@ -1,6 +1,8 @@
-from typing import Optional
+import hashlib
+import logging
+from typing import Optional, Dict, List, NamedTuple
 
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, literal, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi import Depends, HTTPException, status, Request
@@ -9,6 +11,26 @@ from app.user.models import User
 from app.workspace.models import WorkspaceUser
 from app.permissions.models import WorkspaceUserPermissions, WorkspaceRolePermissions
 from app.auth.dependences import get_current_user, get_db
+from core.metrics import Counter, default_registry, ratio_stats
+from core.timing import phase
+
+logger = logging.getLogger("app.permissions")
+
+# 权限引擎实例内授权缓存的命中情况
+PERMISSION_CACHE_KINDS = ("workspace_user", "role_permissions", "user_permissions")
+PERMISSION_CACHE_LOOKUPS = Counter(
+    "permission_cache_lookups_total", "Permission engine memo lookups", ("kind", "result")
+)
+default_registry.register_stats(
+    "permission_cache", "Permission engine memo hit ratio", ratio_stats(PERMISSION_CACHE_LOOKUPS, PERMISSION_CACHE_KINDS)
+)
+
+
+class Grant(NamedTuple):
+    """一条角色权限或用户直接权限"""
+    path: str
+    action: str
+    allow: bool
 
 
 class WorkspacePermissionEngine:
@@ -17,6 +39,75 @@ class WorkspacePermissionEngine:
     def __init__(self, db: AsyncSession, user: User):
         self.db = db
         self.user = user
+        # 同一引擎实例内多次校验时复用已查询的成员关系与授权
+        self._workspace_users: Dict[int, Optional[WorkspaceUser]] = {}
+        self._role_permissions: Dict[int, List[Grant]] = {}
+        self._user_permissions: Dict[int, List[Grant]] = {}
+
+    async def _get_workspace_user(self, workspace_id: int) -> Optional[WorkspaceUser]:
+        if workspace_id in self._workspace_users:
+            PERMISSION_CACHE_LOOKUPS.inc("workspace_user", "hit")
+        else:
+            PERMISSION_CACHE_LOOKUPS.inc("workspace_user", "miss")
+            stmt = select(WorkspaceUser).where(
+                WorkspaceUser.user_id == self.user.id,
+                WorkspaceUser.workspace_id == workspace_id
+            )
+            self._workspace_users[workspace_id] = await self.db.scalar(stmt)
+        return self._workspace_users[workspace_id]
+
+    async def _get_role_permissions(self, role_id: int) -> List[Grant]:
+        if role_id in self._role_permissions:
+            PERMISSION_CACHE_LOOKUPS.inc("role_permissions", "hit")
+        else:
+            PERMISSION_CACHE_LOOKUPS.inc("role_permissions", "miss")
+            stmt = select(
+                WorkspaceRolePermissions.path, WorkspaceRolePermissions.action, WorkspaceRolePermissions.allow
+            ).where(WorkspaceRolePermissions.workspace_role_id == role_id)
+            self._role_permissions[role_id] = [Grant(*row) for row in await self.db.execute(stmt)]
+        return self._role_permissions[role_id]
+
+    async def _get_user_permissions(self, workspace_user_id: int) -> List[Grant]:
+        if workspace_user_id in self._user_permissions:
+            PERMISSION_CACHE_LOOKUPS.inc("user_permissions", "hit")
+        else:
+            PERMISSION_CACHE_LOOKUPS.inc("user_permissions", "miss")
+            stmt = select(
+                WorkspaceUserPermissions.path, WorkspaceUserPermissions.action, WorkspaceUserPermissions.allow
+            ).where(WorkspaceUserPermissions.workspace_user_id == workspace_user_id)
+            self._user_permissions[workspace_user_id] = [Grant(*row) for row in await self.db.execute(stmt)]
+        return self._user_permissions[workspace_user_id]
+
+    async def load_memberships(self) -> List[int]:
+        """
+        一次加载用户的全部成员关系及其授权，返回用户所在的工作区
+
+        成员关系与授权各一条查询，之后对这些工作区的 check_permission 不再查询数据库
+        """
+        members = list(await self.db.scalars(select(WorkspaceUser).where(WorkspaceUser.user_id == self.user.id)))
+        role_ids = {member.role_id for member in members if member.role_id not in self._role_permissions}
+        member_ids = {member.id for member in members if member.id not in self._user_permissions}
+        for member in members:
+            self._workspace_users[member.workspace_id] = member
+        if role_ids or member_ids:
+            for role_id in role_ids:
+                self._role_permissions[role_id] = []
+            for member_id in member_ids:
+                self._user_permissions[member_id] = []
+            stmt = union_all(
+                select(
+                    literal("role").label("kind"), WorkspaceRolePermissions.workspace_role_id.label("owner"),
+                    WorkspaceRolePermissions.path, WorkspaceRolePermissions.action, WorkspaceRolePermissions.allow,
+                ).where(WorkspaceRolePermissions.workspace_role_id.in_(role_ids)),
+                select(
+                    literal("user"), WorkspaceUserPermissions.workspace_user_id,
+                    WorkspaceUserPermissions.path, WorkspaceUserPermissions.action, WorkspaceUserPermissions.allow,
+                ).where(WorkspaceUserPermissions.workspace_user_id.in_(member_ids)),
+            )
+            for kind, owner, path, action, allow in await self.db.execute(stmt):
+                grants = self._role_permissions if kind == "role" else self._user_permissions
+                grants[owner].append(Grant(path, action, allow))
+        return [member.workspace_id for member in members]
 
     async def check_permission(self, path: str, action: str) -> bool:
         """检查用户是否有权限访问指定路径和执行指定操作"""
@@ -30,31 +121,20 @@ class WorkspacePermissionEngine:
             return False  # 无法确定工作区ID
 
         # 获取用户在该工作区的角色
-        stmt = select(WorkspaceUser).where(
-            WorkspaceUser.user_id == self.user.id,
-            WorkspaceUser.workspace_id == workspace_id
-        )
-        workspace_user = await self.db.scalar(stmt)
+        workspace_user = await self._get_workspace_user(workspace_id)
 
         if not workspace_user:
             return False  # 用户不在该工作区
 
         # 检查角色权限
-        role_id = workspace_user.role_id
-        stmt = select(WorkspaceRolePermissions).where(
-            WorkspaceRolePermissions.workspace_role_id == role_id
-        )
-        role_permissions = await self.db.scalars(stmt)
+        role_permissions = await self._get_role_permissions(workspace_user.role_id)
 
         for perm in role_permissions:
             if self._path_matches(path, perm.path) and (perm.action == "*" or perm.action == action) and perm.allow:
                 return True
 
         # 检查用户直接权限
-        stmt = select(WorkspaceUserPermissions).where(
-            WorkspaceUserPermissions.workspace_user_id == workspace_user.id
-        )
-        user_permissions = await self.db.scalars(stmt)
+        user_permissions = await self._get_user_permissions(workspace_user.id)
 
         for perm in user_permissions:
             if self._path_matches(path, perm.path) and (perm.action == "*" or perm.action == action) and perm.allow:
@@ -62,6 +142,26 @@ class WorkspacePermissionEngine:
 
         return False
 
+    async def fingerprint(self, workspace_id: int) -> str:
+        """
+        用户在工作区内有效授权的指纹
+
+        授权相同的用户指纹相同，授权变化（角色、直接权限、成员关系）时指纹随之变化
+        """
+        if self.user.is_superuser:
+            return "superuser"
+        workspace_user = await self._get_workspace_user(workspace_id)
+        if not workspace_user:
+            return "none"
+        grants = sorted(
+            (perm.path, perm.action, bool(perm.allow))
+            for perm in [
+                *await self._get_role_permissions(workspace_user.role_id),
+                *await self._get_user_permissions(workspace_user.id),
+            ]
+        )
+        return hashlib.sha1(repr(grants).encode()).hexdigest()
+
     @staticmethod
     def _extract_workspace_id(path: str) -> Optional[int]:
         """从路径中提取工作区ID"""
@@ -104,10 +204,7 @@ class WorkspacePermissionEngine:
                 pattern += "/" + re.escape(segment)
 
         pattern += "$"
-
-        # 移除多余的起始斜杠
-        pattern = pattern.replace("^/", "^")
-        print(f"target: {request_path}, pattern: {pattern}")
+        logger.debug("权限路径匹配 target=%s pattern=%s", request_path, pattern)
         # 匹配路径
         return re.match(pattern, request_path) is not None
 
@@ -127,7 +224,8 @@ def require_workspace_permission(path: str, action: str):
 
         # 创建权限引擎并检查权限
         engine = WorkspacePermissionEngine(db, current_user)
-        has_permission = await engine.check_permission(actual_path, action)
+        with phase("authz"):
+            has_permission = await engine.check_permission(actual_path, action)
 
         if not has_permission:
             raise HTTPException(
@@ -135,6 +233,7 @@ def require_workspace_permission(path: str, action: str):
                 detail="没有足够的权限执行此操作"
             )
 
-        return True
+        # 返回引擎供路由复用已加载的授权
+        return engine
 
     return check_permission
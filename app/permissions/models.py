@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship
 
 from core.database import BaseModel
@@ -6,6 +6,9 @@ from core.database import BaseModel
 
 class WorkspaceUserPermissions(BaseModel):
     __tablename__ = "workspace_user_permissions"
+    __table_args__ = (
+        Index("uq_workspace_user_permissions_rule", "workspace_user_id", "path", "action", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     workspace_user_id = Column(Integer, ForeignKey("workspace_users.id"))
@@ -18,6 +21,9 @@ class WorkspaceUserPermissions(BaseModel):
 
 class WorkspaceRolePermissions(BaseModel):
     __tablename__ = "workspace_role_permissions"
+    __table_args__ = (
+        Index("uq_workspace_role_permissions_rule", "workspace_role_id", "path", "action", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     workspace_role_id = Column(Integer, ForeignKey("workspace_roles.id"))
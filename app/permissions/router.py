@@ -6,10 +6,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.dependences import get_current_superuser, get_current_user
 from app.user.models import User
 from core.database import get_db
+from core.timing import TimedRoute
 
 from . import models, schemas
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.get("/permissions", response_model=List[schemas.PermissionResponse])
@@ -0,0 +1,64 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from app.auth.dependences import get_current_superuser
+from core import profiling
+from core.timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.post("/sampling/start")
+async def start_sampling(
+    interval_ms: float = Query(profiling.SAMPLING_INTERVAL * 1000, ge=1, le=1000, description="采样间隔（毫秒）"),
+    current_user=Depends(get_current_superuser),
+):
+    """开始跨请求的统计采样，丢弃上一轮结果（仅限超级用户）"""
+    sampler = profiling.background_sampler.start(interval_ms / 1000)
+    return {"message": "统计采样已开始", "data": sampler.stats()}
+
+
+@router.post("/sampling/stop")
+async def stop_sampling(current_user=Depends(get_current_superuser)):
+    """停止统计采样，结果保留到下一次开始（仅限超级用户）"""
+    profiling.background_sampler.stop()
+    return {"message": "统计采样已停止", "data": profiling.background_sampler.stats()}
+
+
+@router.get("/sampling")
+async def get_sampling_result(
+    format: Literal["speedscope", "folded", "stats"] = Query("speedscope"),
+    current_user=Depends(get_current_superuser),
+):
+    """
+    统计采样结果（仅限超级用户）
+
+    speedscope 可直接在 https://www.speedscope.app 打开，folded 可交给 flamegraph.pl 生成火焰图
+    """
+    sampler = profiling.background_sampler.sampler
+    if format == "stats" or sampler is None:
+        return {"message": "OK", "data": profiling.background_sampler.stats()}
+    if format == "folded":
+        return PlainTextResponse(sampler.folded())
+    return sampler.speedscope("background sampling")
+
+
+@router.get("/profiles")
+async def list_profiles(current_user=Depends(get_current_superuser)):
+    """已保存的单请求剖析结果（仅限超级用户）"""
+    return {"message": "OK", "data": profiling.list_profiles()}
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    kind: Literal["pstats", "speedscope"] = Query("speedscope"),
+    current_user=Depends(get_current_superuser),
+):
+    """下载单请求剖析结果，pstats 可用 python -m pstats 或 snakeviz 查看（仅限超级用户）"""
+    path = profiling.profile_path(profile_id, kind)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, filename=path.name)
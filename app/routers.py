@@ -1,15 +1,32 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from core.ratelimit import rate_limit, workspace_id
+from core.timing import TimedRoute
+
+from .auth.dependences import user_rate_limit
 
 from .user.router import router as user_router
 from .auth.router import router as auth_router
 from .collection.router import router as collection_router
 from .workspace.router import router as workspace_router
 from .permissions.router import router as perms_router
+from .search.router import router as search_router
+from .profiling.router import router as profiling_router
+from .batch.router import router as batch_router
+
 
+# 限流策略见 core.ratelimit.RATE_LIMIT_POLICIES；注册（create_user）按 IP 限流在路由上单独声明
+per_user = [Depends(user_rate_limit("user"))]
 
-api_router = APIRouter()
+api_router = APIRouter(route_class=TimedRoute)
 api_router.include_router(user_router, prefix="/users", tags=["Users"])
-api_router.include_router(auth_router, prefix="/auth", tags=["Auth"])
-api_router.include_router(collection_router, prefix="/collections", tags=["Collections"])
-api_router.include_router(workspace_router, prefix="/workspaces", tags=["Workspaces"])
-api_router.include_router(perms_router, prefix="/permissions", tags=["Permissions"])
+api_router.include_router(auth_router, prefix="/auth", tags=["Auth"], dependencies=[Depends(rate_limit("login"))])
+api_router.include_router(collection_router, prefix="/collections", tags=["Collections"], dependencies=per_user)
+api_router.include_router(
+    workspace_router, prefix="/workspaces", tags=["Workspaces"],
+    dependencies=per_user + [Depends(rate_limit("workspace", key=workspace_id))],
+)
+api_router.include_router(perms_router, prefix="/permissions", tags=["Permissions"], dependencies=per_user)
+api_router.include_router(search_router, prefix="/search", tags=["Search"], dependencies=per_user)
+api_router.include_router(profiling_router, prefix="/profiling", tags=["Profiling"])
+api_router.include_router(batch_router, prefix="/batch", tags=["Batch"], dependencies=per_user)
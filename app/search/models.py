@@ -0,0 +1,99 @@
+from sqlalchemy import event, text
+
+from core.database import BaseModel
+
+# 全文索引表：集合项 rowid = id * 2，集合 rowid = id * 2 + 1
+# workspace_id / collection_id 仅用于结果过滤，不参与分词；不属于任何集合的集合项不进入索引
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        name,
+        description,
+        workspace_id UNINDEXED,
+        collection_id UNINDEXED,
+        prefix = '1 2 3',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    # 名称的权重高于描述
+    "INSERT INTO search_index(search_index, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    """
+    CREATE TRIGGER IF NOT EXISTS search_index_item_insert AFTER INSERT ON workspace_collection_items BEGIN
+        INSERT INTO search_index(rowid, name, description, workspace_id, collection_id)
+        SELECT new.id * 2, new.name, NULL, workspace_id, id
+        FROM workspace_collections WHERE id = new.collection_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_index_item_update
+    AFTER UPDATE OF name, collection_id ON workspace_collection_items BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+        INSERT INTO search_index(rowid, name, description, workspace_id, collection_id)
+        SELECT new.id * 2, new.name, NULL, workspace_id, id
+        FROM workspace_collections WHERE id = new.collection_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_index_item_delete AFTER DELETE ON workspace_collection_items BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_index_collection_insert AFTER INSERT ON workspace_collections BEGIN
+        INSERT INTO search_index(rowid, name, description, workspace_id, collection_id)
+        VALUES (new.id * 2 + 1, new.name, new.description, new.workspace_id, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_index_collection_update
+    AFTER UPDATE OF name, description, workspace_id ON workspace_collections BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO search_index(rowid, name, description, workspace_id, collection_id)
+        VALUES (new.id * 2 + 1, new.name, new.description, new.workspace_id, new.id);
+    END
+    """,
+    # 删除集合时一并移除其下集合项的索引
+    """
+    CREATE TRIGGER IF NOT EXISTS search_index_collection_delete AFTER DELETE ON workspace_collections BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        DELETE FROM search_index WHERE rowid IN (
+            SELECT id * 2 FROM workspace_collection_items WHERE collection_id = old.id
+        );
+    END
+    """,
+]
+
+REBUILD_SEARCH_INDEX_SQL = [
+    "DELETE FROM search_index",
+    """
+    INSERT INTO search_index(rowid, name, description, workspace_id, collection_id)
+    SELECT id * 2 + 1, name, description, workspace_id, id FROM workspace_collections
+    """,
+    """
+    INSERT INTO search_index(rowid, name, description, workspace_id, collection_id)
+    SELECT i.id * 2, i.name, NULL, c.workspace_id, i.collection_id
+    FROM workspace_collection_items i JOIN workspace_collections c ON c.id = i.collection_id
+    """,
+]
+
+
+def rebuild_search_index(connection) -> None:
+    """根据集合与集合项表重建全文索引"""
+    for sql in REBUILD_SEARCH_INDEX_SQL:
+        connection.execute(text(sql))
+
+
+@event.listens_for(BaseModel.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    """建表后创建全文索引及同步触发器，索引为新建时从现有数据回填；分片模式下只建在各分片中"""
+    if not connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'workspace_collection_items'")
+    ).first():
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    ).first()
+    for ddl in SEARCH_INDEX_DDL:
+        connection.execute(text(ddl))
+    if not exists:
+        rebuild_search_index(connection)
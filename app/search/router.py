@@ -0,0 +1,37 @@
+from typing import Optional, Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.dependences import get_current_user, get_current_superuser
+from core.database import get_db
+from core.timing import TimedRoute
+
+from . import schemas, services
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get("", response_model=schemas.SearchResponse, response_model_exclude_none=True)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200, description="搜索词，各词项按前缀匹配"),
+    collection_id: Optional[int] = Query(None, description="仅搜索该集合中的项"),
+    kind: Optional[Literal["item", "collection"]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """全文搜索当前用户可读取的集合与集合项"""
+    return await services.SearchService.search(
+        db, current_user, q, collection_id=collection_id, kind=kind, limit=limit, cursor=cursor
+    )
+
+
+@router.post("/rebuild")
+async def rebuild_search_index(
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_superuser),
+):
+    """重建全文索引（仅限超级用户）"""
+    return await services.SearchService.rebuild_index(db)
@@ -0,0 +1,17 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+from core.responses import ResponseBase
+
+
+class SearchHit(BaseModel):
+    kind: str
+    id: int
+    name: str
+    description: Optional[str] = None
+    workspace_id: Optional[int] = None
+    collection_id: Optional[int] = None
+
+
+class SearchResponse(ResponseBase[List[SearchHit]]):
+    next_cursor: Optional[str] = None
@@ -0,0 +1,202 @@
+import re
+import base64
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, text, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi import HTTPException, status
+
+from app.user.models import User
+from app.workspace import models as workspace_models
+from app.permissions.engine import WorkspacePermissionEngine
+from core.sharding import SHARDING_ENABLED, shard_binds, shard_directory
+
+from . import models
+
+
+class SearchService:
+
+    @staticmethod
+    def build_match_query(query: str) -> Optional[str]:
+        """将用户输入转换为 FTS5 查询：各词项取前缀匹配并按 AND 组合"""
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return None
+        return " ".join(f'"{term}"*' for term in terms)
+
+    @staticmethod
+    def encode_cursor(rank: float, rowid: int) -> str:
+        return base64.urlsafe_b64encode(f"{rank!r}:{rowid}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, int]:
+        try:
+            rank, rowid = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+            return float(rank), int(rowid)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+
+    @staticmethod
+    async def get_readable_scope(db: AsyncSession, user: User) -> Optional[Tuple[List[int], Dict[int, int]]]:
+        """
+        获取用户可搜索的范围：(可读取集合的工作区, 可读取集合项的集合 -> 所属工作区)，超级用户返回 None 表示不限制
+
+        集合项按各集合的 items 路径单独授权，集合列表的授权不包含集合项。成员关系与授权一次加载，
+        逐个判断时不再查询数据库
+        """
+        if user.is_superuser:
+            return None
+        engine = WorkspacePermissionEngine(db, user)
+        workspace_ids = await engine.load_memberships()
+        if not workspace_ids:
+            return [], {}
+        readable_workspaces = [
+            workspace_id for workspace_id in workspace_ids
+            if await engine.check_permission(f"/workspaces/{workspace_id}/collections", "read")
+        ]
+
+        stmt = select(workspace_models.WorkspaceCollection.id, workspace_models.WorkspaceCollection.workspace_id).where(
+            workspace_models.WorkspaceCollection.workspace_id.in_(workspace_ids)
+        )
+        if SHARDING_ENABLED:
+            shards = sorted({shard_directory.lookup(workspace_id)[0] for workspace_id in workspace_ids})
+            rows = []
+            for _, bind in shard_binds(shards):
+                rows.extend((await db.execute(stmt, bind_arguments={"bind": bind})).all())
+        else:
+            rows = (await db.execute(stmt)).all()
+        readable_collections = {
+            collection_id: workspace_id for collection_id, workspace_id in rows
+            if await engine.check_permission(f"/workspaces/{workspace_id}/collections/{collection_id}/items", "read")
+        }
+        return readable_workspaces, readable_collections
+
+    @staticmethod
+    async def check_collection_readable(db: AsyncSession, user: User, collection_id: int) -> Optional[int]:
+        """校验用户可读取指定集合中的项，分片模式下返回集合所在的分片"""
+        stmt = select(workspace_models.WorkspaceCollection.workspace_id).where(
+            workspace_models.WorkspaceCollection.id == collection_id
+        )
+        shard = workspace_id = None
+        if SHARDING_ENABLED:
+            for shard, bind in shard_binds():
+                workspace_id = await db.scalar(stmt, bind_arguments={"bind": bind})
+                if workspace_id is not None:
+                    break
+        else:
+            workspace_id = await db.scalar(stmt)
+        if workspace_id is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="集合不存在")
+
+        engine = WorkspacePermissionEngine(db, user)
+        path = f"/workspaces/{workspace_id}/collections/{collection_id}/items"
+        if not await engine.check_permission(path, "read"):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="没有足够的权限执行此操作")
+        return shard
+
+    @staticmethod
+    async def rebuild_index(db: AsyncSession):
+        """重建全文索引，分片模式下逐个分片重建"""
+        for _, bind in shard_binds() if SHARDING_ENABLED else [(None, None)]:
+            connection = await db.connection(bind_arguments={"bind": bind} if bind else None)
+            await connection.run_sync(models.rebuild_search_index)
+            await db.commit()
+        return {"message": "搜索索引已重建"}
+
+    @staticmethod
+    async def _search_shards(db: AsyncSession, stmt, params: dict, shards: Optional[Iterable[int]]):
+        """
+        在各分片上执行同一查询，按 (rank, rowid) 归并后取前 limit + 1 条
+
+        rank 为各分片内计算的 bm25，分片间的词频统计不同，跨分片的相关度排序只是近似。
+        """
+        rows = []
+        for _, bind in shard_binds(sorted(shards) if shards is not None else None):
+            rows.extend((await db.execute(stmt, params, bind_arguments={"bind": bind})).all())
+        rows.sort(key=lambda row: (row.rank, row.rowid))
+        return rows[:params["limit"]]
+
+    @staticmethod
+    async def search(
+        db: AsyncSession,
+        user: User,
+        query: str,
+        collection_id: Optional[int] = None,
+        kind: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ):
+        """按相关度搜索集合与集合项，使用 (rank, rowid) 游标分页"""
+        match = SearchService.build_match_query(query)
+        if match is None:
+            return {"data": [], "next_cursor": None}
+
+        conditions = ["search_index MATCH :match"]
+        params = {"match": match, "limit": limit + 1}
+        # 分片模式下需要查询的分片，None 表示全部
+        shards = None
+
+        if collection_id is not None:
+            shards = [await SearchService.check_collection_readable(db, user, collection_id)]
+            conditions.append("collection_id = :collection_id")
+            params["collection_id"] = collection_id
+        else:
+            scope = await SearchService.get_readable_scope(db, user)
+            if scope is not None:
+                workspace_ids, collections = scope
+                # 集合命中按工作区过滤，集合项命中按集合过滤
+                readable = []
+                if workspace_ids:
+                    readable.append("(rowid % 2 = 1 AND workspace_id IN :workspace_ids)")
+                    params["workspace_ids"] = workspace_ids
+                if collections:
+                    readable.append("(rowid % 2 = 0 AND collection_id IN :collection_ids)")
+                    params["collection_ids"] = list(collections)
+                if not readable:
+                    return {"data": [], "next_cursor": None}
+                conditions.append(f"({' OR '.join(readable)})")
+                if SHARDING_ENABLED:
+                    shards = {
+                        shard_directory.lookup(workspace_id)[0]
+                        for workspace_id in {*workspace_ids, *collections.values()}
+                    }
+
+        if kind == "item":
+            conditions.append("rowid % 2 = 0")
+        elif kind == "collection":
+            conditions.append("rowid % 2 = 1")
+
+        if cursor:
+            params["last_rank"], params["last_rowid"] = SearchService.decode_cursor(cursor)
+            conditions.append("(rank > :last_rank OR (rank = :last_rank AND rowid > :last_rowid))")
+
+        stmt = text(
+            "SELECT rowid, rank, name, description, workspace_id, collection_id FROM search_index "
+            f"WHERE {' AND '.join(conditions)} ORDER BY rank, rowid LIMIT :limit"
+        )
+        for name in ("workspace_ids", "collection_ids"):
+            if name in params:
+                stmt = stmt.bindparams(bindparam(name, expanding=True))
+        if SHARDING_ENABLED:
+            rows = await SearchService._search_shards(db, stmt, params, shards)
+        else:
+            rows = (await db.execute(stmt, params)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = SearchService.encode_cursor(rows[-1].rank, rows[-1].rowid)
+
+        hits = [
+            {
+                "kind": "collection" if row.rowid % 2 else "item",
+                "id": row.rowid // 2,
+                "name": row.name,
+                "description": row.description,
+                "workspace_id": row.workspace_id,
+                "collection_id": row.collection_id,
+            }
+            for row in rows
+        ]
+        return {"data": hits, "next_cursor": next_cursor}
@@ -3,20 +3,23 @@ from sqlalchemy import select
 
 from fastapi import APIRouter, Depends, HTTPException, status
 
-from app.auth.dependences import get_current_superuser, get_password_hash, get_current_user
+from app.auth.dependences import get_current_superuser, get_password_hash, get_current_user, user_rate_limit
 from core.database import get_db
+from core.ratelimit import rate_limit
 from core.responses import resp_
+from core.timing import TimedRoute
 
 from . import models, schemas
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post(
     "",
     response_model=resp_(schemas.UserResponse),
     status_code=status.HTTP_201_CREATED,
-    response_model_exclude_none=True
+    response_model_exclude_none=True,
+    dependencies=[Depends(rate_limit("signup"))],
 )
 async def create_user(
         user: schemas.UserCreate,
@@ -43,6 +46,6 @@ async def create_user(
     return {"data": db_user}
 
 
-@router.get("/me", response_model=schemas.UserResponse)
+@router.get("/me", response_model=schemas.UserResponse, dependencies=[Depends(user_rate_limit("user"))])
 async def read_users_me(current_user: models.User = Depends(get_current_user)):
     return current_user
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 
 from core.database import BaseModel
+from core.sharding import global_id
 
 
 class Workspace(BaseModel):
@@ -12,6 +13,13 @@ class Workspace(BaseModel):
     name = Column(String, index=True)
     description = Column(String, nullable=True)
 
+    # 统计字段，由写服务在同一事务内维护
+    collection_count = Column(Integer, nullable=False, default=0, server_default="0")
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, nullable=True)
+    # 数据版本，工作区内任意集合或集合项变化时递增
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
     # 关系
     workspace_users = relationship("WorkspaceUser", back_populates="workspace")
     workspace_roles = relationship("WorkspaceRole", back_populates="workspace")
@@ -35,6 +43,9 @@ class WorkspaceRole(BaseModel):
 class WorkspaceUser(BaseModel):
     """工作区用户"""
     __tablename__ = "workspace_users"
+    __table_args__ = (
+        Index("uq_workspace_users_workspace_user", "workspace_id", "user_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -51,11 +62,20 @@ class WorkspaceUser(BaseModel):
 class WorkspaceCollection(BaseModel):
     """工作区 Collections"""
     __tablename__ = "workspace_collections"
-    id = Column(Integer, primary_key=True)
+    __table_args__ = (
+        Index("uq_workspace_collections_workspace_name", "workspace_id", "name", unique=True),
+    )
+    id = Column(Integer, primary_key=True, default=global_id("workspace_collections"))
     name = Column(String, index=True)
     description = Column(String, nullable=True)
     workspace_id = Column(Integer, ForeignKey("workspaces.id"))
 
+    # 统计字段，由写服务在同一事务内维护
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, nullable=True)
+    # 数据版本，集合项变化时递增
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
     # 关系
     workspace = relationship("Workspace", back_populates="collections")
     items = relationship("WorkspaceCollectionItem", back_populates="collection")
@@ -63,11 +83,26 @@ class WorkspaceCollection(BaseModel):
 
 class WorkspaceCollectionItem(BaseModel):
     __tablename__ = "workspace_collection_items"
+    __table_args__ = (
+        Index("uq_workspace_collection_items_collection_name", "collection_id", "name", unique=True),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, default=global_id("workspace_collection_items"))
     name = Column(String, index=True)
     image_path = Column(String)
-    collection_id = Column(Integer, ForeignKey("workspace_collections.id"))
+    image_hash = Column(String(64), nullable=True, doc="图片内容 SHA-256，用作强 ETag")
+    collection_id = Column(Integer, ForeignKey("workspace_collections.id"), index=True)
 
     # 关系
     collection = relationship("WorkspaceCollection", back_populates="items")
+
+
+class WorkspaceStats(BaseModel):
+    """分片模式下工作区的统计字段与数据版本，与集合存放在同一分片，写集合项时无需写全局目录库"""
+    __tablename__ = "workspace_stats"
+
+    workspace_id = Column(Integer, primary_key=True)
+    collection_count = Column(Integer, nullable=False, default=0, server_default="0")
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
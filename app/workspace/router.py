@@ -1,26 +1,40 @@
-from typing import List
+from typing import List, Optional
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status
 
-from app.auth.dependences import get_current_user
+from app.auth.dependences import get_current_user, get_current_superuser, idempotent
 from app.user.models import User
 from app.permissions.engine import require_workspace_permission, WorkspacePermissionEngine
 
-from core.database import get_db
-from core.responses import resp_
+from core.database import get_db, upsert
+from core.fields import sparse_fields, sparse_response
+from core.responses import (
+    resp_, trusted_response, weak_etag, etag_matches, not_modified_response, file_etag, ZeroCopyFileResponse
+)
+from core import storage
+from core import thumbnails
+from core.cache import response_cache
+from core.timing import TimedRoute
 
 from . import schemas, models, services
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+
+async def _list_etag(request: Request, engine: WorkspacePermissionEngine, workspace_id: int, version: int) -> str:
+    """列表接口的弱 ETag：数据版本 + 授权指纹 + 请求路径与查询参数"""
+    fingerprint = await engine.fingerprint(workspace_id)
+    return weak_etag(version, fingerprint, request.url.path, sorted(request.query_params.multi_items()))
 
 
 @router.post(
     "/user-workspaces",
     response_model=schemas.WorkspaceResponse,
-    status_code=status.HTTP_201_CREATED
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(idempotent)]
 )
 async def create_workspace(
     workspace: schemas.WorkspaceCreate,
@@ -33,24 +47,23 @@ async def create_workspace(
 
 @router.get("/user-workspaces", response_model=List[schemas.WorkspaceResponse])
 async def get_user_workspaces(
+    fields: Optional[List[str]] = Depends(sparse_fields(schemas.WorkspaceResponse)),
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     """获取当前用户工作区列表"""
     # 获取用户所在的所有工作区
-    result = await db.execute(
-        select(models.Workspace)
-        .join(models.WorkspaceUser)
-        .where(models.WorkspaceUser.user_id == current_user.id)
-    )
-    workspaces = result.scalars().all()
+    workspaces = await services.WorkspaceService.get_user_workspaces(db, current_user.id, fields=fields)
+    if fields:
+        return sparse_response(workspaces)
     return workspaces
 
 
 @router.post(
     "/user-workspaces/{workspace_id}/collections",
     response_model=schemas.WorkspaceCollectionResponse,
-    status_code=status.HTTP_201_CREATED
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(idempotent)]
 )
 async def create_collection_in_workspace(
     workspace_id: int,
@@ -71,13 +84,14 @@ async def delete_collection_in_workspace(
     db: AsyncSession = Depends(get_db),
     _=Depends(require_workspace_permission("/workspaces/{workspace_id}/collections/{collection_id}", action="delete"))
 ):
-    return await services.WorkspaceCollectionService.delete_collection_by_id(db, collection_id)
+    return await services.WorkspaceCollectionService.delete_collection_by_id(db, workspace_id, collection_id)
 
 
 @router.post(
     "/user-workspaces/{workspace_id}/collections/{collection_id}/items",
     response_model=schemas.WorkspaceCollectionItemResponse,
-    status_code=status.HTTP_201_CREATED
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(idempotent)]
 )
 async def create_item_in_workspace(
     workspace_id: int,
@@ -109,7 +123,7 @@ async def delete_item_in_workspace(
             action="delete")
     )
 ):
-    return await services.WorkspaceCollectionService.delete_collection_item(db, item_id)
+    return await services.WorkspaceCollectionService.delete_collection_item(db, workspace_id, collection_id, item_id)
 
 
 @router.get(
@@ -117,11 +131,37 @@ async def delete_item_in_workspace(
     response_model=List[schemas.WorkspaceCollectionResponse]
 )
 async def get_workspace_collections(
+    request: Request,
     workspace_id: int,
+    fields: Optional[List[str]] = Depends(sparse_fields(schemas.WorkspaceCollectionResponse)),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
-    _=Depends(require_workspace_permission("/workspaces/{workspace_id}/collections", action="read"))
+    permission_engine: WorkspacePermissionEngine = Depends(
+        require_workspace_permission("/workspaces/{workspace_id}/collections", action="read")
+    )
 ):
-    return await services.WorkspaceCollectionService.get_collections(db, workspace_id=workspace_id)
+    # 数据版本与授权均未变化时直接返回 304，不执行列表查询
+    version = await services.WorkspaceService.get_workspace_version(db, workspace_id)
+    etag = await _list_etag(request, permission_engine, workspace_id, version)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    # ETag 已包含版本、授权指纹与查询参数，直接作为共享缓存的键
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    cached = response_cache.get_response(etag, headers=headers)
+    if cached is not None:
+        return cached
+
+    collections = await services.WorkspaceCollectionService.get_collections(
+        db, workspace_id=workspace_id, fields=fields, version=version
+    )
+    if fields:
+        response = sparse_response(collections)
+    else:
+        response = trusted_response(schemas.WorkspaceCollectionResponse, collections)
+    response_cache.put(etag, response, tags=(f"workspace:{workspace_id}",))
+    response.headers.update(headers)
+    return response
 
 
 @router.get(
@@ -130,22 +170,153 @@ async def get_workspace_collections(
     response_model_exclude_none=True
 )
 async def get_workspace_collection_items(
+    request: Request,
     workspace_id: int,
     collection_id: int,
+    fields: Optional[List[str]] = Depends(sparse_fields(schemas.WorkspaceCollectionItemResponse)),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
-    _=Depends(require_workspace_permission("/workspaces/{workspace_id}/collections/{collection_id}/items", action="read"))
+    permission_engine: WorkspacePermissionEngine = Depends(
+        require_workspace_permission("/workspaces/{workspace_id}/collections/{collection_id}/items", action="read")
+    )
 ):
-    return {"data": await services.WorkspaceCollectionService.get_collection_items(db, collection_id)}
+    collection = await services.WorkspaceCollectionService.get_collection_by_id(db, collection_id)
+    # 数据版本与授权均未变化时直接返回 304，不执行列表查询
+    etag = await _list_etag(request, permission_engine, workspace_id, collection.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    cached = response_cache.get_response(etag, headers=headers)
+    if cached is not None:
+        return cached
+
+    items = await services.WorkspaceCollectionService.get_collection_items(
+        db, collection_id, fields=fields, version=collection.version
+    )
+    if fields:
+        response = sparse_response(items, total=collection.item_count)
+    else:
+        response = trusted_response(
+            schemas.WorkspaceCollectionItemResponse, items, exclude_none=True, envelope=True, total=collection.item_count
+        )
+    response_cache.put(etag, response, tags=(f"workspace:{workspace_id}", f"collection:{collection_id}"))
+    response.headers.update(headers)
+    return response
 
 
-@router.get("/{workspace_id}", response_model=schemas.WorkspaceResponse)
+@router.get(
+    "/user-workspaces/{workspace_id}/collections/{collection_id}/items/{item_id}/image",
+    response_class=ZeroCopyFileResponse,
+)
+async def get_workspace_collection_item_image(
+    workspace_id: int,
+    collection_id: int,
+    item_id: int,
+    db: AsyncSession = Depends(get_db),
+    _=Depends(
+        require_workspace_permission(
+            "/workspaces/{workspace_id}/collections/{collection_id}/items/{item_id}",
+            action="read")
+    )
+):
+    """下载集合项图片，支持 Range 与 If-None-Match"""
+    item = await services.WorkspaceCollectionService.get_collection_item(db, workspace_id, collection_id, item_id)
+    path = await services.WorkspaceCollectionService.get_item_image(db, item)
+    # 入库的内容哈希不随文件替换更新，ETag 另外包含文件的修改时间与大小，304 与 If-Range 在响应打开文件后判断
+    return ZeroCopyFileResponse(
+        path, etag=f'"{item.image_hash}"', headers={"cache-control": "private, no-cache"}, stat_etag=True
+    )
+
+
+@router.get(
+    "/user-workspaces/{workspace_id}/collections/{collection_id}/items/{item_id}/image/thumbnails/{size}",
+    response_class=ZeroCopyFileResponse,
+)
+async def get_workspace_collection_item_thumbnail(
+    workspace_id: int,
+    collection_id: int,
+    item_id: int,
+    size: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    _=Depends(
+        require_workspace_permission(
+            "/workspaces/{workspace_id}/collections/{collection_id}/items/{item_id}",
+            action="read")
+    )
+):
+    """获取集合项图片缩略图，按需生成并缓存"""
+    if size not in thumbnails.THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"缩略图尺寸仅支持 {', '.join(map(str, thumbnails.THUMBNAIL_SIZES))}"
+        )
+    if not thumbnails.PIL_AVAILABLE:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="缩略图功能需要安装 Pillow")
+
+    item = await services.WorkspaceCollectionService.get_collection_item(db, workspace_id, collection_id, item_id)
+    source = await services.WorkspaceCollectionService.get_item_image(db, item)
+    # 原图被替换后修改时间与大小随之变化，缩略图按新的版本重新生成
+    source_stat = await storage.media_stat(source)
+    if source_stat is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="图片不存在")
+    version = file_etag(f'"{item.image_hash}"', source_stat).strip('"')
+    etag = f'"{version}-{size}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+
+    try:
+        path = await thumbnails.thumbnail_generator.get(source, version, size)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="无法生成该图片的缩略图")
+    return ZeroCopyFileResponse(
+        path,
+        etag=etag,
+        media_type=thumbnails.THUMBNAIL_MEDIA_TYPE,
+        headers={"cache-control": "private, no-cache"}
+    )
+
+
+@router.get("/{workspace_id}", response_model=schemas.WorkspaceDetail, response_model_exclude_unset=True)
 async def get_workspace(
     workspace_id: int,
+    expand: Optional[str] = Query(None, description="展开关联数据，逗号分隔：collections,collections.items,roles"),
+    items_limit: int = Query(20, ge=1, le=100, description="展开集合项时每个集合返回的最大数量"),
     db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
     _=Depends(require_workspace_permission("/workspaces/{workspace_id}", action="read"))
 ):
     """获取工作区详情"""
-    return await services.WorkspaceService.get_workspace_by_id(db, workspace_id)
+    expand_fields = {field.strip() for field in (expand or "").split(",") if field.strip()}
+    unknown = expand_fields.difference(schemas.WORKSPACE_EXPANDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持展开的字段: {', '.join(sorted(unknown))}"
+        )
+    return await services.WorkspaceService.get_workspace_detail(
+        db, current_user, workspace_id, expand_fields, items_limit
+    )
+
+
+@router.get("/{workspace_id}/overview", response_model=schemas.WorkspaceOverview)
+async def get_workspace_overview(
+    workspace_id: int,
+    db: AsyncSession = Depends(get_db),
+    _=Depends(require_workspace_permission("/workspaces/{workspace_id}", action="read"))
+):
+    """获取工作区概览（集合数、集合项数、最后修改时间）"""
+    return await services.WorkspaceService.get_workspace_overview(db, workspace_id)
+
+
+@router.post("/statistics/reconcile")
+async def reconcile_workspace_statistics(
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_superuser)
+):
+    """按实际数据修复统计字段（仅限超级用户）"""
+    return await services.WorkspaceStatsService.reconcile(db)
 
 
 @router.post("/{workspace_id}/invitations", status_code=status.HTTP_201_CREATED)
@@ -196,25 +367,18 @@ async def invite_user(
             detail="Role not found in this workspace"
         )
 
-    # 检查用户是否已在工作区
-    result = await db.execute(
-        select(models.WorkspaceUser)
-        .where(models.WorkspaceUser.workspace_id == workspace_id)
-        .where(models.WorkspaceUser.user_id == invitation.user_id)
+    # 创建工作区用户关系，用户已在工作区时返回 409
+    workspace_user = await upsert(
+        db,
+        models.WorkspaceUser,
+        {"user_id": invitation.user_id, "workspace_id": workspace_id, "role_id": invitation.role_id},
+        conflict=("workspace_id", "user_id"),
     )
-    if result.scalars().first():
+    if workspace_user is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="User already in workspace"
         )
-
-    # 创建工作区用户关系
-    workspace_user = models.WorkspaceUser(
-        user_id=invitation.user_id,
-        workspace_id=workspace_id,
-        role_id=invitation.role_id
-    )
-    db.add(workspace_user)
     await db.commit()
 
     return {"message": "User invited successfully"}
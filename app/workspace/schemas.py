@@ -1,4 +1,5 @@
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
 from pydantic import BaseModel
 
 
@@ -19,6 +20,12 @@ class WorkspaceResponse(WorkspaceBase):
         from_attribute: bool = True
 
 
+class WorkspaceOverview(WorkspaceResponse):
+    collection_count: int = 0
+    item_count: int = 0
+    updated_at: Optional[datetime] = None
+
+
 # 角色相关模型
 class WorkspaceRoleBase(BaseModel):
     name: str
@@ -53,6 +60,8 @@ class WorkspaceCollectionCreate(WorkspaceCollectionBase):
 
 class WorkspaceCollectionResponse(WorkspaceCollectionBase):
     id: int
+    item_count: int = 0
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attribute: bool = True
@@ -101,3 +110,17 @@ class WorkspacePermissionResponse(WorkspacePermissionBase):
 class WorkspaceUserPermissionDetails(BaseModel):
     user_permissions: list[WorkspacePermissionBase]
     role_permissions: list[WorkspacePermissionBase]
+
+
+# 工作区详情展开
+WORKSPACE_EXPANDS = ("collections", "collections.items", "roles")
+
+
+class WorkspaceCollectionExpanded(WorkspaceCollectionResponse):
+    items: Optional[List[WorkspaceCollectionItemResponse]] = None
+    items_truncated: Optional[bool] = None
+
+
+class WorkspaceDetail(WorkspaceResponse):
+    collections: Optional[List[WorkspaceCollectionExpanded]] = None
+    roles: Optional[List[WorkspaceRoleResponse]] = None
@@ -1,9 +1,24 @@
-from sqlalchemy import select, and_
+from datetime import datetime
+
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select, update, func, and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi import HTTPException, status
 
+from app.user.models import User
 from app.permissions.models import WorkspaceRolePermissions, WorkspaceUserPermissions
+from app.permissions.engine import WorkspacePermissionEngine
+from core import storage
+from core.cache import response_cache
+from core.database import independent_session, upsert
+from core.groupcommit import apply_write
+from core.sharding import SHARD_COUNT, SHARDING_ENABLED, shard_directory
+from core.singleflight import read_flight
+from core.fields import project_columns
 from . import schemas, models
 
 
@@ -18,6 +33,102 @@ class WorkspaceService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="该工作区不存在")
         return workspace
 
+    @staticmethod
+    async def get_workspace_overview(db: AsyncSession, workspace_id: int):
+        """获取工作区及其统计字段，分片模式下统计取自工作区所在分片"""
+        workspace = await WorkspaceService.get_workspace_by_id(db, workspace_id)
+        if not SHARDING_ENABLED:
+            return workspace
+        stats = await db.get(models.WorkspaceStats, workspace_id)
+        return {
+            "id": workspace.id,
+            "name": workspace.name,
+            "description": workspace.description,
+            "collection_count": stats.collection_count if stats else 0,
+            "item_count": stats.item_count if stats else 0,
+            "updated_at": stats.updated_at if stats else None,
+        }
+
+    @staticmethod
+    async def get_workspace_detail(
+        db: AsyncSession,
+        user: User,
+        workspace_id: int,
+        expand: Set[str],
+        items_limit: int
+    ):
+        """
+        获取工作区详情并按需展开集合、集合项与角色
+
+        关联数据均以批量查询加载，查询次数与集合数量无关；每个集合最多返回 items_limit 个集合项
+        """
+        engine = WorkspacePermissionEngine(db, user)
+        expand_roles = "roles" in expand and await engine.check_permission(
+            f"/workspaces/{workspace_id}/roles", "read"
+        )
+        expand_collections = bool(expand & {"collections", "collections.items"}) and await engine.check_permission(
+            f"/workspaces/{workspace_id}/collections", "read"
+        )
+
+        stmt = select(models.Workspace).where(models.Workspace.id == workspace_id)
+        if expand_collections:
+            stmt = stmt.options(selectinload(models.Workspace.collections))
+        if expand_roles:
+            stmt = stmt.options(selectinload(models.Workspace.workspace_roles))
+        workspace = await db.scalar(stmt)
+        if not workspace:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="该工作区不存在")
+
+        detail = {"id": workspace.id, "name": workspace.name, "description": workspace.description}
+        if expand_roles:
+            detail["roles"] = workspace.workspace_roles
+        if not expand_collections:
+            return detail
+
+        collections = [
+            {
+                "id": collection.id,
+                "name": collection.name,
+                "description": collection.description,
+                "item_count": collection.item_count,
+                "updated_at": collection.updated_at,
+            }
+            for collection in workspace.collections
+        ]
+        detail["collections"] = collections
+        if "collections.items" not in expand:
+            return detail
+
+        readable = [
+            collection for collection in collections
+            if await engine.check_permission(
+                f"/workspaces/{workspace_id}/collections/{collection['id']}/items", "read"
+            )
+        ]
+        items = await WorkspaceCollectionService.get_items_for_collections(
+            db, [collection["id"] for collection in readable], items_limit + 1
+        )
+        for collection in readable:
+            collection_items = items.get(collection["id"], [])
+            collection["items"] = collection_items[:items_limit]
+            collection["items_truncated"] = len(collection_items) > items_limit
+        return detail
+
+    @staticmethod
+    async def get_workspace_version(db: AsyncSession, workspace_id: int) -> int:
+        """获取工作区数据版本"""
+        if SHARDING_ENABLED:
+            # 分片模式下以分片中的统计为准；尚未写入过集合的工作区没有统计行
+            version = await db.scalar(
+                select(models.WorkspaceStats.version).where(models.WorkspaceStats.workspace_id == workspace_id)
+            )
+            if version is not None:
+                return version
+        version = await db.scalar(select(models.Workspace.version).where(models.Workspace.id == workspace_id))
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="该工作区不存在")
+        return version
+
     @staticmethod
     async def create_workspace(db: AsyncSession, workspace_data: schemas.WorkspaceCreate, user_id: int):
         """创建工作区"""
@@ -43,20 +154,178 @@ class WorkspaceService:
             db.add(workspace_user)
 
         await db.commit()
+        if SHARDING_ENABLED:
+            shard_directory.place(workspace.id)
         await db.refresh(workspace)
         return workspace
 
     @staticmethod
-    async def get_user_workspaces(db: AsyncSession, user_id: int):
-        """获取用户所在的工作区列表"""
-        stmt = select(models.Workspace).join(
+    async def get_user_workspaces(db: AsyncSession, user_id: int, fields: Optional[List[str]] = None):
+        """获取用户所在的工作区列表，指定 fields 时仅查询对应列并返回行映射"""
+        columns = project_columns(models.Workspace, fields) if fields else [models.Workspace]
+        stmt = select(*columns).join(
             models.WorkspaceUser,
             models.Workspace.id == models.WorkspaceUser.workspace_id
         ).where(models.WorkspaceUser.user_id == user_id)
+        if fields:
+            return (await db.execute(stmt)).mappings().all()
         workspaces = await db.scalars(stmt)
         return workspaces.all()
 
 
+class WorkspaceStatsService:
+    """
+    维护工作区与集合的统计字段和数据版本，均为原子自增更新，随调用方事务一起提交
+
+    同时清除响应缓存中相关的条目；缓存键包含数据版本，提交前清除也不会留下过期数据。
+    分片模式下工作区的统计写在分片中的 workspace_stats，目录库中的 workspaces 统计由 reconcile 汇总。
+    """
+
+    @staticmethod
+    async def _workspace_changed(db: AsyncSession, workspace_id: int, now: datetime, **deltas: int) -> None:
+        """工作区计数按 deltas 增减，数据版本加一"""
+        if not SHARDING_ENABLED:
+            await db.execute(
+                update(models.Workspace)
+                .where(models.Workspace.id == workspace_id)
+                .values(
+                    **{name: getattr(models.Workspace, name) + delta for name, delta in deltas.items()},
+                    version=models.Workspace.version + 1,
+                    updated_at=now
+                )
+            )
+            return
+        stmt = sqlite_insert(models.WorkspaceStats).values(workspace_id=workspace_id, version=1, updated_at=now, **deltas)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["workspace_id"],
+            set_={
+                **{name: getattr(models.WorkspaceStats, name) + delta for name, delta in deltas.items()},
+                "version": models.WorkspaceStats.version + 1,
+                "updated_at": now,
+            },
+        ))
+
+    @staticmethod
+    async def collection_added(db: AsyncSession, workspace_id: int) -> None:
+        await WorkspaceStatsService._workspace_changed(db, workspace_id, datetime.utcnow(), collection_count=1)
+        response_cache.invalidate(f"workspace:{workspace_id}")
+
+    @staticmethod
+    async def collection_removed(db: AsyncSession, collection: models.WorkspaceCollection) -> None:
+        await WorkspaceStatsService._workspace_changed(
+            db, collection.workspace_id, datetime.utcnow(), collection_count=-1, item_count=-collection.item_count
+        )
+        response_cache.invalidate(f"workspace:{collection.workspace_id}", f"collection:{collection.id}")
+
+    @staticmethod
+    async def items_changed(db: AsyncSession, collection_id: int, delta: int) -> None:
+        """集合项数量变化时同步更新集合及其工作区的计数"""
+        now = datetime.utcnow()
+        workspace_id = await db.scalar(
+            update(models.WorkspaceCollection)
+            .where(models.WorkspaceCollection.id == collection_id)
+            .values(
+                item_count=models.WorkspaceCollection.item_count + delta,
+                version=models.WorkspaceCollection.version + 1,
+                updated_at=now
+            )
+            .returning(models.WorkspaceCollection.workspace_id)
+        )
+        if workspace_id is None:
+            return
+        await WorkspaceStatsService._workspace_changed(db, workspace_id, now, item_count=delta)
+        response_cache.invalidate(f"workspace:{workspace_id}", f"collection:{collection_id}")
+
+    @staticmethod
+    async def reconcile(db: AsyncSession):
+        """按实际数据重新计算统计字段，修复计数漂移"""
+        if SHARDING_ENABLED:
+            return await WorkspaceStatsService._reconcile_shards(db)
+        collections = await db.execute(WorkspaceStatsService._repair_collections())
+
+        collection_count = select(func.count(models.WorkspaceCollection.id)).where(
+            models.WorkspaceCollection.workspace_id == models.Workspace.id
+        ).scalar_subquery()
+        workspace_item_count = select(func.coalesce(func.sum(models.WorkspaceCollection.item_count), 0)).where(
+            models.WorkspaceCollection.workspace_id == models.Workspace.id
+        ).scalar_subquery()
+        workspaces = await db.execute(
+            update(models.Workspace)
+            .where(
+                (models.Workspace.collection_count != collection_count)
+                | (models.Workspace.item_count != workspace_item_count)
+            )
+            .values(
+                collection_count=collection_count,
+                item_count=workspace_item_count,
+                version=models.Workspace.version + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        response_cache.clear()
+        return {"collections_repaired": collections.rowcount, "workspaces_repaired": workspaces.rowcount}
+
+    @staticmethod
+    def _repair_collections():
+        item_count = select(func.count(models.WorkspaceCollectionItem.id)).where(
+            models.WorkspaceCollectionItem.collection_id == models.WorkspaceCollection.id
+        ).scalar_subquery()
+        return (
+            update(models.WorkspaceCollection)
+            .where(models.WorkspaceCollection.item_count != item_count)
+            .values(item_count=item_count, version=models.WorkspaceCollection.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    async def _reconcile_shards(db: AsyncSession):
+        """
+        分片模式下逐个分片修复集合与 workspace_stats 的计数，再把各分片的统计汇总到目录库的 workspaces
+
+        分片与目录库分别提交；汇总只覆盖有统计行的工作区。
+        """
+        collections_repaired = workspaces_repaired = 0
+        totals = {}
+        for shard in range(SHARD_COUNT):
+            db.info["shard"] = shard
+            result = await db.execute(WorkspaceStatsService._repair_collections())
+            collections_repaired += result.rowcount
+            actual = {
+                row.workspace_id: (row.collection_count, row.item_count)
+                for row in await db.execute(
+                    select(
+                        models.WorkspaceCollection.workspace_id,
+                        func.count(models.WorkspaceCollection.id).label("collection_count"),
+                        func.coalesce(func.sum(models.WorkspaceCollection.item_count), 0).label("item_count"),
+                    ).group_by(models.WorkspaceCollection.workspace_id)
+                )
+            }
+            stats = {row.workspace_id: row for row in await db.scalars(select(models.WorkspaceStats))}
+            for workspace_id in actual.keys() | stats.keys():
+                counts = actual.get(workspace_id, (0, 0))
+                row = stats.get(workspace_id)
+                if row is None:
+                    row = models.WorkspaceStats(workspace_id=workspace_id, version=0)
+                    db.add(row)
+                if (row.collection_count, row.item_count) != counts:
+                    row.collection_count, row.item_count = counts
+                    row.version += 1
+                    workspaces_repaired += 1
+                totals[workspace_id] = row
+            await db.commit()
+        db.info["shard"] = None
+        for workspace_id, row in totals.items():
+            await db.execute(
+                update(models.Workspace)
+                .where(models.Workspace.id == workspace_id)
+                .values(collection_count=row.collection_count, item_count=row.item_count, version=row.version)
+            )
+        await db.commit()
+        response_cache.clear()
+        return {"collections_repaired": collections_repaired, "workspaces_repaired": workspaces_repaired}
+
+
 class RoleService:
 
     @staticmethod
@@ -129,21 +398,18 @@ class WorkspaceCollectionService:
 
     @staticmethod
     async def create_collection(db: AsyncSession, workspace_id: int, collection_data: schemas.WorkspaceCollectionCreate):
-        """在工作区中创建集合"""
-        # 检查集合是否已存在
-        stmt = select(models.WorkspaceCollection).where(
-            models.WorkspaceCollection.name == collection_data.name,
-            models.WorkspaceCollection.workspace_id == workspace_id
+        """在工作区中创建集合，同一工作区内集合名称唯一"""
+        collection = await upsert(
+            db,
+            models.WorkspaceCollection,
+            {**collection_data.model_dump(), "workspace_id": workspace_id},
+            conflict=("workspace_id", "name"),
         )
-        existing_collection = await db.scalar(stmt)
-        if existing_collection:
+        if collection is None:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="集合已存在")
 
-        # 创建新集合
-        collection = models.WorkspaceCollection(**collection_data.model_dump(), workspace_id=workspace_id)
-        db.add(collection)
+        await WorkspaceStatsService.collection_added(db, workspace_id)
         await db.commit()
-        await db.refresh(collection)
         return collection
 
     @staticmethod
@@ -156,60 +422,164 @@ class WorkspaceCollectionService:
         return collection
 
     @staticmethod
-    async def delete_collection_by_id(db: AsyncSession, collection_id: int):
-        stmt = select(models.WorkspaceCollection).where(models.WorkspaceCollection.id == collection_id)
+    async def delete_collection_by_id(db: AsyncSession, workspace_id: int, collection_id: int):
+        """删除工作区中的集合"""
+        stmt = select(models.WorkspaceCollection).where(
+            models.WorkspaceCollection.id == collection_id,
+            models.WorkspaceCollection.workspace_id == workspace_id
+        )
         collection = await db.scalar(stmt)
-        if collection:
-            await db.delete(collection)
-            await db.commit()
+        if not collection:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="集合不存在")
+        await WorkspaceStatsService.collection_removed(db, collection)
+        await db.delete(collection)
+        await db.commit()
         return {"message": f"集合 {collection.name} 已删除"}
 
     @staticmethod
-    async def get_collections(db: AsyncSession, workspace_id: int):
-        """获取工作区中的集合列表"""
-        stmt = select(models.WorkspaceCollection).where(models.WorkspaceCollection.workspace_id == workspace_id)
-        collections = await db.scalars(stmt)
-        return collections.all()
+    async def get_collections(
+        db: AsyncSession, workspace_id: int, fields: Optional[List[str]] = None, version: Optional[int] = None
+    ):
+        """
+        获取工作区中的集合列表，指定 fields 时仅查询对应列并返回行映射
+
+        相同参数的并发读取合并为一次查询，结果在调用方之间共享，调用方不应修改。
+        version 为调用方读取到的数据版本，按它生成 ETag 时须传入：版本不同的读取不共享查询，
+        否则写入提交后到达的调用方可能拿到提交前开始的查询结果，并以新版本的 ETag 缓存下来
+        """
+        key = ("workspace_collections", workspace_id, tuple(fields or ()), version)
+        return await read_flight.do(
+            key, lambda: WorkspaceCollectionService._query_collections(db, workspace_id, fields)
+        )
+
+    @staticmethod
+    async def _query_collections(caller: AsyncSession, workspace_id: int, fields: Optional[List[str]]):
+        # 使用独立会话执行，结果不依赖任何一个调用方的会话生命周期
+        columns = project_columns(models.WorkspaceCollection, fields) if fields else [models.WorkspaceCollection]
+        stmt = select(*columns).where(models.WorkspaceCollection.workspace_id == workspace_id)
+        async with independent_session(caller) as db:
+            if fields:
+                return (await db.execute(stmt)).mappings().all()
+            collections = await db.scalars(stmt)
+            return collections.all()
 
     @staticmethod
     async def create_collection_item(db: AsyncSession, item_data: schemas.WorkspaceCollectionItemCreate):
-        """创建集合项"""
-        # 检查集合项是否已存在
-        stmt = select(models.WorkspaceCollectionItem).where(
-            and_(
-                models.WorkspaceCollectionItem.name == item_data.name,
-                models.WorkspaceCollectionItem.collection_id == item_data.collection_id
+        """创建集合项，同一集合内集合项名称唯一"""
+        values = item_data.model_dump()
+        values["image_hash"] = await storage.media_digest(item_data.image_path)
+
+        async def write(session: AsyncSession):
+            item = await upsert(session, models.WorkspaceCollectionItem, values, conflict=("collection_id", "name"))
+            if item is None:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="集合项已存在")
+            await WorkspaceStatsService.items_changed(session, item_data.collection_id, 1)
+            return item
+
+        return await apply_write(db, write)
+
+    @staticmethod
+    async def delete_collection_item(db: AsyncSession, workspace_id: int, collection_id: int, item_id: int):
+        """删除工作区集合中的集合项"""
+        async def write(session: AsyncSession):
+            stmt = (
+                select(models.WorkspaceCollectionItem)
+                .join(models.WorkspaceCollection, models.WorkspaceCollection.id == models.WorkspaceCollectionItem.collection_id)
+                .where(
+                    models.WorkspaceCollectionItem.id == item_id,
+                    models.WorkspaceCollectionItem.collection_id == collection_id,
+                    models.WorkspaceCollection.workspace_id == workspace_id
+                )
             )
-        )
-        existing_item = await db.scalar(stmt)
-        if existing_item:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="集合项已存在")
+            item = await session.scalar(stmt)
+            if not item:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="集合项不存在")
+            await WorkspaceStatsService.items_changed(session, item.collection_id, -1)
+            await session.delete(item)
+            return {"message": f"Item {item.name} has been deleted."}
 
-        # 创建新集合项
-        item = models.WorkspaceCollectionItem(**item_data.model_dump())
-        db.add(item)
-        await db.commit()
-        await db.refresh(item)
-        return item
+        return await apply_write(db, write)
 
     @staticmethod
-    async def delete_collection_item(db: AsyncSession, item_id: int):
-        """删除集合项"""
-        stmt = select(models.WorkspaceCollectionItem).where(models.WorkspaceCollectionItem.id == item_id)
-        item = await db.scalar(stmt)
-        if item:
-            await db.delete(item)
-            await db.commit()
-        return {"message": f"Item {item.name} has been deleted."}
+    async def get_collection_items(
+        db: AsyncSession, collection_id: int, fields: Optional[List[str]] = None, version: Optional[int] = None
+    ):
+        """
+        获取集合中的所有项，指定 fields 时仅查询对应列并返回行映射
+
+        相同参数的并发读取合并为一次查询，结果在调用方之间共享，调用方不应修改。
+        version 的含义同 get_collections
+        """
+        key = ("collection_items", collection_id, tuple(fields or ()), version)
+        return await read_flight.do(
+            key, lambda: WorkspaceCollectionService._query_collection_items(db, collection_id, fields)
+        )
 
     @staticmethod
-    async def get_collection_items(db: AsyncSession, collection_id: int):
-        """获取集合中的所有项"""
-        stmt = select(models.WorkspaceCollectionItem).where(
+    async def _query_collection_items(caller: AsyncSession, collection_id: int, fields: Optional[List[str]]):
+        # 使用独立会话执行，结果不依赖任何一个调用方的会话生命周期
+        columns = project_columns(models.WorkspaceCollectionItem, fields) if fields else [models.WorkspaceCollectionItem]
+        stmt = select(*columns).where(
             models.WorkspaceCollectionItem.collection_id == collection_id
         )
-        items = await db.scalars(stmt)
-        return items.all()
+        async with independent_session(caller) as db:
+            if fields:
+                return (await db.execute(stmt)).mappings().all()
+            items = await db.scalars(stmt)
+            return items.all()
+
+    @staticmethod
+    async def get_items_for_collections(db: AsyncSession, collection_ids: List[int], limit: int):
+        """单次查询批量获取多个集合的集合项，每个集合最多 limit 个"""
+        if not collection_ids:
+            return {}
+        row_number = func.row_number().over(
+            partition_by=models.WorkspaceCollectionItem.collection_id,
+            order_by=models.WorkspaceCollectionItem.id
+        ).label("row_number")
+        ranked = select(models.WorkspaceCollectionItem.id, row_number).where(
+            models.WorkspaceCollectionItem.collection_id.in_(collection_ids)
+        ).subquery()
+        stmt = (
+            select(models.WorkspaceCollectionItem)
+            .join(ranked, models.WorkspaceCollectionItem.id == ranked.c.id)
+            .where(ranked.c.row_number <= limit)
+            .order_by(models.WorkspaceCollectionItem.collection_id, models.WorkspaceCollectionItem.id)
+        )
+        items: Dict[int, list] = {}
+        for item in await db.scalars(stmt):
+            items.setdefault(item.collection_id, []).append(item)
+        return items
+
+    @staticmethod
+    async def get_collection_item(db: AsyncSession, workspace_id: int, collection_id: int, item_id: int):
+        """获取工作区集合中的指定项"""
+        stmt = select(models.WorkspaceCollectionItem).join(models.WorkspaceCollection).where(
+            models.WorkspaceCollectionItem.id == item_id,
+            models.WorkspaceCollectionItem.collection_id == collection_id,
+            models.WorkspaceCollection.workspace_id == workspace_id
+        )
+        item = await db.scalar(stmt)
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="集合项不存在")
+        return item
+
+    @staticmethod
+    async def get_item_image(db: AsyncSession, item: models.WorkspaceCollectionItem):
+        """获取集合项图片的本地路径，内容哈希缺失时计算并回填"""
+        if not item.image_path:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="该集合项没有图片")
+        try:
+            path = storage.resolve_media_path(item.image_path)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="图片不存在")
+
+        if not item.image_hash:
+            item.image_hash = await storage.media_digest(item.image_path)
+            if not item.image_hash:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="图片不存在")
+            await db.commit()
+        return path
 
 
 class WorkspacePermissionService:
@@ -235,30 +605,19 @@ class WorkspacePermissionService:
                 detail="Role does not exist or not in the workspace"
             )
 
-        # 检查权限是否已存在
-        stmt = select(WorkspaceRolePermissions).where(
-            and_(
-                WorkspaceRolePermissions.workspace_role_id == permission_data.role_id,
-                WorkspaceRolePermissions.path == permission_data.path,
-                WorkspaceRolePermissions.action == permission_data.action
-            )
-        )
-        existing_permission = await db.scalar(stmt)
-
-        if existing_permission:
-            # 更新现有权限
-            existing_permission.allow = permission_data.allow
-        else:
-            # 创建新权限
-            permission = WorkspaceRolePermissions(
-                workspace_role_id=permission_data.role_id,
-                path=permission_data.path,
-                action=permission_data.action,
-                allow=permission_data.allow
-            )
-            db.add(permission)
-
-        await db.commit()
+        # 创建权限，已存在时更新 allow
+        await apply_write(db, lambda session: upsert(
+            session,
+            WorkspaceRolePermissions,
+            {
+                "workspace_role_id": permission_data.role_id,
+                "path": permission_data.path,
+                "action": permission_data.action,
+                "allow": permission_data.allow,
+            },
+            conflict=("workspace_role_id", "path", "action"),
+            update=("allow",),
+        ))
         return {"message": "角色权限分配成功"}
 
     @staticmethod
@@ -282,30 +641,19 @@ class WorkspacePermissionService:
                 detail="用户不在该工作区内"
             )
 
-        # 检查权限是否已存在
-        stmt = select(WorkspaceUserPermissions).where(
-            and_(
-                WorkspaceUserPermissions.workspace_user_id == workspace_user.id,
-                WorkspaceUserPermissions.path == permission_data.path,
-                WorkspaceUserPermissions.action == permission_data.action
-            )
-        )
-        existing_permission = await db.scalar(stmt)
-
-        if existing_permission:
-            # 更新现有权限
-            existing_permission.allow = permission_data.allow
-        else:
-            # 创建新权限
-            permission = WorkspaceUserPermissions(
-                workspace_user_id=workspace_user.id,
-                path=permission_data.path,
-                action=permission_data.action,
-                allow=permission_data.allow
-            )
-            db.add(permission)
-
-        await db.commit()
+        # 创建权限，已存在时更新 allow
+        await apply_write(db, lambda session: upsert(
+            session,
+            WorkspaceUserPermissions,
+            {
+                "workspace_user_id": workspace_user.id,
+                "path": permission_data.path,
+                "action": permission_data.action,
+                "allow": permission_data.allow,
+            },
+            conflict=("workspace_user_id", "path", "action"),
+            update=("allow",),
+        ))
         return {"message": "用户权限分配成功"}
 
     @staticmethod
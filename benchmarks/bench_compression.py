@@ -0,0 +1,61 @@
+"""
+响应压缩基准：各编码与压缩级别的 CPU 开销与节省的字节数
+
+    python -m benchmarks.bench_compression [集合项数量] [分块KB]
+
+负载为集合项列表 JSON，按分块流式压缩（与 CompressionMiddleware 一致）。
+"""
+import sys
+import time
+
+from core.compression import available_encoders
+from core.responses import dumps
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 6, 11), "zstd": (1, 3, 9, 19)}
+
+
+def build_payload(count: int) -> bytes:
+    return dumps({
+        "message": "OK",
+        "data": [
+            {"name": f"item {i}", "image_path": f"images/{i % 97:02d}/{i:08d}.jpg", "id": i}
+            for i in range(count)
+        ],
+        "total": count,
+    })
+
+
+def compress(encoder_class, level: int, payload: bytes, chunk_size: int) -> int:
+    stream = encoder_class(level)
+    size = 0
+    for offset in range(0, len(payload), chunk_size):
+        size += len(stream.compress(payload[offset:offset + chunk_size]))
+    return size + len(stream.finish())
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    chunk_size = (int(sys.argv[2]) if len(sys.argv) > 2 else 64) * 1024
+    payload = build_payload(count)
+    print(f"原始大小 {len(payload):,} bytes，分块 {chunk_size // 1024}KB")
+    print(f"{'编码':<6}{'级别':>6}{'压缩后':>14}{'节省':>9}{'CPU ms':>10}{'MB/s':>10}")
+
+    for encoding, encoder_class in available_encoders().items():
+        for level in LEVELS[encoding]:
+            rounds = 0
+            started = time.process_time()
+            while True:
+                size = compress(encoder_class, level, payload, chunk_size)
+                rounds += 1
+                elapsed = time.process_time() - started
+                if elapsed > 0.5 or rounds >= 50:
+                    break
+            cpu = elapsed / rounds
+            print(
+                f"{encoding:<6}{level:>6}{size:>14,}{1 - size / len(payload):>9.1%}"
+                f"{cpu * 1000:>10.2f}{len(payload) / cpu / 1024 / 1024:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+全文搜索延迟基准
+
+    python -m benchmarks.bench_search [集合项数量]
+
+在临时 SQLite 数据库中写入指定数量的集合项，测量前缀查询（首页与游标翻页）的延迟。
+"""
+import os
+import sys
+import time
+import random
+import string
+import tempfile
+import statistics
+
+from sqlalchemy import create_engine, text
+
+from core.database import BaseModel
+from app.routers import api_router  # noqa: F401  注册全部模型
+from app.search.services import SearchService
+
+WORDS = ["".join(random.choices(string.ascii_lowercase, k=random.randint(4, 9))) for _ in range(5000)]
+
+
+def populate(connection, items: int) -> None:
+    connection.execute(text("INSERT INTO workspaces (id, name) VALUES (1, 'bench')"))
+    connection.execute(
+        text("INSERT INTO workspace_collections (id, name, workspace_id) VALUES (:id, :name, 1)"),
+        [{"id": i, "name": f"collection {i}"} for i in range(1, 101)],
+    )
+    batch = []
+    for i in range(1, items + 1):
+        batch.append({"name": " ".join(random.choices(WORDS, k=3)), "collection_id": random.randint(1, 100)})
+        if len(batch) == 10000:
+            connection.execute(
+                text("INSERT INTO workspace_collection_items (name, collection_id) VALUES (:name, :collection_id)"),
+                batch,
+            )
+            batch.clear()
+    if batch:
+        connection.execute(
+            text("INSERT INTO workspace_collection_items (name, collection_id) VALUES (:name, :collection_id)"), batch
+        )
+
+
+def measure(connection, query: str, rounds: int = 200) -> list:
+    stmt = text(
+        "SELECT rowid, rank FROM search_index WHERE search_index MATCH :match "
+        "AND workspace_id IN (1) ORDER BY rank, rowid LIMIT 21"
+    )
+    timings = []
+    for _ in range(rounds):
+        prefix = random.choice(WORDS)[:3]
+        started = time.perf_counter()
+        connection.execute(stmt, {"match": SearchService.build_match_query(f"{query} {prefix}".strip())}).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main() -> None:
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        BaseModel.metadata.create_all(engine)
+        with engine.begin() as connection:
+            started = time.perf_counter()
+            populate(connection, items)
+            print(f"写入 {items} 个集合项（含索引维护）: {time.perf_counter() - started:.1f}s")
+
+        with engine.connect() as connection:
+            for label, query in (("单词前缀", ""), ("两词前缀", random.choice(WORDS))):
+                timings = sorted(measure(connection, query))
+                print(
+                    f"{label}: p50 {statistics.median(timings):.2f}ms  "
+                    f"p95 {timings[int(len(timings) * 0.95)]:.2f}ms  max {timings[-1]:.2f}ms"
+                )
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+列表响应序列化基准：response_model 校验管线 与 trusted_response 直接序列化 对比
+
+    python -m benchmarks.bench_serialization [集合项数量] [轮数]
+
+两个路由返回相同的内存 ORM 对象，直接以 ASGI 方式调用，统计每次请求的 CPU 时间。
+"""
+import sys
+import time
+import asyncio
+from typing import List
+
+from fastapi import FastAPI
+
+from core.responses import resp_, trusted_response, FastJSONResponse
+from app.routers import api_router  # noqa: F401  注册全部模型
+from app.workspace import models, schemas
+
+
+def build_app(items: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get(
+        "/validated",
+        response_model=resp_(List[schemas.WorkspaceCollectionItemResponse]),
+        response_model_exclude_none=True,
+    )
+    async def validated():
+        return {"data": items, "total": len(items)}
+
+    @app.get(
+        "/validated-orjson",
+        response_model=resp_(List[schemas.WorkspaceCollectionItemResponse]),
+        response_model_exclude_none=True,
+        response_class=FastJSONResponse,
+    )
+    async def validated_orjson():
+        return {"data": items, "total": len(items)}
+
+    @app.get("/trusted", response_model=resp_(List[schemas.WorkspaceCollectionItemResponse]))
+    async def trusted():
+        return trusted_response(
+            schemas.WorkspaceCollectionItemResponse, items, exclude_none=True, envelope=True, total=len(items)
+        )
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    items = [
+        models.WorkspaceCollectionItem(id=i, name=f"item {i}", image_path=f"images/{i}.jpg" if i % 2 else None)
+        for i in range(count)
+    ]
+    app = build_app(items)
+
+    baseline = None
+    for path in ("/validated", "/validated-orjson", "/trusted"):
+        await call(app, path)
+        started = time.process_time()
+        for _ in range(rounds):
+            body = await call(app, path)
+        cpu = (time.process_time() - started) / rounds * 1000
+        baseline = baseline or cpu
+        print(f"{path:<18} cpu {cpu:>8.2f} ms/req   {baseline / cpu:>5.2f}x   {len(body):,} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
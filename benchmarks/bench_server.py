@@ -0,0 +1,119 @@
+"""
+启动方式对比：python main.py（单进程、自动重载）与 python -m core.server（多进程、预加载）
+
+    python -m benchmarks.bench_server [持续秒数] [并发连接数]
+
+每种方式在临时目录中启动（独立的 SQLite 文件），记录从启动进程到首个请求成功的时间，
+随后以 keep-alive 连接并发请求 /api/v1/users/me（令牌认证 + 一次查询）统计吞吐与延迟。
+压测客户端与服务运行在同一台机器上，会与工作进程争用 CPU，多进程的收益在核数较多时才明显。
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import sqlite3
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import List, Tuple
+
+from app.auth.dependences import create_access_token
+
+ROOT = Path(__file__).resolve().parent.parent
+HOST, PORT = "127.0.0.1", 8002
+PATH = "/api/v1/users/me"
+STARTUP_TIMEOUT = 60.0
+
+
+def http_get(path: str, token: str = "") -> bytes:
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    return f"GET {path} HTTP/1.1\r\nHost: {HOST}\r\n{auth}\r\n".encode()
+
+
+def wait_ready(started: float) -> float:
+    """轮询直到服务返回响应，返回启动耗时（秒）"""
+    while time.perf_counter() - started < STARTUP_TIMEOUT:
+        try:
+            with socket.create_connection((HOST, PORT), timeout=1) as sock:
+                sock.sendall(http_get("/metrics"))
+                if sock.recv(16).startswith(b"HTTP/1.1 200"):
+                    return time.perf_counter() - started
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError("服务启动超时")
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def load(duration: float, concurrency: int, token: str) -> Tuple[int, int, List[float]]:
+    request = http_get(PATH, token)
+    deadline = time.perf_counter() + duration
+    latencies: List[float] = []
+    errors = 0
+
+    async def client() -> None:
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(HOST, PORT)
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                writer.write(request)
+                if await read_response(reader) != 200:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return len(latencies), errors, latencies
+
+
+def run(label: str, command: List[str], env: dict, duration: float, concurrency: int) -> None:
+    workdir = tempfile.mkdtemp(prefix="bench-server-")
+    env = {**os.environ, "PYTHONPATH": str(ROOT), **env}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    try:
+        startup = wait_ready(started)
+        with sqlite3.connect(Path(workdir) / "database.db") as db:
+            db.execute("INSERT INTO users (username, hashed_password, is_active, is_superuser) VALUES ('bench', 'x', 1, 0)")
+        token = create_access_token({"sub": "bench"})
+        asyncio.run(load(1.0, concurrency, token))
+        count, errors, latencies = asyncio.run(load(duration, concurrency, token))
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=60)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:<34}{startup:>8.2f} s{count / duration:>10.0f} req/s{p50:>9.1f} ms{p99:>9.1f} ms{errors:>7}")
+
+
+def main() -> None:
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    print(f"{'启动方式':<30}{'启动耗时':>8}{'吞吐':>13}{'p50':>12}{'p99':>12}{'错误':>5}")
+    run("python main.py (reload)", [sys.executable, str(ROOT / "main.py")], {}, duration, concurrency)
+    run("core.server (1 worker)", [sys.executable, "-m", "core.server"],
+        {"WEB_WORKERS": "1", "WEB_PORT": str(PORT)}, duration, concurrency)
+    run("core.server (CPU workers)", [sys.executable, "-m", "core.server"],
+        {"WEB_PORT": str(PORT)}, duration, concurrency)
+
+
+if __name__ == "__main__":
+    main()
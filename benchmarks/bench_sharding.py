@@ -0,0 +1,134 @@
+"""
+分片基准：多租户并发写入集合项时单库与按工作区分片（core.sharding）的吞吐与延迟对比
+
+    python -m benchmarks.bench_sharding [分片数] [进程数] [每个进程的并发写入者数] [每个写入者的写入次数]
+
+每种模式在独立的临时目录中启动多个进程（模拟多个工作进程）同时写入，每个写入者写入各自的工作区。
+单库时所有工作区争用 database.db 的同一把写锁；分片时不同分片上的写入并行提交，各自 fsync。
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import statistics
+import multiprocessing
+from typing import Dict, List, Tuple
+
+# 子进程导入应用代码所需的时间上限（秒），之后所有进程同时开始写入
+START_DELAY = 5.0
+
+
+def setup(workspaces: int) -> Dict[int, int]:
+    """创建工作区与每个工作区的一个集合，返回 {工作区: 集合}"""
+    # 在子进程中导入：core.sharding 在导入时读取 WEB_SHARDS
+    from sqlalchemy import insert
+    from core.database import db_session, init_db
+    from core.sharding import SHARDING_ENABLED, shard_directory, shard_for
+    from app.routers import api_router  # noqa: F401  注册全部模型
+    from app.workspace import models, schemas
+    from app.workspace.services import WorkspaceCollectionService
+
+    async def run() -> Dict[int, int]:
+        await init_db()
+        collections = {}
+        async with db_session() as db:
+            await db.execute(insert(models.Workspace), [
+                {"id": workspace_id, "name": f"tenant {workspace_id}"} for workspace_id in range(1, workspaces + 1)
+            ])
+            await db.commit()
+        for workspace_id in range(1, workspaces + 1):
+            if SHARDING_ENABLED:
+                shard_directory.place(workspace_id)
+            async with db_session() as db:
+                db.info["shard"] = shard_for(workspace_id)
+                collection = await WorkspaceCollectionService.create_collection(
+                    db, workspace_id, schemas.WorkspaceCollectionCreate(name="bench")
+                )
+                collections[workspace_id] = collection.id
+        return collections
+
+    return asyncio.run(run())
+
+
+def work(args) -> Tuple[List[float], int, float]:
+    """一个进程中的并发写入者，返回 (各次写入延迟, 失败数, 结束时间)"""
+    process, writers, writes, collections, start_at = args
+    from sqlalchemy.exc import OperationalError
+    from core.database import db_session
+    from core.sharding import shard_for
+    from app.routers import api_router  # noqa: F401  注册全部模型
+    from app.workspace import schemas
+    from app.workspace.services import WorkspaceCollectionService
+
+    latencies: List[float] = []
+    errors = 0
+
+    async def writer(index: int) -> None:
+        nonlocal errors
+        workspace_id = process * writers + index + 1
+        for n in range(writes):
+            started = time.perf_counter()
+            async with db_session() as db:
+                # 与 get_db 相同：按工作区选择分片
+                db.info["shard"] = shard_for(workspace_id)
+                try:
+                    await WorkspaceCollectionService.create_collection_item(
+                        db, schemas.WorkspaceCollectionItemCreate(name=f"item {n}", collection_id=collections[workspace_id])
+                    )
+                except OperationalError:
+                    # 等待写锁超过 SQLite 的 busy timeout（database is locked）
+                    errors += 1
+                    continue
+            latencies.append(time.perf_counter() - started)
+
+    async def run() -> None:
+        await asyncio.gather(*(writer(index) for index in range(writers)))
+
+    # 各进程导入完成后同时开始写入
+    time.sleep(max(start_at - time.time(), 0))
+    asyncio.run(run())
+    return latencies, errors, time.time()
+
+
+def bench(shards: int, processes: int, writers: int, writes: int) -> None:
+    label = f"{shards} 个分片" if shards else "单库"
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # 子进程继承环境变量与工作目录，数据库文件均为相对路径
+        os.environ["WEB_SHARDS"] = str(shards)
+        os.chdir(directory)
+        try:
+            with multiprocessing.get_context("spawn").Pool(processes) as pool:
+                collections = pool.apply(setup, (processes * writers,))
+                start_at = time.time() + START_DELAY
+                results = pool.map(work, [
+                    (process, writers, writes, collections, start_at) for process in range(processes)
+                ])
+        finally:
+            os.chdir(cwd)
+            del os.environ["WEB_SHARDS"]
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    elapsed = max(result[2] for result in results) - start_at
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    print(
+        f"{label:<10} {len(latencies) / elapsed:>8,.0f} 次/秒   p50 {statistics.median(latencies or [0]) * 1e3:>7.1f} ms   "
+        f"p99 {p99 * 1e3:>7.1f} ms   失败 {errors}"
+    )
+
+
+def main() -> None:
+    shards = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    writes = int(sys.argv[4]) if len(sys.argv) > 4 else 25
+
+    print(f"{processes} 个进程 × {writers} 个写入者（各自的工作区） × {writes} 次写入")
+    for mode in (0, shards):
+        bench(mode, processes, writers, writes)
+
+
+if __name__ == "__main__":
+    main()
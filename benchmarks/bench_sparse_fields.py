@@ -0,0 +1,70 @@
+"""
+稀疏字段基准：完整 ORM 加载 + 响应模型序列化 与 按列查询 + 直接序列化 对比
+
+    python -m benchmarks.bench_sparse_fields [集合项数量] [轮数]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from core.database import BaseModel
+from core.fields import sparse_response
+from app.routers import api_router  # noqa: F401  注册全部模型
+from app.workspace import schemas
+from app.workspace.services import WorkspaceCollectionService
+
+FULL_ADAPTER = TypeAdapter(List[schemas.WorkspaceCollectionItemResponse])
+
+
+async def populate(engine, items: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+        await conn.execute(text("INSERT INTO workspaces (id, name) VALUES (1, 'bench')"))
+        await conn.execute(text("INSERT INTO workspace_collections (id, name, workspace_id) VALUES (1, 'bench', 1)"))
+        await conn.execute(
+            text("INSERT INTO workspace_collection_items (name, image_path, collection_id) VALUES (:name, :path, 1)"),
+            [{"name": f"item {i}", "path": f"images/{i:08d}/" + "x" * 200 + ".jpg"} for i in range(items)],
+        )
+
+
+async def run(session_factory, label: str, fields, rounds: int, items: int) -> None:
+    nbytes = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        async with session_factory() as db:
+            rows = await WorkspaceCollectionService.get_collection_items(db, 1, fields=fields)
+            if fields:
+                body = sparse_response(rows).body
+            else:
+                body = FULL_ADAPTER.dump_json(FULL_ADAPTER.validate_python(rows, from_attributes=True))
+            nbytes = len(body)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<14} {items * rounds / elapsed:>12,.0f} rows/s   {nbytes:>12,} bytes/response")
+
+
+async def main() -> None:
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    try:
+        await populate(engine, items)
+        await run(session_factory, "full", None, rounds, items)
+        await run(session_factory, "fields=id,name", ["id", "name"], rounds, items)
+    finally:
+        await engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+冷启动分析与启动耗时预算检查
+
+    python -m benchmarks.bench_startup [预算秒数]
+
+1. 以 ``-X importtime`` 导入 main，按顶层包与模块汇总导入耗时；
+2. 在全新的子进程与临时目录中测量 导入应用 / lifespan 启动 / 首次生成 OpenAPI 文档 的耗时，
+   并在缓存已存在时再次测量，重复 RUNS 次取最好成绩；
+3. 导入与 lifespan 启动耗时之和超过预算（默认 core.startup.STARTUP_BUDGET_SECONDS）时以非零状态码退出；
+   tests/test_startup.py 以同一预算断言启动耗时。
+"""
+import os
+import re
+import sys
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from core.startup import ROOT, STARTUP_BUDGET_SECONDS, measure
+
+RUNS = 3
+TOP = 15
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_python(args: List[str], cwd: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(cwd: str) -> List[Tuple[str, int, int]]:
+    """(模块, 自身耗时, 累计耗时)，单位微秒"""
+    stderr = run_python(["-X", "importtime", "-c", "import main"], cwd).stderr
+    result = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            result.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return result
+
+
+def import_report(cwd: str) -> None:
+    modules = import_times(cwd)
+    packages: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    total = sum(packages.values())
+    print(f"导入 main 共 {total / 1000:.0f} ms，{len(modules)} 个模块\n")
+    print(f"{'顶层包':<28}{'自身耗时':>10}{'占比':>8}")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:TOP]:
+        print(f"{package:<31}{self_us / 1000:>8.1f} ms{self_us / total:>8.1%}")
+    print(f"\n{'项目模块':<38}{'自身':>10}{'累计':>12}")
+    own = [item for item in modules if item[0].split(".")[0] in ("main", "app", "core")]
+    for name, self_us, cumulative_us in sorted(own, key=lambda item: item[2], reverse=True)[:TOP]:
+        print(f"{name:<40}{self_us / 1000:>8.1f} ms{cumulative_us / 1000:>9.1f} ms")
+
+
+def main() -> None:
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else STARTUP_BUDGET_SECONDS
+    import_report(tempfile.mkdtemp(prefix="bench-startup-"))
+
+    cold: Dict[str, float] = {}
+    warm: Dict[str, float] = {}
+    for _ in range(RUNS):
+        # 每轮使用新的工作目录：首次启动无 OpenAPI 缓存，第二次启动读取缓存
+        cwd = tempfile.mkdtemp(prefix="bench-startup-")
+        for best, result in ((cold, measure(cwd)), (warm, measure(cwd))):
+            for key, value in result.items():
+                best[key] = min(best.get(key, value), value)
+
+    print(f"\n{'阶段':<18}{'无缓存':>12}{'有缓存':>12}")
+    for key in cold:
+        print(f"{key:<20}{cold[key] * 1000:>10.0f} ms{warm[key] * 1000:>10.0f} ms")
+
+    startup = warm["import"] + warm["lifespan"]
+    print(f"\n启动耗时 {startup:.2f} s，预算 {budget:.2f} s")
+    if startup > budget:
+        print("超出启动耗时预算", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
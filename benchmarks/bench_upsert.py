@@ -0,0 +1,200 @@
+"""
+写路径基准：先查询后插入（SELECT + INSERT + refresh）与单条 INSERT ... ON CONFLICT ... RETURNING 对比
+
+    python -m benchmarks.bench_upsert [每轮写入数] [并发进程数]
+
+1. 单连接延迟：创建集合、重复创建（409）与更新权限的 p50 / p99 延迟及每次写入的 SQL 条数
+2. 并发写入：多个进程同时创建同名集合，检查每个名称恰好创建一次，其余均为 409 而非 500
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import statistics
+import multiprocessing
+
+from fastapi import HTTPException
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from core.database import BaseModel
+from app.routers import api_router  # noqa: F401  注册全部模型
+from app.permissions.models import WorkspaceRolePermissions
+from app.workspace import models, schemas
+from app.workspace.services import WorkspaceCollectionService, WorkspacePermissionService, WorkspaceStatsService
+
+
+async def legacy_create_collection(db, workspace_id: int, collection_data: schemas.WorkspaceCollectionCreate):
+    """改为 upsert 之前的实现"""
+    stmt = select(models.WorkspaceCollection).where(
+        models.WorkspaceCollection.name == collection_data.name,
+        models.WorkspaceCollection.workspace_id == workspace_id
+    )
+    if await db.scalar(stmt):
+        raise HTTPException(status_code=409, detail="集合已存在")
+    collection = models.WorkspaceCollection(**collection_data.model_dump(), workspace_id=workspace_id)
+    db.add(collection)
+    await WorkspaceStatsService.collection_added(db, workspace_id)
+    await db.commit()
+    await db.refresh(collection)
+    return collection
+
+
+async def legacy_assign_role_permission(db, permission_data: schemas.WorkspaceRolePermissionCreate):
+    """改为 upsert 之前的实现"""
+    role = await db.scalar(select(models.WorkspaceRole).where(
+        models.WorkspaceRole.id == permission_data.role_id,
+        models.WorkspaceRole.workspace_id == permission_data.workspace_id
+    ))
+    if not role:
+        raise HTTPException(status_code=404, detail="Role does not exist or not in the workspace")
+    stmt = select(WorkspaceRolePermissions).where(
+        WorkspaceRolePermissions.workspace_role_id == permission_data.role_id,
+        WorkspaceRolePermissions.path == permission_data.path,
+        WorkspaceRolePermissions.action == permission_data.action
+    )
+    existing_permission = await db.scalar(stmt)
+    if existing_permission:
+        existing_permission.allow = permission_data.allow
+    else:
+        db.add(WorkspaceRolePermissions(
+            workspace_role_id=permission_data.role_id,
+            path=permission_data.path,
+            action=permission_data.action,
+            allow=permission_data.allow
+        ))
+    await db.commit()
+
+
+async def assign_role_permission(db, permission_data: schemas.WorkspaceRolePermissionCreate):
+    await WorkspacePermissionService.assign_role_permission(db, permission_data)
+
+
+async def create_collection(db, workspace_id: int, collection_data: schemas.WorkspaceCollectionCreate):
+    return await WorkspaceCollectionService.create_collection(db, workspace_id, collection_data)
+
+
+def open_engine(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 30})
+    statements = [0]
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(*args):
+        statements[0] += 1
+
+    return engine, async_sessionmaker(bind=engine, expire_on_commit=False), statements
+
+
+async def populate(path: str) -> None:
+    engine, _, _ = open_engine(path)
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+        await conn.execute(text("INSERT INTO workspaces (id, name) VALUES (1, 'bench'), (2, 'bench')"))
+        await conn.execute(text("INSERT INTO workspace_roles (id, name, workspace_id) VALUES (1, 'member', 1)"))
+    await engine.dispose()
+
+
+async def timed(session_factory, statements, label: str, calls) -> None:
+    latencies = []
+    before = statements[0]
+    for call in calls:
+        started = time.perf_counter()
+        async with session_factory() as db:
+            try:
+                await call(db)
+            except HTTPException:
+                pass
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{label:<28} p50 {statistics.median(latencies) * 1e3:>7.3f} ms   p99 {p99 * 1e3:>7.3f} ms   "
+        f"{(statements[0] - before) / len(latencies):>4.1f} SQL/次"
+    )
+
+
+async def latency(path: str, writes: int) -> None:
+    engine, session_factory, statements = open_engine(path)
+    variants = (
+        ("select+insert", legacy_create_collection, legacy_assign_role_permission, 1),
+        ("upsert", create_collection, assign_role_permission, 2),
+    )
+    try:
+        for label, create, assign, workspace_id in variants:
+            names = [schemas.WorkspaceCollectionCreate(name=f"c{i}") for i in range(writes)]
+            await timed(session_factory, statements, f"{label} 创建集合", [
+                lambda db, data=data: create(db, workspace_id, data) for data in names
+            ])
+            await timed(session_factory, statements, f"{label} 重复创建 (409)", [
+                lambda db, data=data: create(db, workspace_id, data) for data in names
+            ])
+            permissions = [
+                schemas.WorkspaceRolePermissionCreate(
+                    path=f"/workspaces/1/{label}/{i % 10}", action="read", allow=bool(i // 10 % 2), role_id=1, workspace_id=1
+                )
+                for i in range(writes)
+            ]
+            await timed(session_factory, statements, f"{label} 分配权限", [
+                lambda db, data=data: assign(db, data) for data in permissions
+            ])
+    finally:
+        await engine.dispose()
+
+
+def contend(args) -> dict:
+    path, create_name, workspace_id, names = args
+    create = {"legacy": legacy_create_collection, "upsert": create_collection}[create_name]
+
+    async def worker() -> dict:
+        engine, session_factory, _ = open_engine(path)
+        outcome = {"created": 0, "conflict": 0, "error": 0}
+        try:
+            for i in range(names):
+                async with session_factory() as db:
+                    try:
+                        await create(db, workspace_id, schemas.WorkspaceCollectionCreate(name=f"race {i}"))
+                        outcome["created"] += 1
+                    except HTTPException:
+                        outcome["conflict"] += 1
+                    except (IntegrityError, OperationalError):
+                        outcome["error"] += 1
+        finally:
+            await engine.dispose()
+        return outcome
+
+    return asyncio.run(worker())
+
+
+def concurrency(path: str, writes: int, processes: int) -> bool:
+    ok = True
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        for create_name, workspace_id in (("legacy", 1), ("upsert", 2)):
+            results = pool.map(contend, [(path, create_name, workspace_id, writes)] * processes)
+            total = {key: sum(result[key] for result in results) for key in results[0]}
+            print(f"{create_name:<8} {processes} 个进程 × {writes} 个名称: {total}")
+            if create_name == "upsert":
+                ok = total == {"created": writes, "conflict": writes * (processes - 1), "error": 0}
+    return ok
+
+
+def main() -> None:
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        asyncio.run(populate(path))
+        asyncio.run(latency(path, writes))
+        ok = concurrency(path, writes, processes)
+    finally:
+        os.remove(path)
+    if not ok:
+        print("并发写入结果不符合预期：每个名称应恰好创建一次")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
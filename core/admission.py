@@ -0,0 +1,266 @@
+import re
+import math
+import asyncio
+from time import perf_counter
+from collections import deque
+from typing import Deque, Dict, NamedTuple, Optional, Pattern, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import Counter, Histogram, POOL_WAIT_BUCKETS
+
+
+class AdmissionPolicy(NamedTuple):
+    # 初始并发上限；自适应调整时在 [min_limit, max_limit] 之间变化
+    limit: int
+    min_limit: int
+    max_limit: int
+    # 最多排队等待的请求数，超过后直接拒绝
+    queue: int
+    # 目标延迟（秒，从放行到开始发送响应），超过时收缩并发上限
+    target_latency: float
+
+
+# 各类请求独立限流，登录、批量操作等昂贵请求占满自己的配额时不影响普通读请求
+ADMISSION_POLICIES: Dict[str, AdmissionPolicy] = {
+    "read": AdmissionPolicy(limit=64, min_limit=8, max_limit=256, queue=256, target_latency=0.5),
+    "write": AdmissionPolicy(limit=32, min_limit=4, max_limit=128, queue=128, target_latency=1.0),
+    # 密码哈希（bcrypt）为 CPU 密集操作
+    "auth": AdmissionPolicy(limit=8, min_limit=2, max_limit=32, queue=32, target_latency=2.0),
+    "bulk": AdmissionPolicy(limit=2, min_limit=1, max_limit=8, queue=8, target_latency=10.0),
+}
+# 所有类别合计的并发上限
+ADMISSION_GLOBAL_LIMIT = 256
+# 请求最长排队时间（秒），超时返回 503
+ADMISSION_QUEUE_TIMEOUT = 2.0
+ADMISSION_RETRY_AFTER = 1
+# 是否按观测到的延迟自适应调整各类别的并发上限（AIMD）
+ADMISSION_ADAPTIVE = True
+# 延迟超过目标时并发上限乘以该系数
+ADMISSION_DECREASE_FACTOR = 0.9
+# 不受准入控制的路径（监控抓取在过载时也需要可用）
+ADMISSION_EXEMPT_PATHS = frozenset({"/metrics"})
+
+# 按顺序匹配 (类别, 方法, 路径)，方法为 None 表示任意方法；均不匹配时 GET/HEAD/OPTIONS 为 read，其余为 write
+ROUTE_CLASS_RULES: Tuple[Tuple[str, Optional[frozenset], Pattern], ...] = (
+    ("auth", frozenset({"POST"}), re.compile(r"^/api/v1/(auth/login|users)/?$")),
+    # 批量请求在一个请求内执行多达数十个子请求，与其他批量操作一起限制并发，避免挤占读请求
+    ("bulk", None, re.compile(r"^/api/v1/(search/rebuild|workspaces/statistics/reconcile|batch)/?$")),
+)
+_READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests shed by admission control", ("class", "reason")
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds", "Time admitted requests spent queued", ("class",), buckets=POOL_WAIT_BUCKETS
+)
+
+
+def classify(method: str, path: str) -> str:
+    for kind, methods, pattern in ROUTE_CLASS_RULES:
+        if (methods is None or method in methods) and pattern.match(path):
+            return kind
+    return "read" if method in _READ_METHODS else "write"
+
+
+class Overloaded(Exception):
+    def __init__(self, limiter: str, reason: str):
+        super().__init__(f"{limiter}: {reason}")
+        self.limiter = limiter
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """
+    带有界 FIFO 等待队列的并发限制器
+
+    释放时直接把名额交给队首的等待者，避免新到达的请求插队。adaptive 为 True 时按 AIMD 调整上限：
+    放行后的处理延迟超过目标延迟时上限乘以 ADMISSION_DECREASE_FACTOR（每个目标延迟周期最多一次），
+    上限成为瓶颈（满载或有排队）时每完成约 limit 个请求上限加一。
+    只在事件循环线程中使用，不加锁。
+    """
+
+    def __init__(self, name: str, policy: AdmissionPolicy, adaptive: bool = False):
+        self.name = name
+        self.policy = policy
+        self.adaptive = adaptive
+        self.limit = policy.limit
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._growth = 0
+        self._decreased_at = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, deadline: float) -> None:
+        """取得一个名额，队列已满或到 deadline（事件循环时间）仍未轮到时抛出 Overloaded"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.policy.queue:
+            self.rejected += 1
+            raise Overloaded(self.name, "queue_full")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append(future)
+        expire = loop.call_at(deadline, self._expire, future)
+        try:
+            granted = await future
+        except asyncio.CancelledError:
+            # 取消与交付名额可能发生在同一轮事件循环中
+            if future.done() and not future.cancelled() and future.result():
+                self.release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+        finally:
+            expire.cancel()
+        if not granted:
+            self.rejected += 1
+            raise Overloaded(self.name, "timeout")
+        self.admitted += 1
+
+    def release(self, latency: Optional[float] = None) -> None:
+        self.in_flight -= 1
+        if self.adaptive and latency is not None:
+            self._adjust(latency)
+        self._wake()
+
+    def _expire(self, future: asyncio.Future) -> None:
+        if not future.done():
+            self._waiters.remove(future)
+            future.set_result(False)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(True)
+
+    def _adjust(self, latency: float) -> None:
+        policy = self.policy
+        if latency > policy.target_latency:
+            now = perf_counter()
+            if now - self._decreased_at >= policy.target_latency:
+                self.limit = max(policy.min_limit, math.floor(self.limit * ADMISSION_DECREASE_FACTOR))
+                self._decreased_at = now
+                self._growth = 0
+        elif self._waiters or self.in_flight + 1 >= self.limit:
+            self._growth += 1
+            if self._growth >= self.limit:
+                self.limit = min(policy.max_limit, self.limit + 1)
+                self._growth = 0
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionController:
+    """按请求类别与全局两级限制并发，每个工作进程各自计数"""
+
+    def __init__(
+        self,
+        policies: Dict[str, AdmissionPolicy] = ADMISSION_POLICIES,
+        global_limit: int = ADMISSION_GLOBAL_LIMIT,
+        adaptive: bool = ADMISSION_ADAPTIVE,
+    ):
+        self.limiters = {kind: ConcurrencyLimiter(kind, policy, adaptive) for kind, policy in policies.items()}
+        queue = sum(policy.queue for policy in policies.values())
+        self.global_limiter = ConcurrencyLimiter(
+            "global", AdmissionPolicy(global_limit, global_limit, global_limit, queue, math.inf)
+        )
+
+    def stats(self) -> dict:
+        result = {}
+        for name, limiter in (*self.limiters.items(), ("global", self.global_limiter)):
+            for key, value in limiter.stats().items():
+                result[f"{name}_{key}"] = value
+        return result
+
+
+admission_controller = AdmissionController()
+
+
+def _overloaded_response() -> JSONResponse:
+    return JSONResponse(
+        {"message": "服务繁忙，请稍后重试"},
+        status_code=503,
+        headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+    )
+
+
+class AdmissionMiddleware:
+    """
+    准入控制：超过并发上限的请求在有界队列中按先到先得等待，队列已满或等待超过 ADMISSION_QUEUE_TIMEOUT
+    时立即返回 503 与 Retry-After，避免过载时所有请求都排队直到客户端超时
+
+    处理延迟以放行到开始发送响应计算，不含慢客户端接收响应体的时间。
+
+    nested 为 True 时用于批量请求的子请求：外层请求已占用 bulk 与全局名额，读类子请求不再计数，
+    其他子请求只占用所属类别的名额，不占用全局名额，避免批量请求等待自己已占用的名额。
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller, nested: bool = False):
+        self.app = app
+        self.controller = controller
+        self.nested = nested
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in ADMISSION_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        kind = classify(scope["method"], scope["path"])
+        if self.nested and kind == "read":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.limiters[kind]
+        global_limiter = None if self.nested else self.controller.global_limiter
+        queued_at = perf_counter()
+        deadline = asyncio.get_running_loop().time() + ADMISSION_QUEUE_TIMEOUT
+        try:
+            await limiter.acquire(deadline)
+            if global_limiter is not None:
+                try:
+                    await global_limiter.acquire(deadline)
+                except BaseException:
+                    limiter.release()
+                    raise
+        except Overloaded as exc:
+            ADMISSION_REJECTED.inc(kind, exc.reason)
+            await _overloaded_response()(scope, receive, send)
+            return
+
+        admitted_at = perf_counter()
+        ADMISSION_QUEUE_WAIT.observe(admitted_at - queued_at, kind)
+        latency: Optional[float] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal latency
+            if message["type"] == "http.response.start":
+                latency = perf_counter() - admitted_at
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if global_limiter is not None:
+                global_limiter.release()
+            limiter.release(latency)
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+
+from fastapi.responses import Response
+
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# 单个条目最多占用总容量的比例，避免一个大响应挤出全部缓存
+RESPONSE_CACHE_MAX_ENTRY_RATIO = 0.125
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    tags: tuple
+
+
+class ResponseCache:
+    """
+    进程内的已序列化响应缓存，按字节数限制容量的 LRU
+
+    键由调用方生成，需包含路由、查询参数、数据版本与授权指纹，保证授权相同的用户才会共享条目；
+    写服务通过标签（如 ``workspace:1``、``collection:2``）主动清除相关条目以尽早释放内存。
+    所有方法都只在事件循环线程中调用，因此不需要加锁。
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = int(max_bytes * RESPONSE_CACHE_MAX_ENTRY_RATIO)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def get_response(self, key: str, headers: Optional[Dict[str, str]] = None) -> Optional[Response]:
+        entry = self.get(key)
+        if entry is None:
+            return None
+        return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+    def put(self, key: str, response: Response, tags: Iterable[str] = ()) -> None:
+        body = bytes(response.body)
+        if len(body) > self.max_entry_bytes:
+            return
+        self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = CachedResponse(body, response.media_type or "application/json", tags)
+        self.total_bytes += len(body)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tags: str) -> None:
+        """清除带有任一指定标签的条目"""
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                if self._remove(key):
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.total_bytes = 0
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.total_bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,225 @@
+import zlib
+from typing import Callable, Dict, Optional, Sequence
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 默认压缩级别，兼顾 JSON 响应的压缩率与 CPU 开销
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+# 服务端偏好顺序，客户端 q 值相同时按此顺序选择
+DEFAULT_ENCODINGS = ("zstd", "br", "gzip")
+# 已压缩或不宜压缩的内容类型前缀
+DEFAULT_EXCLUDED_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/zstd",
+    "application/octet-stream",
+    "text/event-stream",
+)
+
+
+class GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # 每个分块同步刷新，保证流式响应能够逐块送达客户端
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encoders() -> Dict[str, Callable]:
+    """当前环境可用的压缩编码"""
+    encoders: Dict[str, Callable] = {"gzip": GzipStream}
+    if brotli is not None:
+        encoders["br"] = BrotliStream
+    if zstandard is not None:
+        encoders["zstd"] = ZstdStream
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: str, supported: Sequence[str]) -> Optional[str]:
+    """根据 Accept-Encoding（含 q 值）从服务端支持的编码中选出最合适的一个"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件，支持 gzip 以及已安装时的 zstd、br
+
+    按分块流式压缩，只缓冲到 minimum_size 以判断响应是否值得压缩；已压缩的内容类型、
+    已带 Content-Encoding 的响应以及小于 minimum_size 的响应原样返回。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        levels: Optional[Dict[str, int]] = None,
+        encodings: Sequence[str] = DEFAULT_ENCODINGS,
+        excluded_types: Sequence[str] = DEFAULT_EXCLUDED_TYPES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+        encoders = available_encoders()
+        self.encoders = {encoding: encoders[encoding] for encoding in encodings if encoding in encoders}
+        self.excluded_types = tuple(excluded_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), tuple(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """单个响应的压缩状态"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.pending = b""
+        self.stream = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or content_type.startswith(self.middleware.excluded_types)
+                or message["status"] in (204, 304)
+            )
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        if message_type in ("http.response.zerocopy", "http.response.pathsend"):
+            # 需要压缩时无法零拷贝，读出文件内容后按普通分块处理
+            message = {
+                "type": "http.response.body",
+                "body": await anyio.to_thread.run_sync(_read_file_message, message),
+                "more_body": message.get("more_body", False),
+            }
+        elif message_type != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.stream is None:
+            self.pending += body
+            if more_body and len(self.pending) < self.middleware.minimum_size:
+                return
+            if not more_body and len(self.pending) < self.middleware.minimum_size:
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": self.pending, "more_body": False})
+                return
+            await self._start_compression()
+            body, self.pending = self.pending, b""
+
+        chunk = self.stream.compress(body) if body else b""
+        if not more_body:
+            chunk += self.stream.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _start_compression(self) -> None:
+        level = self.middleware.levels[self.encoding]
+        self.stream = self.middleware.encoders[self.encoding](level)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        del headers["content-length"]
+        headers["content-encoding"] = self.encoding
+        headers.add_vary_header("accept-encoding")
+        # 内容已改变，强 ETag 不再适用
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = "W/" + etag
+        await self._send(self.start_message)
+
+
+def _read_file_message(message: Message) -> bytes:
+    if message["type"] == "http.response.pathsend":
+        with open(message["path"], "rb") as f:
+            return f.read()
+    file = message["file"]
+    file.seek(message.get("offset") or 0)
+    count = message.get("count")
+    return file.read(-1 if count is None else count)
@@ -1,26 +1,48 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi import Request
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+from core.metrics import InstrumentedQueuePool
+from core.sharding import (
+    SHARD_DIR, SHARDED_TABLES, SHARDING_ENABLED, ShardRoutingSession, shard_directory, shard_engines, shard_for
+)
+
 SQLALCHEMY_DATABASE_URI = 'sqlite+aiosqlite:///./database.db'
 
+logger = logging.getLogger("app.database")
+
 
 def create_engine_and_session():
     try:
-        engine_ = create_async_engine(SQLALCHEMY_DATABASE_URI, future=True, echo=False)
+        engine_ = create_async_engine(
+            SQLALCHEMY_DATABASE_URI, future=True, echo=False, poolclass=InstrumentedQueuePool
+        )
     except Exception as e:
-        print(f"数据库连接失败 {e}")
+        logger.error("数据库连接失败 %s", e)
         raise e
 
-    # 创建异步数据库会话
-    db_session_ = async_sessionmaker(autocommit=False, autoflush=False, bind=engine_, expire_on_commit=False)
+    # 创建异步数据库会话；分片模式下会话按表在目录库与工作区所在分片之间路由（见 core.sharding）
+    db_session_ = async_sessionmaker(
+        autocommit=False, autoflush=False, bind=engine_, expire_on_commit=False,
+        sync_session_class=ShardRoutingSession if SHARDING_ENABLED else Session,
+    )
     return engine_, db_session_
 
 
 engine, db_session = create_engine_and_session()
 
 
-async def get_db():
+async def get_db(request: Request):
     session = db_session()
+    if SHARDING_ENABLED:
+        session.info["shard"] = shard_for(request.path_params.get("workspace_id"))
     try:
         yield session
     except Exception as e:
@@ -34,12 +56,137 @@ async def get_db():
 BaseModel = declarative_base()
 
 
-async def init_db():
+def independent_session(db: AsyncSession) -> AsyncSession:
+    """与 db 访问相同数据库（含分片）的独立会话，生命周期不依赖 db"""
+    return AsyncSession(bind=db.bind, sync_session_class=db.sync_session_class, info=dict(db.info), expire_on_commit=False)
+
+
+async def init_db() -> List[str]:
+    """
+    建表并升级已有数据库，返回本次补加的列（"表.列"）
+
+    补加的统计列取 server_default 的初始值，调用方应随后重新计算统计（WorkspaceStatsService.reconcile）。
+    """
+    added = []
     try:
-        async with engine.begin() as conn:
-            await conn.run_sync(BaseModel.metadata.create_all)
-        print("数据库初始化完成")
-    except Exception as e:
-        import traceback
-        print(traceback.format_exc())
-        print("Error: 数据库初始化失败")
+        tables = BaseModel.metadata.sorted_tables
+        if SHARDING_ENABLED:
+            SHARD_DIR.mkdir(parents=True, exist_ok=True)
+            shard_directory.connect()
+            for shard_engine in shard_engines:
+                added += await _create_schema(shard_engine, [table for table in tables if table.name in SHARDED_TABLES])
+            tables = [table for table in tables if table.name not in SHARDED_TABLES]
+        added += await _create_schema(engine, tables)
+        logger.info("数据库初始化完成")
+    except Exception:
+        logger.exception("数据库初始化失败")
+    return added
+
+
+async def _create_schema(engine_, tables) -> List[str]:
+    async with engine_.begin() as conn:
+        # 多个工作进程同时启动时，先取得写锁再检查并建表，避免重复建表
+        if engine_.dialect.name == "sqlite":
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+        added = await conn.run_sync(_add_missing_columns, tables)
+        await conn.run_sync(BaseModel.metadata.create_all, tables=tables)
+        await conn.run_sync(_create_missing_indexes, tables)
+    return added
+
+
+def _add_missing_columns(conn, tables) -> List[str]:
+    """create_all 不会为已存在的表补加列，升级已有数据库时按模型 ALTER TABLE ... ADD COLUMN 补加缺少的列"""
+    inspector = inspect(conn)
+    added = []
+    for table in tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            # NOT NULL 的列须有 server_default，已有行取该默认值
+            conn.exec_driver_sql(
+                f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} "
+                f"ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"
+            )
+            added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info("已为现有表补加列: %s", ", ".join(added))
+    return added
+
+
+def _create_missing_indexes(conn, tables):
+    """create_all 不会为已存在的表补建索引，升级已有数据库时逐个补建；唯一索引遇到重复数据时记录日志并跳过"""
+    for table in tables:
+        for index in table.indexes:
+            try:
+                with conn.begin_nested():
+                    index.create(conn, checkfirst=True)
+            except IntegrityError:
+                logger.error("唯一索引 %s 创建失败，表 %s 中存在重复数据，清理后重启以启用依赖该索引的写入", index.name, table.name)
+
+
+def _dialect_insert(dialect_name: str):
+    """支持 INSERT ... ON CONFLICT 的方言的 insert 构造函数，其他方言返回 None"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+async def upsert(
+    db: AsyncSession,
+    model,
+    values: Dict[str, Any],
+    conflict: Sequence[str],
+    update: Optional[Sequence[str]] = None,
+):
+    """
+    单条语句插入或更新：INSERT ... ON CONFLICT (conflict) DO UPDATE / DO NOTHING ... RETURNING
+
+    conflict 须对应一个唯一索引。update 为冲突时要更新的列，省略时冲突则什么都不做并返回 None，
+    调用方据此返回 409；否则返回插入或更新后的 ORM 对象（含数据库默认值，无需再 refresh）。
+    唯一性由数据库在同一语句内保证，并发写入不存在先查询后插入的竞态窗口。
+    不支持 ON CONFLICT 的数据库退化为 _insert_or_update。
+    """
+    insert = _dialect_insert(db.bind.dialect.name)
+    if insert is None:
+        return await _insert_or_update(db, model, values, conflict, update)
+    stmt = insert(model).values(**values)
+    if update:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict),
+            set_={column: stmt.excluded[column] for column in update},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict))
+    stmt = stmt.returning(model).execution_options(populate_existing=True)
+    return await db.scalar(stmt)
+
+
+async def _insert_or_update(
+    db: AsyncSession,
+    model,
+    values: Dict[str, Any],
+    conflict: Sequence[str],
+    update: Optional[Sequence[str]] = None,
+):
+    """在 SAVEPOINT 中插入，违反唯一约束时回滚该 SAVEPOINT，再按 update 更新已有行或返回 None"""
+    try:
+        async with db.begin_nested():
+            instance = model(**values)
+            db.add(instance)
+        return instance
+    except IntegrityError:
+        if not update:
+            return None
+    instance = await db.scalar(select(model).filter_by(**{column: values[column] for column in conflict}))
+    if instance is not None:
+        for column in update:
+            setattr(instance, column, values[column])
+        await db.flush()
+    return instance
@@ -0,0 +1,53 @@
+from typing import List, Optional, Type
+
+from pydantic import BaseModel
+from fastapi import HTTPException, Query, status
+from fastapi.responses import Response
+
+from core.responses import dumps
+from core.timing import phase
+
+
+def sparse_fields(schema: Type[BaseModel]):
+    """
+    生成 ``fields`` 查询参数依赖，可选字段为响应模型的字段
+
+    未传入时返回 None，表示返回完整对象
+    """
+    allowed = tuple(schema.model_fields)
+
+    def dependency(
+        fields: Optional[str] = Query(None, description=f"仅返回指定字段，逗号分隔，可选：{', '.join(allowed)}")
+    ) -> Optional[List[str]]:
+        if fields is None:
+            return None
+        selected = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+        unknown = [field for field in selected if field not in allowed]
+        if not selected or unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持的字段: {', '.join(unknown)}" if unknown else "fields 不能为空"
+            )
+        return selected
+
+    return dependency
+
+
+def project_columns(model, fields: List[str]) -> list:
+    """将字段名映射为 ORM 模型的列，用于只查询所需列的 select()"""
+    return [getattr(model, field) for field in fields]
+
+
+def sparse_response(rows, **extra) -> Response:
+    """
+    直接序列化按列查询的结果行，绕过完整响应模型
+
+    传入 extra 时按 ResponseBase 的结构包装（省略值为 None 的字段）
+    """
+    with phase("serialize"):
+        content = [dict(row) for row in rows]
+        if extra:
+            content = {"message": "OK", "data": content}
+            content.update({key: value for key, value in extra.items() if value is not None})
+        body = dumps(content)
+    return Response(body, media_type="application/json")
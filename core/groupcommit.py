@@ -0,0 +1,161 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import db_session
+from core.metrics import Histogram
+
+T = TypeVar("T")
+
+# 是否合并并发的小写操作统一提交（opt-in，WEB_GROUP_COMMIT=1 开启）；关闭时每个写操作在调用方会话中单独提交
+GROUP_COMMIT_ENABLED = os.environ.get("WEB_GROUP_COMMIT", "").lower() in ("1", "true", "yes", "on")
+# 第一个写操作到达后等待更多写操作加入同一批次的时间（秒），环境变量以毫秒为单位
+GROUP_COMMIT_WINDOW = float(os.environ.get("WEB_GROUP_COMMIT_WINDOW_MS", "2")) / 1000
+# 单个事务中最多包含的写操作数
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("WEB_GROUP_COMMIT_MAX_BATCH", "64"))
+
+logger = logging.getLogger("app.groupcommit")
+
+GROUP_COMMIT_BATCH_SIZE = Histogram(
+    "group_commit_batch_size", "Write operations committed per transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+
+
+class _Write(NamedTuple):
+    operation: WriteOperation
+    future: asyncio.Future
+
+
+class WriteCoalescer:
+    """
+    合并提交（group commit）：并发的小写操作排队，在同一个事务中依次执行后只提交一次
+
+    SQLite 同一时刻只允许一个写事务，逐个提交时每次提交都要等待一次 fsync。每个写操作在独立的 SAVEPOINT 中执行，
+    失败时只回滚它自己的修改并把异常交给对应的调用方，其余写操作照常提交；提交本身失败时同批次的调用方都收到该异常。
+    正在提交时到达的写操作进入下一批次，因此负载越高批次越大。只在事件循环线程中使用，不加锁。
+    分片模式下按调用方会话的分片分别排队与提交，不同分片的批次并行执行。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[..., AsyncSession] = db_session,
+        window: float = GROUP_COMMIT_WINDOW,
+        max_batch: int = GROUP_COMMIT_MAX_BATCH,
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self._queues: Dict[Optional[int], Deque[_Write]] = {}
+        self._workers: Dict[Optional[int], asyncio.Task] = {}
+
+    async def submit(self, operation: WriteOperation, shard: Optional[int] = None) -> T:
+        """
+        排队执行写操作并等待所在批次提交，返回写操作的结果或抛出它的异常
+
+        写操作只应使用传入的会话，不应自行提交；调用方在排队期间被取消时写操作不再执行，开始执行后无法撤销。
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queues.setdefault(shard, deque()).append(_Write(operation, future))
+        worker = self._workers.get(shard)
+        if worker is None or worker.done() or worker.get_loop() is not loop:
+            self._workers[shard] = loop.create_task(self._run(shard))
+        return await future
+
+    async def _run(self, shard: Optional[int]) -> None:
+        if self.window > 0:
+            await asyncio.sleep(self.window)
+        queue = self._queues[shard]
+        while queue:
+            batch = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+            await self._commit(batch, shard)
+
+    async def _commit(self, batch: List[_Write], shard: Optional[int] = None) -> None:
+        outcomes: List[Tuple[_Write, Optional[BaseException], Any]] = []
+        try:
+            async with self.session_factory(info={"shard": shard}) as db:
+                event.listen(db.sync_session, "after_begin", _begin_immediate)
+                for write in batch:
+                    if write.future.cancelled():
+                        continue
+                    try:
+                        async with db.begin_nested():
+                            result = await write.operation(db)
+                    except Exception as exc:
+                        outcomes.append((write, exc, None))
+                    else:
+                        outcomes.append((write, None, result))
+                try:
+                    await db.commit()
+                except Exception as exc:
+                    logger.exception("group_commit_failed")
+                    outcomes = [(write, error or exc, None) for write, error, _ in outcomes]
+        except BaseException as exc:
+            # 会话本身出错或工作任务被取消，同批次的调用方都收到该异常
+            for write in batch:
+                if not write.future.done():
+                    if isinstance(exc, Exception):
+                        write.future.set_exception(exc)
+                    else:
+                        write.future.cancel()
+            if not isinstance(exc, Exception):
+                raise
+            logger.exception("group_commit_failed")
+            return
+
+        self.batches += 1
+        self.operations += len(outcomes)
+        GROUP_COMMIT_BATCH_SIZE.observe(len(outcomes))
+        for write, error, result in outcomes:
+            if write.future.done():
+                continue
+            if error is not None:
+                self.failed += 1
+                write.future.set_exception(error)
+            else:
+                write.future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "failed": self.failed,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "mean_batch_size": self.operations / self.batches if self.batches else 0.0,
+        }
+
+
+def _begin_immediate(session, transaction, connection) -> None:
+    # 会话在每个连接（目录库或分片）上开始事务时显式 BEGIN：否则第一个 SAVEPOINT 会自行开启事务，RELEASE 时即提交
+    if not transaction.nested and connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+write_coalescer = WriteCoalescer()
+
+
+async def apply_write(db: AsyncSession, operation: WriteOperation) -> T:
+    """
+    执行写操作并提交
+
+    启用 GROUP_COMMIT_ENABLED 时写操作交给 write_coalescer，在其会话中与其他并发写操作一起提交；
+    否则直接在调用方的会话 db 中执行并提交。写操作的结果在两种情况下都可在提交后安全读取。
+    """
+    if GROUP_COMMIT_ENABLED:
+        # 先结束调用方会话的事务以归还其连接，否则排队的请求占满连接池时合并提交拿不到连接
+        await db.commit()
+        return await write_coalescer.submit(operation, db.info.get("shard"))
+    result = await operation(db)
+    await db.commit()
+    return result
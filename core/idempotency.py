@@ -0,0 +1,365 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import Counter
+
+# 已完成请求的响应保留时间（秒），期间相同 Idempotency-Key 的重试直接重放
+IDEMPOTENCY_TTL = 24 * 3600
+# 首次执行占用键的最长时间（秒），超时视为执行者已崩溃，允许重试重新执行
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+# 重复请求等待首次执行完成的最长时间（秒），超时返回 409
+IDEMPOTENCY_WAIT_TIMEOUT = 10.0
+# 首次执行在其他工作进程中时轮询数据库的间隔（秒）
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_DB = Path("./idempotency.db")
+# 事件循环线程中占用键时等待其他进程释放写锁的最长时间（秒），超时则请求照常执行但不具备幂等性
+IDEMPOTENCY_BUSY_TIMEOUT = 0.005
+# 工作线程中保存结果时等待写锁的最长时间（秒）；保存失败的键在 IDEMPOTENCY_LOCK_TIMEOUT 后可被重新执行
+IDEMPOTENCY_SAVE_TIMEOUT = 5.0
+# 进程内前置缓存保存的已完成响应数
+IDEMPOTENCY_CACHE_SIZE = 1024
+# 每个进程每占用该数量的键清理一次过期记录
+IDEMPOTENCY_PRUNE_EVERY = 1000
+IDEMPOTENCY_HEADER = "idempotency-key"
+
+logger = logging.getLogger("app.idempotency")
+
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total", "Requests carrying an Idempotency-Key", ("result",)
+)
+
+
+class StoredResponse(NamedTuple):
+    # 请求指纹（方法、路径、查询参数与请求体的哈希）
+    fingerprint: str
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    expires: float
+
+
+class IdempotencyStore:
+    """
+    保存在 SQLite 文件中的幂等记录，多个工作进程共享
+
+    status 为 NULL 的记录表示键已被某次执行占用但尚未完成。占用是一条带 RETURNING 的 UPSERT，
+    由 SQLite 的写锁保证同一键只有一个执行者；过期的记录（含超时未完成的占用）可被重新占用。
+    claim 与 prune 耗时在数十微秒量级，在事件循环线程中同步执行，等待写锁不超过 IDEMPOTENCY_BUSY_TIMEOUT；
+    complete 与 release 不能因短暂的锁竞争而丢失结果，在工作线程中执行，等待写锁不超过 IDEMPOTENCY_SAVE_TIMEOUT。
+    连接按线程创建，fork 出的子进程会重新连接。
+    """
+
+    _CLAIM = """
+        INSERT INTO records (key, fingerprint, status, headers, body, expires)
+        VALUES (:key, :fingerprint, NULL, NULL, NULL, :now + :lock)
+        ON CONFLICT (key) DO UPDATE SET
+            fingerprint = excluded.fingerprint, status = NULL, headers = NULL, body = NULL, expires = excluded.expires
+        WHERE records.expires < :now
+        RETURNING key
+    """
+
+    def __init__(self, path: Path = IDEMPOTENCY_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self, timeout: float = IDEMPOTENCY_BUSY_TIMEOUT) -> sqlite3.Connection:
+        """当前线程的连接；timeout 在线程首次连接时生效，事件循环线程与工作线程各自使用固定的超时"""
+        local = self._local
+        if getattr(local, "connection", None) is None or local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, status INTEGER, headers TEXT, body BLOB, "
+                "expires REAL NOT NULL)"
+            )
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def claim(self, key: str, fingerprint: str, now: float) -> Tuple[bool, Optional[StoredResponse]]:
+        """
+        尝试占用键，返回 (是否占用成功, 已有记录)
+
+        占用失败时已有记录的 status 为 None 表示首次执行仍在进行中。
+        """
+        connection = self._connect()
+        claimed = connection.execute(self._CLAIM, {
+            "key": key, "fingerprint": fingerprint, "now": now, "lock": IDEMPOTENCY_LOCK_TIMEOUT,
+        }).fetchone()
+        if claimed is not None:
+            return True, None
+        row = connection.execute(
+            "SELECT fingerprint, status, headers, body, expires FROM records WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            # 在两条语句之间被清理，下次调用会重新占用
+            return False, None
+        stored_fingerprint, status_code, headers, body, expires = row
+        return False, StoredResponse(
+            stored_fingerprint, status_code, json.loads(headers) if headers else [], body or b"", expires
+        )
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        self._connect(IDEMPOTENCY_SAVE_TIMEOUT).execute(
+            "UPDATE records SET status = ?, headers = ?, body = ?, expires = ? WHERE key = ? AND status IS NULL",
+            (response.status, json.dumps(response.headers), response.body, response.expires, key),
+        )
+
+    def release(self, key: str) -> None:
+        """放弃占用（执行失败），之后的重试会重新执行"""
+        self._connect(IDEMPOTENCY_SAVE_TIMEOUT).execute("DELETE FROM records WHERE key = ? AND status IS NULL", (key,))
+
+    def prune(self, now: float) -> None:
+        self._connect().execute("DELETE FROM records WHERE expires < ?", (now,))
+
+
+class IdempotentReplay(Exception):
+    """由依赖抛出以跳过路由函数，异常处理器直接返回已保存的响应"""
+
+    def __init__(self, response: Response):
+        self.response = response
+
+
+class _Claim:
+    """当前请求占用的幂等键，由中间件在响应完成后保存结果"""
+
+    __slots__ = ("key", "fingerprint", "done")
+
+    def __init__(self, key: str, fingerprint: str, done: asyncio.Future):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.done = done
+
+
+class IdempotencyManager:
+    """
+    Idempotency-Key 的查找、占用与结果保存
+
+    查找顺序为进程内前置缓存（LRU）、进程内正在执行的请求、SQLite 记录。相同键的并发请求中只有一个执行，
+    其余等待其完成后重放响应；状态码小于 500 的响应会被保存，5xx 或异常时放弃占用，使重试可以重新执行。
+    只在事件循环线程中使用，不加锁。
+    """
+
+    def __init__(self, store: Optional[IdempotencyStore] = None, cache_size: int = IDEMPOTENCY_CACHE_SIZE):
+        self.store = store if store is not None else IdempotencyStore()
+        self.cache_size = cache_size
+        self.claims = 0
+        self.replays = 0
+        self.errors = 0
+        self._cache: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[_Claim]:
+        """
+        占用键并返回占用凭据；已有完成的结果时抛出 IdempotentReplay，键对应不同请求或等待超时时抛出 HTTPException
+
+        存储出错时返回 None，请求照常执行但不具备幂等性（fail open）。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            now = time.time()
+            stored = self._cached(key, now)
+            if stored is not None:
+                self._replay(stored, fingerprint)
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                await self._wait(inflight, deadline)
+                continue
+
+            try:
+                self.claims += 1
+                if self.claims % IDEMPOTENCY_PRUNE_EVERY == 0:
+                    self.store.prune(now)
+                claimed, stored = self.store.claim(key, fingerprint, now)
+            except sqlite3.Error:
+                self.errors += 1
+                logger.exception("idempotency_store_error")
+                return None
+
+            if claimed:
+                done = loop.create_future()
+                self._inflight[key] = done
+                IDEMPOTENCY_REQUESTS.inc("executed")
+                return _Claim(key, fingerprint, done)
+            if stored is not None and stored.status is not None:
+                self._remember(key, stored)
+                self._replay(stored, fingerprint)
+            if stored is not None and stored.fingerprint != fingerprint:
+                self._mismatch()
+            # 首次执行在其他工作进程中进行
+            await self._wait(None, deadline)
+
+    async def finish(
+        self, claim: _Claim, status_code: Optional[int], headers: List[Tuple[str, str]], body: bytes
+    ) -> None:
+        """保存占用键的请求的响应；status_code 为 None 表示请求未产生完整响应"""
+        try:
+            if status_code is not None and status_code < 500:
+                stored = StoredResponse(claim.fingerprint, status_code, headers, body, time.time() + IDEMPOTENCY_TTL)
+                self._remember(claim.key, stored)
+                await asyncio.to_thread(self.store.complete, claim.key, stored)
+            else:
+                await asyncio.to_thread(self.store.release, claim.key)
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception("idempotency_store_error")
+        finally:
+            if self._inflight.get(claim.key) is claim.done:
+                del self._inflight[claim.key]
+            claim.done.set_result(None)
+
+    def _cached(self, key: str, now: float) -> Optional[StoredResponse]:
+        stored = self._cache.get(key)
+        if stored is None:
+            return None
+        if stored.expires < now:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return stored
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        self._cache[key] = stored
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> None:
+        if stored.fingerprint != fingerprint:
+            self._mismatch()
+        self.replays += 1
+        IDEMPOTENCY_REQUESTS.inc("replayed")
+        response = Response(stored.body, status_code=stored.status)
+        response.raw_headers = [
+            (name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers
+        ] + [(b"idempotent-replayed", b"true")]
+        raise IdempotentReplay(response)
+
+    @staticmethod
+    def _mismatch() -> None:
+        IDEMPOTENCY_REQUESTS.inc("mismatch")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="Idempotency-Key 已用于不同的请求",
+        )
+
+    @staticmethod
+    async def _wait(inflight: Optional[asyncio.Future], deadline: float) -> None:
+        """等待本进程内的首次执行完成，inflight 为 None 时等待一个轮询间隔；到 deadline 时返回 409"""
+        timeout = deadline - asyncio.get_running_loop().time()
+        try:
+            if timeout <= 0:
+                raise asyncio.TimeoutError
+            if inflight is None:
+                await asyncio.sleep(min(IDEMPOTENCY_POLL_INTERVAL, timeout))
+            else:
+                await asyncio.wait_for(asyncio.shield(inflight), timeout)
+        except asyncio.TimeoutError:
+            IDEMPOTENCY_REQUESTS.inc("conflict")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="相同 Idempotency-Key 的请求正在处理中",
+                headers={"Retry-After": "1"},
+            )
+
+    def stats(self) -> dict:
+        return {
+            "claims": self.claims,
+            "replays": self.replays,
+            "errors": self.errors,
+            "cached": len(self._cache),
+            "in_flight": len(self._inflight),
+        }
+
+
+idempotency_manager = IdempotencyManager()
+
+# 当前请求的占用凭据容器，由 IdempotencyMiddleware 设置
+_claims: ContextVar[Optional[List[_Claim]]] = ContextVar("idempotency_claims", default=None)
+
+
+async def idempotency_key(request: Request, identity: str) -> None:
+    """
+    按请求头 Idempotency-Key 保证 identity（通常为用户 ID）的重复请求只执行一次
+
+    依赖形式见 app.auth.dependences.idempotent；未经过 IdempotencyMiddleware 的请求不做处理。
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    claims = _claims.get()
+    if key is None or claims is None:
+        return
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key 长度须在 1 到 {IDEMPOTENCY_KEY_MAX_LENGTH} 之间",
+        )
+    digest = hashlib.sha256()
+    for part in (request.method, request.url.path, request.url.query):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(await request.body())
+    claim = await idempotency_manager.begin(f"{identity}:{key}", digest.hexdigest())
+    if claim is not None:
+        claims.append(claim)
+
+
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay) -> Response:
+    return exc.response
+
+
+class IdempotencyMiddleware:
+    """记录占用了幂等键的请求的响应（状态码、响应头与未压缩的响应体），供之后的重试重放"""
+
+    def __init__(self, app: ASGIApp, manager: IdempotencyManager = idempotency_manager):
+        self.app = app
+        self.manager = manager
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        claims: List[_Claim] = []
+        token = _claims.set(claims)
+        status_code: Optional[int] = None
+        headers: List[Tuple[str, str]] = []
+        chunks: List[bytes] = []
+        complete = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, headers, complete
+            if claims:
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = [
+                        (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+                    ]
+                elif message["type"] == "http.response.body":
+                    chunks.append(message.get("body", b""))
+                    complete = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _claims.reset(token)
+            for claim in claims:
+                await self.manager.finish(claim, status_code if complete else None, headers, b"".join(chunks))
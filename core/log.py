@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+from pathlib import Path
+from contextvars import ContextVar
+from typing import IO, Any, Dict, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.responses import dumps
+from core.timing import current_timer, route_template
+
+# 日志队列容量（条），队列满时直接丢弃并计数，请求处理不会因写日志而阻塞
+LOG_QUEUE_SIZE = 10000
+# 写线程每批最多写出的记录数
+LOG_BATCH_SIZE = 256
+LOG_LEVEL = logging.INFO
+# 为 None 时写到标准输出
+LOG_FILE: Optional[Path] = None
+# 是否为每个请求输出一行访问日志
+ACCESS_LOG_ENABLED = True
+
+# LogRecord 的标准属性，其余属性（通过 extra 传入）作为结构化字段输出
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_STOP = object()
+
+logger = logging.getLogger("app.access")
+
+
+class QueuedJsonHandler(logging.Handler):
+    """
+    将日志记录转换为字典后放入有界队列，由后台线程批量序列化为 JSON 行并写出
+
+    emit 只做字典构造与 put_nowait，不加锁、不做 IO；队列满时丢弃记录并累加 dropped。
+    """
+
+    def __init__(
+        self,
+        stream: Optional[IO[str]] = None,
+        path: Optional[Path] = None,
+        max_queue: int = LOG_QUEUE_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+    ):
+        super().__init__()
+        self.path = path
+        self.stream = stream
+        self.batch_size = batch_size
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._closed = False
+        self._start()
+        # fork 出的子进程（如预加载应用的工作进程）中没有写线程，需要重新创建队列与线程
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self) -> None:
+        if self._closed:
+            return
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.dropped = 0
+        self.written = 0
+        self._start()
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # 队列本身线程安全，跳过 Handler 默认的加锁
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(self._to_dict(record))
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def _to_dict(record: logging.LogRecord) -> Dict[str, Any]:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = logging.Formatter().formatException(record.exc_info)
+        return entry
+
+    def _open(self) -> IO[str]:
+        if self.stream is not None:
+            return self.stream
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            return open(self.path, "a", encoding="utf-8")
+        return sys.stdout
+
+    def _run(self) -> None:
+        stream = self._open()
+        while True:
+            batch: List[Dict[str, Any]] = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                try:
+                    stream.write("".join(dumps(entry).decode() + "\n" for entry in batch))
+                    stream.flush()
+                    self.written += len(batch)
+                except Exception:
+                    self.dropped += len(batch)
+            if stop:
+                break
+        if stream is not sys.stdout and stream is not self.stream:
+            stream.close()
+
+    def close(self) -> None:
+        """写出队列中剩余的记录后停止写线程"""
+        self._closed = True
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join(timeout=5)
+        super().close()
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped, "written": self.written}
+
+
+_handler: Optional[QueuedJsonHandler] = None
+
+
+def setup_logging(level: int = LOG_LEVEL, path: Optional[Path] = LOG_FILE) -> QueuedJsonHandler:
+    """为 ``app`` 命名空间下的日志安装队列处理器，重复调用时返回已安装的处理器"""
+    global _handler
+    if _handler is None:
+        _handler = QueuedJsonHandler(path=path)
+        app_logger = logging.getLogger("app")
+        app_logger.addHandler(_handler)
+        app_logger.setLevel(level)
+        app_logger.propagate = False
+    return _handler
+
+
+def shutdown_logging() -> None:
+    global _handler
+    if _handler is not None:
+        logging.getLogger("app").removeHandler(_handler)
+        _handler.close()
+        _handler = None
+
+
+_log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+
+def bind(**fields: Any) -> None:
+    """为当前请求的访问日志附加字段（如 user_id），不在请求上下文中时忽略"""
+    context = _log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+class AccessLogMiddleware:
+    """
+    每个请求结束后输出一行访问日志，包含状态码、耗时、响应字节数、各阶段耗时与 bind() 附加的字段
+
+    需位于 ServerTimingMiddleware 之内以读取分阶段耗时。
+    """
+
+    def __init__(self, app: ASGIApp, enabled: bool = ACCESS_LOG_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        context: Dict[str, Any] = {}
+        token = _log_context.set(context)
+        status_code = 500
+        response_bytes = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _log_context.reset(token)
+            timer = current_timer()
+            timings = timer.timings if timer is not None else None
+            client = scope.get("client")
+            logger.info("access", extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "bytes": response_bytes,
+                "client": client[0] if client else None,
+                "timings": {name: round(value, 3) for name, value in timings.items()} if timings else None,
+                **context,
+            })
@@ -0,0 +1,276 @@
+import math
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.timing import current_timer, route_template
+
+# 请求耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 连接池取连接等待时间的桶（秒）
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+# 每个请求 SQL 条数的桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        (registry if registry is not None else default_registry).register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """只增计数器，标签值按位置传入"""
+
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def expose(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def expose(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Histogram(_Metric):
+    """
+    固定分桶直方图
+
+    每个标签组合保存各桶的非累计计数，导出时再转换为 Prometheus 要求的累计计数，
+    使 observe 只需一次二分查找与几次整数加法。
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # 每个标签组合：[各桶计数..., +Inf 桶计数, 总和]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def expose(self) -> List[str]:
+        lines = self.header()
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    指标只在事件循环线程中更新（连接池事件也在事件循环线程的 greenlet 中触发），
+    因此热路径上不加锁。其他组件已有的统计（stats() 字典）通过 register_stats 在抓取时读取。
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats: List[Tuple[str, str, Callable[[], dict]]] = []
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已注册: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def register_stats(self, prefix: str, documentation: str, stats: Callable[[], dict]) -> None:
+        """将返回数值字典的 stats 函数导出为一组 gauge，名称为 ``{prefix}_{键}``"""
+        self._stats.append((prefix, documentation, stats))
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.expose())
+        for prefix, documentation, stats in self._stats:
+            for key, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines.append(f"# HELP {name} {documentation} ({key})")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+default_registry = MetricsRegistry()
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body chunk is sent", ("method", "route")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being processed")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), buckets=QUERY_COUNT_BUCKETS
+)
+DB_POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled DB connection", buckets=POOL_WAIT_BUCKETS
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """记录取连接等待时间的连接池"""
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT.observe(perf_counter() - started)
+
+
+def pool_stats(pool) -> dict:
+    """连接池当前使用情况"""
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "utilization": checked_out / capacity if capacity else 0.0,
+    }
+
+
+class MetricsMiddleware:
+    """
+    统计请求数、耗时直方图、进行中的请求数与每个请求的 SQL 条数
+
+    需位于 ServerTimingMiddleware 之内，以便读取请求计时器中的 SQL 计数。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            method, route = scope["method"], route_template(scope)
+            HTTP_REQUEST_DURATION.observe(perf_counter() - started, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status_code))
+            timer = current_timer()
+            if timer is not None:
+                DB_QUERIES_PER_REQUEST.observe(timer.queries, route)
+
+
+async def metrics_endpoint(request) -> Response:
+    return Response(default_registry.expose(), media_type=CONTENT_TYPE)
+
+
+def ratio_stats(counter: Counter, kinds: Iterable[str]) -> Callable[[], dict]:
+    """由带 (kind, result) 标签的计数器计算各类缓存命中率"""
+    kinds = tuple(kinds)
+
+    def stats() -> dict:
+        result = {}
+        for kind in kinds:
+            hits, misses = counter.value(kind, "hit"), counter.value(kind, "miss")
+            result[f"{kind}_hit_ratio"] = hits / (hits + misses) if hits + misses else 0.0
+        return result
+
+    return stats
@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+from fastapi import FastAPI
+
+# OpenAPI 文档缓存目录
+OPENAPI_CACHE_DIR = Path("./media_cache/openapi")
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+logger = logging.getLogger("app.openapi")
+
+
+def schema_fingerprint(app: FastAPI) -> str:
+    """
+    由应用版本、路由表与项目内已加载模块的修改时间计算缓存键
+
+    只改模型或路由代码而不改版本号时，模块修改时间的变化同样会使缓存失效。
+    """
+    digest = hashlib.sha1(f"{app.title}\0{app.version}\0{app.openapi_version}".encode())
+    for route in app.routes:
+        methods = ",".join(sorted(getattr(route, "methods", None) or ()))
+        digest.update(f"{getattr(route, 'path', '')}\0{methods}\0{getattr(route, 'name', '')}\n".encode())
+    root = str(PROJECT_ROOT)
+    files = sorted(
+        module.__file__ for module in list(sys.modules.values())
+        if getattr(module, "__file__", None) and module.__file__.startswith(root)
+    )
+    for file in files:
+        stat = Path(file).stat()
+        digest.update(f"{file}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode())
+    return f"{app.version}-{digest.hexdigest()[:16]}"
+
+
+def _cache_path(app: FastAPI, cache_dir: Path) -> Path:
+    return cache_dir / f"openapi-{schema_fingerprint(app)}.json"
+
+
+def build_openapi_cache(app: FastAPI, cache_dir: Path = OPENAPI_CACHE_DIR) -> Path:
+    """生成 OpenAPI 文档并写入缓存，同时清理旧版本的缓存文件；供部署时预先生成"""
+    path = _cache_path(app, cache_dir)
+    app.openapi_schema = None
+    # 绕过 install_openapi_cache 的替换，直接调用 FastAPI 的生成逻辑
+    schema = FastAPI.openapi(app)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(f".{os.getpid()}.tmp")
+    temp.write_text(json.dumps(schema, ensure_ascii=False), encoding="utf-8")
+    temp.replace(path)
+    for stale in cache_dir.glob("openapi-*.json"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return path
+
+
+def load_openapi_cache(app: FastAPI, cache_dir: Path = OPENAPI_CACHE_DIR) -> Optional[dict]:
+    path = _cache_path(app, cache_dir)
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def install_openapi_cache(app: FastAPI, cache_dir: Path = OPENAPI_CACHE_DIR) -> None:
+    """
+    使 app.openapi() 优先读取磁盘缓存
+
+    FastAPI 在每个进程中首次访问文档时才生成 OpenAPI 文档（本项目约 450ms），且每个工作进程各生成一次；
+    读取缓存只需几毫秒。缓存不存在或已失效时照常生成并写入缓存。
+    """
+
+    def openapi() -> dict:
+        if app.openapi_schema is None:
+            schema = load_openapi_cache(app, cache_dir)
+            if schema is not None:
+                app.openapi_schema = schema
+            else:
+                try:
+                    build_openapi_cache(app, cache_dir)
+                except OSError:
+                    # 写缓存失败时仍使用已生成的文档
+                    logger.exception("openapi_cache_write_failed")
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+if __name__ == "__main__":
+    # 部署时预先生成：python -m core.openapi
+    from main import app as main_app
+
+    print(build_openapi_cache(main_app))
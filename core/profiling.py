@@ -0,0 +1,303 @@
+import sys
+import hmac
+import signal
+import time
+import secrets
+import pstats
+import cProfile
+import threading
+from pathlib import Path
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.responses import dumps
+
+# 单请求剖析结果的保存目录与保留数量
+PROFILE_DIR = Path("./media_cache/profiles")
+PROFILE_KEEP = 50
+# 触发单请求剖析的请求头；配置 PROFILE_SECRET 后，携带 X-Profile-Secret 即可触发，无需超级用户令牌
+PROFILE_HEADER = "x-profile"
+PROFILE_SECRET_HEADER = "x-profile-secret"
+PROFILE_SECRET: Optional[str] = None
+# 单请求剖析时的栈采样间隔（秒）
+PROFILE_SAMPLE_INTERVAL = 0.001
+# 后台统计采样的默认间隔（秒）与最多保留的不同栈数量
+SAMPLING_INTERVAL = 0.01
+SAMPLING_MAX_STACKS = 10000
+SAMPLING_MAX_DEPTH = 128
+
+Frame = Tuple[str, str, int]
+Stack = Tuple[Frame, ...]
+
+OVERFLOW_STACK: Stack = (("<overflow>", "", 0),)
+
+
+def _is_idle(stack: Stack) -> bool:
+    # 事件循环空闲时停在 selectors 的 select 调用上
+    name, filename, _ = stack[-1]
+    return name in ("select", "poll") and filename.endswith("selectors.py")
+
+
+class StackSampler:
+    """
+    按固定间隔采样事件循环线程的 Python 调用栈
+
+    在主线程中启动且 SIGPROF 未被占用时，使用 ITIMER_PROF 定时信号在被采样线程内取栈，
+    按 CPU 时间计时且不受 GIL 切换间隔限制（实际频率受内核定时器精度限制，常见为 4ms）；否则退化为
+    后台线程轮询 sys._current_frames()，实际频率受 GIL 切换间隔（默认 5ms）限制。事件循环空闲时的样本被丢弃；
+    不同的栈超过 max_stacks 后，新出现的栈统一计入 OVERFLOW_STACK，内存占用有上限。
+    """
+
+    _signal_owner: Optional["StackSampler"] = None
+
+    def __init__(self, interval: float, max_stacks: int = SAMPLING_MAX_STACKS):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.max_stacks = max_stacks
+        self.stacks: "Counter[Stack]" = Counter()
+        self.samples = 0
+        self.mode: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._previous_handler = None
+
+    @property
+    def running(self) -> bool:
+        return self.mode is not None and self.stopped_at is None
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        if (
+            hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+            and StackSampler._signal_owner is None
+        ):
+            StackSampler._signal_owner = self
+            self.mode = "signal"
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.mode = "thread"
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        if self.mode == "signal":
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+            StackSampler._signal_owner = None
+        else:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.stopped_at = time.time()
+
+    def _on_signal(self, signum, frame) -> None:
+        if frame is not None:
+            self._record(frame)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame) -> None:
+        stack = []
+        while frame is not None and len(stack) < SAMPLING_MAX_DEPTH:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack = tuple(reversed(stack))
+        if _is_idle(stack):
+            return
+        if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+            stack = OVERFLOW_STACK
+        self.stacks[stack] += 1
+        self.samples += 1
+
+    def snapshot(self) -> List[Tuple[Stack, int]]:
+        """按采样次数降序的 (栈, 次数)；在 C 层一次性复制，采样进行中也可安全调用"""
+        return sorted(dict(self.stacks).items(), key=lambda item: item[1], reverse=True)
+
+    def folded(self) -> str:
+        """flamegraph.pl / speedscope 可读取的折叠栈格式"""
+        return "".join(
+            ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack) + f" {count}\n"
+            for stack, count in self.snapshot()
+        )
+
+    def speedscope(self, name: str) -> dict:
+        return speedscope_profile(name, [(stack, count * self.interval) for stack, count in self.snapshot()])
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "mode": self.mode,
+            "interval": self.interval,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
+
+
+def speedscope_profile(name: str, weighted_stacks: List[Tuple[Stack, float]]) -> dict:
+    """speedscope 的 sampled 格式，相同的栈合并为一个样本，权重单位为秒"""
+    frame_index: Dict[Frame, int] = {}
+    frames: List[dict] = []
+    samples: List[List[int]] = []
+    weights: List[float] = []
+    for stack, weight in weighted_stacks:
+        indexes = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            indexes.append(frame_index[frame])
+        samples.append(indexes)
+        weights.append(weight)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "core.profiling",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+class BackgroundSampler:
+    """跨请求的低频统计采样，由管理接口启动与停止"""
+
+    def __init__(self):
+        self.sampler: Optional[StackSampler] = None
+
+    def start(self, interval: float = SAMPLING_INTERVAL) -> StackSampler:
+        """开始新一轮采样，丢弃上一轮的结果"""
+        self.stop()
+        self.sampler = StackSampler(interval)
+        self.sampler.start()
+        return self.sampler
+
+    def stop(self) -> Optional[StackSampler]:
+        if self.sampler is not None:
+            self.sampler.stop()
+        return self.sampler
+
+    def stats(self) -> dict:
+        if self.sampler is None:
+            return {"running": False, "samples": 0, "stacks": 0}
+        return self.sampler.stats()
+
+
+background_sampler = BackgroundSampler()
+
+
+def _slug(path: str) -> str:
+    return "".join(char if char.isalnum() else "_" for char in path.strip("/"))[:80] or "root"
+
+
+def _write_profile(profile_id: str, profiler: cProfile.Profile, sampler: StackSampler) -> None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    pstats.Stats(profiler).dump_stats(str(PROFILE_DIR / f"{profile_id}.pstats"))
+    (PROFILE_DIR / f"{profile_id}.speedscope.json").write_bytes(dumps(sampler.speedscope(profile_id)))
+    # 只保留最近的 PROFILE_KEEP 组结果
+    stats_files = sorted(PROFILE_DIR.glob("*.pstats"), key=lambda path: path.stat().st_mtime)
+    for path in stats_files[:-PROFILE_KEEP]:
+        path.unlink(missing_ok=True)
+        path.with_name(path.stem + ".speedscope.json").unlink(missing_ok=True)
+
+
+def list_profiles() -> List[dict]:
+    if not PROFILE_DIR.exists():
+        return []
+    return [
+        {"id": path.stem, "created_at": path.stat().st_mtime}
+        for path in sorted(PROFILE_DIR.glob("*.pstats"), key=lambda path: path.stat().st_mtime, reverse=True)
+    ]
+
+
+def profile_path(profile_id: str, kind: str) -> Optional[Path]:
+    """按编号返回结果文件路径，kind 为 pstats 或 speedscope，编号不合法或文件不存在时返回 None"""
+    if not profile_id or not all(char.isalnum() or char in "-_" for char in profile_id):
+        return None
+    suffix = ".pstats" if kind == "pstats" else ".speedscope.json"
+    path = PROFILE_DIR / f"{profile_id}{suffix}"
+    return path if path.exists() else None
+
+
+class ProfilingMiddleware:
+    """
+    按需剖析单个请求
+
+    请求携带 ``X-Profile: 1`` 且通过授权（X-Profile-Secret 与 PROFILE_SECRET 一致，或 authorize
+    判定为超级用户）时，在 cProfile 下执行该请求，并同时以 PROFILE_SAMPLE_INTERVAL 采样调用栈；
+    结果保存为 pstats 与 speedscope 文件，编号通过 X-Profile-Id 响应头返回。
+    cProfile 作用于整个事件循环线程，期间并发执行的其他请求也会计入结果；同一时间只剖析一个请求，
+    其余触发请求正常执行并返回 ``X-Profile: busy``。
+    """
+
+    def __init__(self, app: ASGIApp, authorize: Optional[Callable[[Headers], Awaitable[bool]]] = None):
+        self.app = app
+        self.authorize = authorize
+        self._active = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not any(name == PROFILE_HEADER.encode() for name, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER) not in ("1", "true") or not await self._authorized(headers):
+            await self.app(scope, receive, send)
+            return
+        if self._active:
+            await self.app(scope, receive, self._with_header(send, PROFILE_HEADER, "busy"))
+            return
+
+        profile_id = "-".join((
+            time.strftime("%Y%m%d-%H%M%S"), secrets.token_hex(3), scope["method"].lower(), _slug(scope["path"])
+        ))
+        profiler = cProfile.Profile()
+        sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+        self._active = True
+        sampler.start()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, self._with_header(send, "x-profile-id", profile_id))
+        finally:
+            profiler.disable()
+            sampler.stop()
+            self._active = False
+            await anyio.to_thread.run_sync(_write_profile, profile_id, profiler, sampler)
+
+    async def _authorized(self, headers: Headers) -> bool:
+        secret = headers.get(PROFILE_SECRET_HEADER)
+        if PROFILE_SECRET and secret and hmac.compare_digest(secret, PROFILE_SECRET):
+            return True
+        return self.authorize is not None and await self.authorize(headers)
+
+    @staticmethod
+    def _with_header(send: Send, name: str, value: str) -> Send:
+        async def wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"]).append(name, value)
+            await send(message)
+
+        return wrapper
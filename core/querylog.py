@@ -0,0 +1,164 @@
+import re
+import logging
+from time import perf_counter
+from functools import lru_cache
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.metrics import Counter
+from core.timing import current_timer, route_template
+
+# 超过该耗时（毫秒）的 SQL 记录慢查询日志
+SLOW_QUERY_MS = 100.0
+# 同一请求内相同语句执行达到该次数时视为疑似 N+1 查询
+N_PLUS_ONE_THRESHOLD = 5
+
+logger = logging.getLogger("app.sql")
+
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "SQL statements slower than the slow query threshold")
+DB_N_PLUS_ONE = Counter("db_n_plus_one_total", "Requests with repeated identical SQL statements", ("route",))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"(\([?,\s]+\))(?:\s*,\s*\([?,\s]+\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """去除字面量并折叠 IN 列表、多行 VALUES 与空白，使参数不同的同一语句归为一类"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("IN (?, ...)", statement)
+    statement = _VALUES_ROWS.sub(r"\1, ...", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> Any:
+    """只保留参数的类型，不输出参数值"""
+    if executemany:
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class QueryRecorder:
+    """一段范围内（通常为一个请求）执行的 SQL 统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: "StatementCounter[str]" = StatementCounter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """执行次数达到阈值的语句，按次数降序"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+_recorders: ContextVar[Tuple[QueryRecorder, ...]] = ContextVar("query_recorders", default=())
+
+
+@contextmanager
+def record_queries() -> Iterator[QueryRecorder]:
+    """在 with 块内统计当前上下文执行的 SQL，可嵌套使用"""
+    recorder = QueryRecorder()
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryRecorder]:
+    """
+    断言 with 块内执行的 SQL 不超过 limit 条，供测试与脚本使用
+
+        with assert_max_queries(4):
+            await client.get("/api/v1/workspaces/1")
+    """
+    with record_queries() as recorder:
+        yield recorder
+    if recorder.count > limit:
+        statements = "\n".join(f"  {count} x {statement}" for statement, count in recorder.statements.most_common())
+        raise AssertionError(f"执行了 {recorder.count} 条 SQL，超过上限 {limit}：\n{statements}")
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """在引擎上注册 SQL 事件：请求分阶段计时、按请求统计语句、慢查询日志"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        elapsed = perf_counter() - started.pop()
+
+        timer = current_timer()
+        if timer is not None:
+            timer.observe_query(elapsed)
+        recorders = _recorders.get()
+        if recorders:
+            normalized = normalize_statement(statement)
+            for recorder in recorders:
+                recorder.record(normalized, elapsed)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            DB_SLOW_QUERIES.inc()
+            logger.warning("slow_query", extra={
+                "ms": round(elapsed * 1000, 3),
+                "statement": normalize_statement(statement),
+                "parameters": redact_parameters(parameters, executemany),
+            })
+
+
+class QueryLogMiddleware:
+    """按请求统计 SQL，同一语句重复执行达到阈值时输出疑似 N+1 的告警"""
+
+    def __init__(self, app: ASGIApp, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with record_queries() as recorder:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                repeated = recorder.repeated(self.threshold)
+                if repeated:
+                    self._warn(scope, recorder, repeated)
+
+    @staticmethod
+    def _warn(scope: Scope, recorder: QueryRecorder, repeated: List[Tuple[str, int]]) -> None:
+        route = route_template(scope)
+        DB_N_PLUS_ONE.inc(route)
+        logger.warning("n_plus_one", extra={
+            "method": scope["method"],
+            "route": route,
+            "queries": recorder.count,
+            "db_ms": round(recorder.seconds * 1000, 3),
+            "repeated": [{"statement": statement, "count": count} for statement, count in repeated],
+        })
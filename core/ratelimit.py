@@ -0,0 +1,255 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+from pathlib import Path
+from contextvars import ContextVar
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import Counter
+
+
+class RateLimitPolicy(NamedTuple):
+    # 令牌补充速率（个/秒）
+    rate: float
+    # 桶容量，即允许的突发请求数
+    burst: int
+
+
+# 各路由使用的限流策略，键为策略名
+RATE_LIMIT_POLICIES: Dict[str, RateLimitPolicy] = {
+    # 按客户端 IP：登录与注册需要计算 bcrypt 哈希
+    "login": RateLimitPolicy(rate=10 / 60, burst=10),
+    "signup": RateLimitPolicy(rate=5 / 3600, burst=5),
+    # 按用户：所有需要登录的接口
+    "user": RateLimitPolicy(rate=20, burst=100),
+    # 按工作区：同一工作区的所有成员合计
+    "workspace": RateLimitPolicy(rate=50, burst=200),
+}
+RATE_LIMIT_ENABLED = True
+# sqlite：多个工作进程通过同一个 SQLite 文件共享令牌桶；memory：仅限当前进程
+RATE_LIMIT_BACKEND = "sqlite"
+RATE_LIMIT_DB = Path("./ratelimit.db")
+# 等待其他进程释放 ratelimit.db 写锁的最长时间（秒）；判定在事件循环线程中同步执行，超时即放行请求
+RATE_LIMIT_BUSY_TIMEOUT = 0.005
+# 每个进程每做出该数量的判定清理一次已补满的令牌桶
+RATE_LIMIT_PRUNE_EVERY = 10000
+
+logger = logging.getLogger("app.ratelimit")
+
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected by rate limiting", ("policy",))
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    # 判定后桶内剩余的令牌数
+    tokens: float
+    policy: RateLimitPolicy
+
+    @property
+    def remaining(self) -> int:
+        return max(math.floor(self.tokens), 0)
+
+    @property
+    def reset(self) -> int:
+        """令牌桶补满所需的秒数"""
+        return math.ceil((self.policy.burst - self.tokens) / self.policy.rate)
+
+    @property
+    def retry_after(self) -> int:
+        """补充到一个令牌所需的秒数"""
+        return max(math.ceil((1 - self.tokens) / self.policy.rate), 1)
+
+
+class MemoryBackend:
+    """进程内的令牌桶，只在事件循环线程中使用"""
+
+    def __init__(self):
+        # 键 -> (令牌数, 更新时间, 补满时间)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float) -> Tuple[bool, float]:
+        tokens, updated, _ = self._buckets.get(key, (policy.burst, now, now))
+        tokens = min(policy.burst, tokens + (now - updated) * policy.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + policy.burst / policy.rate)
+        return allowed, tokens
+
+    def prune(self, now: float) -> None:
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] >= now}
+
+
+class SQLiteBackend:
+    """
+    保存在 SQLite 文件中的令牌桶，多个工作进程共享
+
+    每次判定是一条带 RETURNING 的 UPSERT，由 SQLite 的写锁保证原子性；WAL 模式且不做 fsync（限流状态丢失无害），
+    单次判定耗时在数十微秒量级，直接在事件循环线程中同步执行。等待写锁超过 RATE_LIMIT_BUSY_TIMEOUT 时抛出
+    sqlite3.OperationalError，由 RateLimiter 放行请求，不会长时间阻塞事件循环。连接按进程创建，fork 出的子进程会重新连接。
+    """
+
+    _UPSERT = """
+        INSERT INTO buckets (key, tokens, updated, expires, allowed)
+        VALUES (:key, :burst - 1, :now, :now + :fill, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:burst, tokens + (:now - updated) * :rate)
+                     - (min(:burst, tokens + (:now - updated) * :rate) >= 1),
+            allowed = min(:burst, tokens + (:now - updated) * :rate) >= 1,
+            updated = :now,
+            expires = :now + :fill
+        RETURNING allowed, tokens
+    """
+
+    def __init__(self, path: Path = RATE_LIMIT_DB):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=RATE_LIMIT_BUSY_TIMEOUT)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, "
+                "expires REAL NOT NULL, allowed INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float) -> Tuple[bool, float]:
+        allowed, tokens = self._connect().execute(self._UPSERT, {
+            "key": key, "burst": policy.burst, "rate": policy.rate, "now": now, "fill": policy.burst / policy.rate,
+        }).fetchone()
+        return bool(allowed), tokens
+
+    def prune(self, now: float) -> None:
+        # 已过 expires 的桶必然已补满，与不存在等价
+        self._connect().execute("DELETE FROM buckets WHERE expires < ?", (now,))
+
+
+class RateLimiter:
+    """
+    令牌桶限流
+
+    存储后端出错时放行请求（fail open）并记录日志，限流不应成为可用性的单点。
+    """
+
+    def __init__(self, backend=None, policies: Dict[str, RateLimitPolicy] = RATE_LIMIT_POLICIES):
+        self.backend = backend if backend is not None else (
+            SQLiteBackend() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBackend()
+        )
+        self.policies = policies
+        self.decisions = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def hit(self, policy_name: str, identity: str) -> Optional[Decision]:
+        policy = self.policies[policy_name]
+        now = time.time()
+        self.decisions += 1
+        try:
+            if self.decisions % RATE_LIMIT_PRUNE_EVERY == 0:
+                self.backend.prune(now)
+            allowed, tokens = self.backend.hit(f"{policy_name}:{identity}", policy, now)
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception("rate_limit_backend_error")
+            return None
+        if not allowed:
+            self.rejected += 1
+        return Decision(allowed, tokens, policy)
+
+    def stats(self) -> dict:
+        return {"decisions": self.decisions, "rejected": self.rejected, "errors": self.errors}
+
+
+rate_limiter = RateLimiter()
+
+# 当前请求的限流判定，由 RateLimitMiddleware 设置，响应头取剩余令牌最少的一项
+_decisions: ContextVar[Optional[List[Decision]]] = ContextVar("rate_limit_decisions", default=None)
+
+
+def enforce(policy_name: str, identity: str) -> None:
+    """按策略消耗 identity 的一个令牌，令牌不足时抛出 429"""
+    if not RATE_LIMIT_ENABLED:
+        return
+    decision = rate_limiter.hit(policy_name, identity)
+    if decision is None:
+        return
+    decisions = _decisions.get()
+    if decisions is not None:
+        decisions.append(decision)
+    if not decision.allowed:
+        RATE_LIMITED.inc(policy_name)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求过于频繁，请稍后重试",
+            headers={"Retry-After": str(decision.retry_after)},
+        )
+
+
+def client_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+
+def workspace_id(request: Request) -> Optional[str]:
+    value = request.path_params.get("workspace_id")
+    return None if value is None else str(value)
+
+
+def rate_limit(policy_name: str, key: Callable[[Request], Optional[str]] = client_ip):
+    """
+    限流依赖，可用于路由或 include_router 的 dependencies
+
+        dependencies=[Depends(rate_limit("login"))]
+        dependencies=[Depends(rate_limit("workspace", key=workspace_id))]
+
+    key 返回 None 时（如路由没有 workspace_id 参数）不限流。按用户限流见 app.auth.dependences.user_rate_limit。
+    """
+    if policy_name not in RATE_LIMIT_POLICIES:
+        raise ValueError(f"未定义的限流策略: {policy_name}")
+
+    async def dependency(request: Request) -> None:
+        identity = key(request)
+        if identity is not None:
+            enforce(policy_name, identity)
+
+    return dependency
+
+
+class RateLimitMiddleware:
+    """为经过限流的请求添加 RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset 响应头"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        decisions: List[Decision] = []
+        token = _decisions.set(decisions)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and decisions:
+                decision = min(decisions, key=lambda item: (item.allowed, item.remaining))
+                headers = MutableHeaders(raw=message["headers"])
+                headers["RateLimit-Limit"] = str(decision.policy.burst)
+                headers["RateLimit-Remaining"] = str(decision.remaining)
+                headers["RateLimit-Reset"] = str(decision.reset)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _decisions.reset(token)
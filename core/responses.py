@@ -1,11 +1,26 @@
-from typing import Optional, Any, Generic, TypeVar, Type
+import os
+import json
+import hashlib
+import mimetypes
+from functools import lru_cache
+from typing import Optional, Any, Generic, TypeVar, Type, Tuple, Mapping, Union
 
+import anyio.to_thread
 from pydantic import BaseModel, model_validator, Field
+from starlette.datastructures import Headers
+from starlette.types import Scope, Receive, Send
 
 from fastapi import status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.encoders import jsonable_encoder
 
+from core.timing import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 T = TypeVar("T")
 
@@ -17,43 +32,100 @@ class ResponseBase(BaseModel, Generic[T]):
     page: Optional[int] = None
     size: Optional[int] = None
 
-    @classmethod
     @model_validator(mode="before")
-    def auto_fill_pagination(cls, data: Any) -> dict:
-        """自动填充分页字段并处理不同数据类型"""
+    @classmethod
+    def auto_fill_pagination(cls, data: Any) -> Any:
+        """
+        自动填充分页字段并统一为字典结构
+
+        ORM 对象交由 data 字段按 from_attributes 校验，不在此处预先编码
+        """
+        if isinstance(data, ResponseBase):
+            return data
         if not isinstance(data, dict):
-            raw_data = data
-            data = {"data": raw_data}  # 统一为字典处理
-        else:
-            raw_data = data.get("data")
+            data = {"data": data}  # 统一为字典处理
+        raw_data = data.get("data")
 
         # 分页对象处理（例如 fastapi-paginate 的 Page 对象）
         if hasattr(raw_data, "total") and hasattr(raw_data, "items"):
-            data["data"] = jsonable_encoder(raw_data.items)
-            data["total"] = raw_data.total
-            data["page"] = raw_data.page
-            data["size"] = raw_data.size
-
-        # 普通列表处理（自动计算总数）
-        elif isinstance(raw_data, list):
-            data["data"] = jsonable_encoder(raw_data)
-
-        # SQLAlchemy ORM 对象处理
-        elif hasattr(raw_data, "__table__"):
-            data["data"] = jsonable_encoder(raw_data)
-
-        # 其他类型直接序列化
-        else:
-            data["data"] = jsonable_encoder(raw_data)
+            data = {
+                **data,
+                "data": raw_data.items,
+                "total": raw_data.total,
+                "page": raw_data.page,
+                "size": raw_data.size,
+            }
         return data
 
 
+@lru_cache(maxsize=None)
 def resp_(data_model: Type[T]) -> Type[ResponseBase[T]]:
+    """按数据类型缓存具体响应模型，避免重复创建模型类"""
     class ConcreteResponse(ResponseBase[data_model]):  # type: ignore
         pass
     return ConcreteResponse
 
 
+def dumps(content: Any) -> bytes:
+    """序列化为 JSON 字节，优先使用 orjson，未安装时回退到标准库"""
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=jsonable_encoder
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 orjson（可用时）渲染的 JSONResponse"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _schema_fields(schema: Type[BaseModel]) -> Tuple[str, ...]:
+    return tuple(schema.model_fields)
+
+
+def _row_to_dict(row: Any, fields: Tuple[str, ...], exclude_none: bool) -> dict:
+    # 已加载的 ORM 属性位于实例 __dict__ 中，直接读取可绕过描述符开销
+    values = row if isinstance(row, Mapping) else getattr(row, "__dict__", {})
+    result = {}
+    for field in fields:
+        value = values[field] if field in values else getattr(row, field, None)
+        if value is not None or not exclude_none:
+            result[field] = value
+    return result
+
+
+def trusted_response(
+    schema: Type[BaseModel],
+    data: Any,
+    many: bool = True,
+    exclude_none: bool = False,
+    envelope: bool = False,
+    status_code: int = status.HTTP_200_OK,
+    **extra
+) -> Response:
+    """
+    按响应模型的字段直接将服务层输出（ORM 对象或行映射）序列化为 JSON
+
+    跳过 pydantic 校验与 jsonable_encoder，仅用于字段均为标量的扁平模型且数据来自可信的服务层；
+    envelope 为 True 时按 ResponseBase 结构包装，extra 中值为 None 的字段会被省略。
+    """
+    fields = _schema_fields(schema)
+    with phase("serialize"):
+        if many:
+            content: Any = [_row_to_dict(row, fields, exclude_none) for row in data]
+        else:
+            content = _row_to_dict(data, fields, exclude_none)
+        if envelope:
+            content = {"message": "OK", "data": content}
+            content.update({key: value for key, value in extra.items() if value is not None})
+        body = dumps(content)
+    return Response(body, status_code=status_code, media_type="application/json")
+
+
 async def json_response(
     status_code: int = status.HTTP_200_OK,
     message: Optional[str] = None,
@@ -76,3 +148,160 @@ async def json_response(
         content.update(kwargs)
 
     return JSONResponse(status_code=status_code, content=content)
+
+
+def weak_etag(*parts: Any) -> str:
+    """根据若干组成部分生成弱 ETag"""
+    digest = hashlib.sha1("\x1f".join(map(str, parts)).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """按弱比较规则判断 If-None-Match 是否命中 ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in if_none_match.split(","))
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"etag": etag})
+
+
+def file_etag(etag: str, stat_result: os.stat_result) -> str:
+    """在强 ETag 后追加文件的修改时间与大小，文件被替换后 ETag 随之变化"""
+    return f'{etag[:-1]}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_byte_range(http_range: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个 bytes Range，返回 [start, end) 区间
+
+    格式错误或多区间请求返回 None（按 RFC 9110 忽略 Range，返回完整内容），
+    区间无法满足时抛出 ValueError
+    """
+    units, _, spec = http_range.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # 后缀区间：bytes=-N 表示最后 N 个字节
+        length = int(last)
+        if length == 0 or file_size == 0:
+            raise ValueError("Range Not Satisfiable")
+        return max(file_size - length, 0), file_size
+
+    start = int(first)
+    if last and int(last) < start:
+        # last-pos 小于 first-pos 的区间语法无效，忽略 Range
+        return None
+    end = min(int(last) + 1, file_size) if last else file_size
+    if start >= file_size or start >= end:
+        raise ValueError("Range Not Satisfiable")
+    return start, end
+
+
+async def _send_range_not_satisfiable(send: Send, file_size: int) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": 416,
+        "headers": [(b"content-range", f"bytes */{file_size}".encode()), (b"content-length", b"0")],
+    })
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class ZeroCopyFileResponse(Response):
+    """
+    本地文件响应，支持单区间 Range 请求、If-None-Match 与强 ETag
+
+    stat_etag 为 True 时 ETag 由 file_etag 根据打开文件后的 fstat 生成，304 与 If-Range 判断以实际发送的文件为准。
+    服务器声明 ASGI ``http.response.zerocopy`` 扩展时通过 sendfile 由内核直接发送文件，
+    否则在线程池中分块读取。
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        etag: str,
+        media_type: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        status_code: int = status.HTTP_200_OK,
+        stat_etag: bool = False,
+    ) -> None:
+        self.path = path
+        self.stat_etag = stat_etag
+        self.status_code = status_code
+        self.media_type = media_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+        self.background = None
+        self.init_headers(headers)
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers["etag"] = etag
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        send_header_only = scope.get("method", "GET").upper() == "HEAD"
+
+        try:
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        except FileNotFoundError:
+            await Response(status_code=status.HTTP_404_NOT_FOUND)(scope, receive, send)
+            return
+
+        try:
+            stat_result = os.fstat(file.fileno())
+            if self.stat_etag:
+                self.headers["etag"] = file_etag(self.headers["etag"], stat_result)
+            if etag_matches(request_headers.get("if-none-match"), self.headers["etag"]):
+                await not_modified_response(self.headers["etag"])(scope, receive, send)
+                return
+
+            file_size = stat_result.st_size
+            start, end = 0, file_size
+
+            http_range = request_headers.get("range")
+            if_range = request_headers.get("if-range")
+            if http_range and (if_range is None or if_range == self.headers["etag"]):
+                try:
+                    byte_range = parse_byte_range(http_range, file_size)
+                except ValueError:
+                    await _send_range_not_satisfiable(send, file_size)
+                    return
+                if byte_range is not None:
+                    start, end = byte_range
+                    self.status_code = status.HTTP_206_PARTIAL_CONTENT
+                    self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+
+            self.headers["content-length"] = str(end - start)
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+            if send_header_only or start == end:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            elif "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "offset": start,
+                    "count": end - start,
+                    "more_body": False,
+                })
+            else:
+                await anyio.to_thread.run_sync(file.seek, start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = await anyio.to_thread.run_sync(file.read, min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # 文件在发送过程中被截断
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
@@ -0,0 +1,243 @@
+import os
+import time
+import socket
+import signal
+import logging
+import importlib.util
+from dataclasses import dataclass, field, fields
+from typing import Dict, Optional
+
+import uvicorn
+from uvicorn.config import LOGGING_CONFIG
+from uvicorn.importer import import_from_string
+
+from core.log import setup_logging, shutdown_logging
+
+logger = logging.getLogger("app.server")
+
+# 工作进程启动后不足该秒数即退出视为启动失败，重新拉起前等待，避免崩溃循环占满 CPU
+WORKER_MIN_UPTIME = 1.0
+# 主进程检查工作进程状态的间隔（秒）
+SUPERVISOR_POLL_INTERVAL = 0.2
+# 平滑退出超时后再等待该秒数，仍未退出的工作进程被强制结束
+KILL_GRACE = 5.0
+
+
+def default_workers() -> int:
+    """可用 CPU 核数（考虑进程的 CPU 亲和性）"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+@dataclass
+class ServerConfig:
+    """
+    生产环境启动参数
+
+    所有字段都可以通过 ``WEB_`` 前缀的环境变量覆盖，如 ``WEB_WORKERS=4``、``WEB_MAX_REQUESTS=0``。
+    """
+
+    app: str = "main:app"
+    host: str = "0.0.0.0"
+    port: int = 8002
+    workers: int = field(default_factory=default_workers)
+    backlog: int = 2048
+    # 在主进程中导入应用后再 fork 工作进程，工作进程无需重复导入，且与主进程共享只读内存页
+    preload: bool = True
+    # 每个工作进程处理该数量的请求后平滑退出并由主进程重新拉起，限制内存增长；0 表示不回收
+    max_requests: int = 10000
+    # 在 max_requests 上叠加的随机量，避免所有工作进程同时回收
+    max_requests_jitter: int = 1000
+    # 收到 SIGTERM / SIGINT 后等待进行中请求完成的最长时间（秒）
+    graceful_timeout: int = 30
+    keepalive: int = 5
+    # 安装了 uvloop / httptools 时自动使用，否则使用 asyncio / h11
+    loop: str = field(default_factory=lambda: "uvloop" if _installed("uvloop") else "asyncio")
+    http: str = field(default_factory=lambda: "httptools" if _installed("httptools") else "h11")
+    log_level: str = "warning"
+    # 访问日志由 AccessLogMiddleware 输出，默认关闭 uvicorn 自带的访问日志
+    access_log: bool = False
+
+    @classmethod
+    def from_env(cls, prefix: str = "WEB_") -> "ServerConfig":
+        config = cls()
+        for item in fields(cls):
+            value = os.environ.get(prefix + item.name.upper())
+            if value is None:
+                continue
+            current = getattr(config, item.name)
+            if isinstance(current, bool):
+                value = value.lower() in ("1", "true", "yes", "on")
+            elif isinstance(current, int):
+                value = int(value)
+            setattr(config, item.name, value)
+        return config
+
+    def uvicorn_config(self, app, log_config: Optional[dict] = LOGGING_CONFIG) -> uvicorn.Config:
+        return uvicorn.Config(
+            app,
+            log_config=log_config,
+            loop=self.loop,
+            http=self.http,
+            lifespan="on",
+            backlog=self.backlog,
+            timeout_keep_alive=self.keepalive,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            limit_max_requests=self.max_requests or None,
+            limit_max_requests_jitter=self.max_requests_jitter if self.max_requests else 0,
+            log_level=self.log_level,
+            access_log=self.access_log,
+        )
+
+
+class Supervisor:
+    """
+    预加载应用并 fork 多个 uvicorn 工作进程，所有工作进程在同一个监听套接字上接受连接
+
+    工作进程因达到 max_requests 退出或崩溃时由主进程重新 fork；收到 SIGTERM / SIGINT 时向全部工作进程
+    转发 SIGTERM，工作进程停止接受新连接并在 graceful_timeout 内处理完进行中的请求，超时后强制结束。
+    每个工作进程各自执行 lifespan、持有独立的连接池与进程内缓存。
+    """
+
+    def __init__(self, config: ServerConfig):
+        self.config = config
+        self.app = None
+        self.socket: Optional[socket.socket] = None
+        self.workers: Dict[int, float] = {}
+        self.recycled = 0
+        self.crashed = 0
+        self._stopping = False
+
+    def run(self) -> None:
+        config = self.config
+        # uvicorn 通过 dictConfig 配置日志时会关闭所有已存在的处理器，须在安装队列处理器与预加载应用之前完成；
+        # 工作进程继承已配置好的日志，不再重复配置
+        config.uvicorn_config(config.app)
+        setup_logging()
+        if config.preload:
+            self.app = import_from_string(config.app)
+            # 在主进程中读取（或生成）OpenAPI 文档，工作进程 fork 后直接共享
+            openapi = getattr(self.app, "openapi", None)
+            if callable(openapi):
+                openapi()
+        self.socket = self._bind()
+        logger.info("server_start", extra={
+            "pid": os.getpid(), "workers": config.workers, "bind": f"{config.host}:{config.port}",
+            "loop": config.loop, "http": config.http, "preload": config.preload,
+        })
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        try:
+            for _ in range(config.workers):
+                self._spawn()
+            while not self._stopping:
+                self._reap()
+                while len(self.workers) < config.workers and not self._stopping:
+                    self._spawn()
+                time.sleep(SUPERVISOR_POLL_INTERVAL)
+        finally:
+            self._shutdown()
+            self.socket.close()
+            shutdown_logging()
+
+    def _bind(self) -> socket.socket:
+        family = socket.AF_INET6 if ":" in self.config.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.config.host, self.config.port))
+        sock.listen(self.config.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                logger.exception("worker_failed")
+                code = 1
+            finally:
+                shutdown_logging()
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+
+    def _run_worker(self) -> None:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        app = self.app if self.app is not None else self.config.app
+        server = uvicorn.Server(self.config.uvicorn_config(app, log_config=None))
+        server.run(sockets=[self.socket])
+
+    def _reap(self) -> None:
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None or self._stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            uptime = time.monotonic() - started
+            if code == 0:
+                self.recycled += 1
+                logger.info("worker_recycled", extra={"pid": pid, "uptime": round(uptime, 1)})
+            else:
+                self.crashed += 1
+                logger.error("worker_exited", extra={"pid": pid, "code": code, "uptime": round(uptime, 1)})
+                if uptime < WORKER_MIN_UPTIME:
+                    time.sleep(WORKER_MIN_UPTIME)
+
+    def _on_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _shutdown(self) -> None:
+        self._stopping = True
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.config.graceful_timeout + KILL_GRACE
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(SUPERVISOR_POLL_INTERVAL / 2)
+        for pid in list(self.workers):
+            logger.error("worker_killed", extra={"pid": pid})
+            self._signal(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.clear()
+        logger.info("server_stop", extra={"recycled": self.recycled, "crashed": self.crashed})
+
+    @staticmethod
+    def _signal(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def serve(config: Optional[ServerConfig] = None) -> None:
+    """按配置启动生产服务；不支持 fork 的平台退回 uvicorn 自带的多进程模式（不预加载）"""
+    config = config or ServerConfig.from_env()
+    if not hasattr(os, "fork"):
+        uvicorn.run(
+            config.app, host=config.host, port=config.port, workers=config.workers, loop=config.loop,
+            http=config.http, backlog=config.backlog, timeout_keep_alive=config.keepalive,
+            timeout_graceful_shutdown=config.graceful_timeout, limit_max_requests=config.max_requests or None,
+            limit_max_requests_jitter=config.max_requests_jitter, log_level=config.log_level,
+            access_log=config.access_log,
+        )
+        return
+    Supervisor(config).run()
+
+
+if __name__ == "__main__":
+    serve()
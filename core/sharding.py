@@ -0,0 +1,484 @@
+import os
+import sys
+import time
+import sqlite3
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import inspect
+from sqlalchemy.exc import StatementError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from core.metrics import InstrumentedQueuePool
+
+# 分片数（opt-in），0 表示不分片、所有数据都在 database.db 中
+SHARD_COUNT = int(os.environ.get("WEB_SHARDS", "0"))
+SHARDING_ENABLED = SHARD_COUNT > 0
+SHARD_DIR = Path(os.environ.get("WEB_SHARD_DIR", "./shards"))
+# 工作区到分片的映射与全局 ID 序列
+SHARD_DIRECTORY_DB = SHARD_DIR / "directory.db"
+# 按工作区分片存放的表，其余表（用户、工作区、成员、角色、授权）留在全局目录库 database.db 中。
+# 授权与其引用的成员、角色放在同一个库，权限检查只需在目录库上执行一次联合查询，不必扇出到各分片；
+# 授权写入很少，留在目录库不会明显增加目录库的写入压力
+SHARDED_TABLES = frozenset({"workspace_collections", "workspace_collection_items", "workspace_stats"})
+# 工作区到分片映射的进程内缓存时间（秒），迁移工作区时据此等待所有工作进程看到迁移状态
+SHARD_MAP_TTL = 5.0
+# 迁移开始后额外等待的时间（秒），让迁移前已选定分片的请求执行完
+SHARD_MOVE_DRAIN = 10.0
+# 全局 ID 每次从分片目录预取的数量
+SHARD_ID_BLOCK = 1000
+# 迁移中的工作区返回 503 时建议的重试间隔（秒）
+SHARD_RETRY_AFTER = 5
+# 服务进程在事件循环线程中访问分片目录时等待写锁的最长时间（秒），超时的请求返回 503
+SHARD_DIRECTORY_BUSY_TIMEOUT = 0.005
+# 运维工具（python -m core.sharding）访问分片目录时等待写锁的最长时间（秒）
+SHARD_TOOL_BUSY_TIMEOUT = 30.0
+
+logger = logging.getLogger("app.sharding")
+
+
+class ShardNotResolved(RuntimeError):
+    """会话访问分片表时无法确定分片（请求路径中没有工作区 ID，也未调用 use_workspace_shard）"""
+
+
+async def shard_not_resolved_handler(request: Request, exc: ShardNotResolved) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": str(exc)})
+
+
+class ShardDirectoryUnavailable(RuntimeError):
+    """分片目录等待写锁超时或出错"""
+
+    def __init__(self, message: str = "分片目录暂时不可用，请稍后重试"):
+        super().__init__(message)
+
+
+async def shard_directory_unavailable_handler(request: Request, exc: Exception) -> JSONResponse:
+    """分片目录不可用时返回 503；全局 ID 在 flush 中分配，异常被 SQLAlchemy 包装为 StatementError"""
+    if isinstance(exc, StatementError):
+        if not isinstance(exc.orig, ShardDirectoryUnavailable):
+            raise exc
+        exc = exc.orig
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"message": str(exc)},
+        headers={"Retry-After": str(SHARD_RETRY_AFTER)},
+    )
+
+
+def shard_path(shard: int) -> Path:
+    return SHARD_DIR / f"shard_{shard}.db"
+
+
+def _create_shard_engine(shard: int) -> AsyncEngine:
+    return create_async_engine(
+        f"sqlite+aiosqlite:///{shard_path(shard)}", future=True, echo=False, poolclass=InstrumentedQueuePool
+    )
+
+
+# 每个分片一个引擎（各自的连接池），创建时不连接数据库
+shard_engines: List[AsyncEngine] = [_create_shard_engine(shard) for shard in range(SHARD_COUNT)]
+
+
+class ShardDirectory:
+    """
+    分片映射与全局 ID 序列，保存在单独的 SQLite 文件中，用 sqlite3 同步访问，多个工作进程共享
+
+    不放在 database.db 中：事件循环线程中的同步写入若等待同一进程内 aiosqlite 连接持有的锁，两者会互相等待直到超时。
+    workspace_shards 记录每个工作区所在的分片及是否正在迁移；没有记录的工作区按 workspace_id % SHARD_COUNT 放置。
+    映射在进程内缓存 SHARD_MAP_TTL 秒，缓存未命中时的查询耗时在数十微秒量级，直接在事件循环线程中执行；
+    等待写锁超过 busy_timeout 时抛出 sqlite3.OperationalError，不会长时间阻塞事件循环。
+    分片表的主键由 shard_sequences 按块分配，全局唯一，工作区迁移时保持不变。连接按进程创建，fork 出的子进程会重新连接。
+    """
+
+    def __init__(self, busy_timeout: float = SHARD_DIRECTORY_BUSY_TIMEOUT):
+        self.busy_timeout = busy_timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = 0
+        self._cache: Dict[int, Tuple[int, bool, float]] = {}
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self.lookups = 0
+        self.misses = 0
+
+    def connect(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            SHARD_DIR.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(SHARD_DIRECTORY_DB, isolation_level=None, timeout=self.busy_timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS workspace_shards ("
+                "workspace_id INTEGER PRIMARY KEY, shard INTEGER NOT NULL, moving INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS shard_sequences (name TEXT PRIMARY KEY, next INTEGER NOT NULL)"
+            )
+            self._connection, self._pid = connection, os.getpid()
+            self._blocks.clear()
+        return self._connection
+
+    @staticmethod
+    def default_shard(workspace_id: int) -> int:
+        return workspace_id % SHARD_COUNT
+
+    def lookup(self, workspace_id: int) -> Tuple[int, bool]:
+        """返回 (分片, 是否正在迁移)"""
+        self.lookups += 1
+        now = time.monotonic()
+        cached = self._cache.get(workspace_id)
+        if cached is not None and cached[2] > now:
+            return cached[0], cached[1]
+        self.misses += 1
+        row = self.connect().execute(
+            "SELECT shard, moving FROM workspace_shards WHERE workspace_id = ?", (workspace_id,)
+        ).fetchone()
+        shard, moving = (row[0], bool(row[1])) if row else (self.default_shard(workspace_id), False)
+        self._cache[workspace_id] = (shard, moving, now + SHARD_MAP_TTL)
+        return shard, moving
+
+    def placements(self) -> Dict[int, Tuple[int, bool]]:
+        rows = self.connect().execute("SELECT workspace_id, shard, moving FROM workspace_shards")
+        return {workspace_id: (shard, bool(moving)) for workspace_id, shard, moving in rows}
+
+    def set_placement(self, workspace_id: int, shard: int, moving: bool) -> None:
+        self.connect().execute(
+            "INSERT INTO workspace_shards (workspace_id, shard, moving) VALUES (?, ?, ?) "
+            "ON CONFLICT (workspace_id) DO UPDATE SET shard = excluded.shard, moving = excluded.moving",
+            (workspace_id, shard, int(moving)),
+        )
+        self._cache.pop(workspace_id, None)
+
+    def place(self, workspace_id: int) -> None:
+        """
+        记录新建工作区的分片，之后调整 SHARD_COUNT 不影响已有工作区
+
+        失败时只记录日志：没有记录的工作区按默认规则放置，与要记录的分片相同，调整 SHARD_COUNT 前须先执行 split
+        """
+        try:
+            self.connect().execute(
+                "INSERT OR IGNORE INTO workspace_shards (workspace_id, shard, moving) VALUES (?, ?, 0)",
+                (workspace_id, self.default_shard(workspace_id)),
+            )
+        except sqlite3.Error:
+            logger.exception("shard_place_failed", extra={"workspace_id": workspace_id})
+
+    def next_id(self, name: str) -> int:
+        """分配 name 序列的下一个 ID；每 SHARD_ID_BLOCK 个 ID 访问一次分片目录"""
+        connection = self.connect()
+        current, end = self._blocks.get(name, (0, 0))
+        if current >= end:
+            end = connection.execute(
+                "INSERT INTO shard_sequences (name, next) VALUES (:name, 1 + :block) "
+                "ON CONFLICT (name) DO UPDATE SET next = next + :block RETURNING next",
+                {"name": name, "block": SHARD_ID_BLOCK},
+            ).fetchone()[0]
+            current = end - SHARD_ID_BLOCK
+        self._blocks[name] = (current + 1, end)
+        return current
+
+    def seed(self, name: str, next_id: int) -> None:
+        """保证 name 序列之后分配的 ID 不小于 next_id"""
+        self.connect().execute(
+            "INSERT INTO shard_sequences (name, next) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET next = max(next, excluded.next)",
+            (name, next_id),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "shards": SHARD_COUNT,
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "cached": len(self._cache),
+            "checked_out": sum(engine.pool.checkedout() for engine in shard_engines),
+        }
+
+
+shard_directory = ShardDirectory()
+
+
+def global_id(name: str) -> Optional[Callable[[], int]]:
+    """分片表主键的默认值：分片模式下从分片目录分配全局唯一 ID，否则为 None（由数据库自增）"""
+    if not SHARDING_ENABLED:
+        return None
+
+    def next_id() -> int:
+        try:
+            return shard_directory.next_id(name)
+        except sqlite3.Error as exc:
+            logger.exception("shard_id_allocation_failed")
+            raise ShardDirectoryUnavailable() from exc
+
+    return next_id
+
+
+def shard_for(workspace_id: Optional[int]) -> Optional[int]:
+    """工作区所在的分片，未启用分片或 workspace_id 为 None 时返回 None；工作区正在迁移或分片目录不可用时返回 503"""
+    if not SHARDING_ENABLED or workspace_id is None:
+        return None
+    try:
+        shard, moving = shard_directory.lookup(int(workspace_id))
+    except sqlite3.Error as exc:
+        logger.exception("shard_lookup_failed")
+        raise ShardDirectoryUnavailable() from exc
+    if moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="工作区数据正在迁移，请稍后重试",
+            headers={"Retry-After": str(SHARD_RETRY_AFTER)},
+        )
+    return shard
+
+
+def use_workspace_shard(db: AsyncSession, workspace_id: int) -> None:
+    """工作区 ID 不在请求路径中时（如位于请求体），显式指定会话访问的分片"""
+    if SHARDING_ENABLED:
+        db.info["shard"] = shard_for(workspace_id)
+
+
+def shard_binds(shards=None) -> List[Tuple[int, object]]:
+    """各分片的 (分片, 同步引擎)，用作 bind_arguments={"bind": ...} 在指定分片上执行语句"""
+    return [(shard, shard_engines[shard].sync_engine) for shard in (range(SHARD_COUNT) if shards is None else shards)]
+
+
+def _touches_shard(mapper, clause) -> bool:
+    if mapper is not None:
+        return inspect(mapper).local_table.name in SHARDED_TABLES
+    if clause is not None:
+        return any(table.name in SHARDED_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+
+class ShardRoutingSession(Session):
+    """
+    按表选择连接：分片表的语句发往 info["shard"] 指定的分片，其余语句发往全局目录库
+
+    同一会话可同时访问目录库与一个分片，提交时两者各自提交（不是原子的），跨库的统计字段由 reconcile 修复。
+    显式传入 bind_arguments={"bind": ...} 的语句不做路由，用于在多个分片上扇出查询。
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, bind=None, **kw):
+        if bind is None and _touches_shard(mapper, clause):
+            shard = self.info.get("shard")
+            if shard is None:
+                raise ShardNotResolved("分片模式下该接口需通过包含工作区 ID 的路径访问")
+            return shard_engines[shard].sync_engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kw)
+
+
+def _sharded_columns() -> Dict[str, str]:
+    from core.database import BaseModel
+    return {
+        table.name: ", ".join(column.name for column in table.columns)
+        for table in BaseModel.metadata.sorted_tables if table.name in SHARDED_TABLES
+    }
+
+
+def _attach(connection: sqlite3.Connection, path, alias: str) -> None:
+    connection.execute("ATTACH DATABASE ? AS " + alias, (str(path),))
+
+
+def _copy_workspace(connection: sqlite3.Connection, source: str, target: str, workspace_id: int) -> int:
+    """在同一连接中把工作区的分片数据从 source 库复制到 target 库，返回复制的集合项数"""
+    columns = _sharded_columns()
+    statements = (
+        ("workspace_collections", "workspace_id = :workspace_id"),
+        ("workspace_collection_items",
+         f"collection_id IN (SELECT id FROM {source}.workspace_collections WHERE workspace_id = :workspace_id)"),
+    )
+    items = 0
+    for table, where in statements:
+        cursor = connection.execute(
+            f"INSERT INTO {target}.{table} ({columns[table]}) SELECT {columns[table]} FROM {source}.{table} WHERE {where}",
+            {"workspace_id": workspace_id},
+        )
+        if table == "workspace_collection_items":
+            items = cursor.rowcount
+    return items
+
+
+def move_workspace(workspace_id: int, target: int, wait: bool = True) -> int:
+    """
+    把工作区的分片数据迁移到 target 分片，返回迁移的集合项数
+
+    1. 目录中标记为迁移中，等待所有工作进程的映射缓存过期（此后该工作区的请求返回 503）及已选定分片的请求执行完
+    2. 在源分片连接上附加目标分片，同一事务内复制集合、集合项与统计并删除源数据（多库事务由 SQLite 保证原子性）
+    3. 目录中指向目标分片并清除迁移标记
+    步骤 2 之后中断时重新执行即可：源分片已无数据时只更新目录。全文索引由两个分片上的触发器同步。
+    """
+    source, moving = shard_directory.lookup(workspace_id)
+    shard_directory._cache.pop(workspace_id, None)
+    if source == target and not moving:
+        return 0
+    shard_directory.set_placement(workspace_id, source, moving=True)
+    if wait:
+        time.sleep(SHARD_MAP_TTL + SHARD_MOVE_DRAIN)
+
+    items = 0
+    if source != target:
+        connection = sqlite3.connect(shard_path(source), isolation_level=None, timeout=30.0)
+        try:
+            _attach(connection, shard_path(target), "target")
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                items = _copy_workspace(connection, "main", "target", workspace_id)
+                stats = _sharded_columns()["workspace_stats"]
+                connection.execute(
+                    f"INSERT OR REPLACE INTO target.workspace_stats ({stats}) "
+                    f"SELECT {stats} FROM main.workspace_stats WHERE workspace_id = ?",
+                    (workspace_id,),
+                )
+                # 先删除集合项，集合的删除触发器不再需要清理其下集合项的索引
+                connection.execute(
+                    "DELETE FROM main.workspace_collection_items WHERE collection_id IN "
+                    "(SELECT id FROM main.workspace_collections WHERE workspace_id = ?)",
+                    (workspace_id,),
+                )
+                connection.execute("DELETE FROM main.workspace_collections WHERE workspace_id = ?", (workspace_id,))
+                connection.execute("DELETE FROM main.workspace_stats WHERE workspace_id = ?", (workspace_id,))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+
+    shard_directory.set_placement(workspace_id, target, moving=False)
+    logger.info("workspace_moved", extra={"workspace_id": workspace_id, "source": source, "target": target, "items": items})
+    return items
+
+
+def shard_loads() -> Dict[int, Dict[int, int]]:
+    """各分片中每个工作区的集合与集合项数：{分片: {工作区: 行数}}"""
+    loads: Dict[int, Dict[int, int]] = {}
+    for shard in range(SHARD_COUNT):
+        connection = sqlite3.connect(shard_path(shard))
+        try:
+            rows = connection.execute(
+                "SELECT c.workspace_id, count(*) + coalesce(sum(c.item_count), 0) "
+                "FROM workspace_collections c GROUP BY c.workspace_id"
+            ).fetchall()
+        finally:
+            connection.close()
+        loads[shard] = dict(rows)
+    return loads
+
+
+def plan_rebalance(loads: Dict[int, Dict[int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    贪心地把工作区从行数最多的分片移到最少的分片，直到无法再缩小两者的差距，返回 [(工作区, 源分片, 目标分片)]
+
+    每次选择移动后两分片行数最接近的工作区；工作区只会被移动一次。
+    """
+    loads = {shard: dict(workspaces) for shard, workspaces in loads.items()}
+    totals = {shard: sum(workspaces.values()) for shard, workspaces in loads.items()}
+    moves: List[Tuple[int, int, int]] = []
+    moved = set()
+    while True:
+        heaviest = max(totals, key=totals.get)
+        lightest = min(totals, key=totals.get)
+        gap = totals[heaviest] - totals[lightest]
+        candidates = [
+            (abs(gap - 2 * rows), workspace_id, rows)
+            for workspace_id, rows in loads[heaviest].items()
+            if workspace_id not in moved and 0 < rows < gap
+        ]
+        if not candidates:
+            return moves
+        _, workspace_id, rows = min(candidates)
+        del loads[heaviest][workspace_id]
+        loads[lightest][workspace_id] = rows
+        totals[heaviest] -= rows
+        totals[lightest] += rows
+        moved.add(workspace_id)
+        moves.append((workspace_id, heaviest, lightest))
+
+
+def split_catalog() -> Dict[int, int]:
+    """
+    启用分片时的一次性迁移：把目录库中已有的分片表数据按默认放置复制到各分片，返回 {分片: 工作区数}
+
+    各分片须为空；目录库中的原表保留不动，确认无误后可手动删除。复制后按现有最大 ID 初始化全局 ID 序列。
+    """
+    from core.database import engine
+
+    connection = sqlite3.connect(engine.url.database, isolation_level=None, timeout=30.0)
+    placed: Dict[int, int] = {}
+    try:
+        workspace_ids = [row[0] for row in connection.execute("SELECT id FROM workspaces")]
+        for shard in range(SHARD_COUNT):
+            _attach(connection, shard_path(shard), "shard")
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if connection.execute("SELECT 1 FROM shard.workspace_collections LIMIT 1").fetchone():
+                    raise RuntimeError(f"分片 {shard} 已有数据")
+                ids = [workspace_id for workspace_id in workspace_ids if shard_directory.default_shard(workspace_id) == shard]
+                for workspace_id in ids:
+                    _copy_workspace(connection, "main", "shard", workspace_id)
+                    connection.execute(
+                        "INSERT INTO shard.workspace_stats (workspace_id, collection_count, item_count, updated_at, version) "
+                        "SELECT id, collection_count, item_count, updated_at, version FROM main.workspaces WHERE id = ?",
+                        (workspace_id,),
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            finally:
+                connection.execute("DETACH DATABASE shard")
+            for workspace_id in ids:
+                shard_directory.place(workspace_id)
+            placed[shard] = len(ids)
+        for table in ("workspace_collections", "workspace_collection_items"):
+            (max_id,) = connection.execute(f"SELECT coalesce(max(id), 0) FROM main.{table}").fetchone()
+            shard_directory.seed(table, max_id + 1)
+    finally:
+        connection.close()
+    return placed
+
+
+USAGE = "用法: WEB_SHARDS=<分片数> python -m core.sharding [status | split | move <工作区> <分片> | rebalance [--dry-run]]"
+
+
+def main(argv: List[str]) -> None:
+    from core.database import init_db
+    from app.routers import api_router  # noqa: F401  注册全部模型
+
+    if not SHARDING_ENABLED:
+        sys.exit(USAGE)
+    # 迁移与拆分时服务进程仍在运行，工具可以等待更久的写锁
+    shard_directory.busy_timeout = SHARD_TOOL_BUSY_TIMEOUT
+    asyncio.run(init_db())
+    command = argv[0] if argv else "status"
+    if command == "status":
+        placements = shard_directory.placements()
+        for shard, workspaces in shard_loads().items():
+            print(f"分片 {shard}: {len(workspaces)} 个工作区, {sum(workspaces.values())} 行")
+        moving = [workspace_id for workspace_id, (_, flag) in placements.items() if flag]
+        if moving:
+            print(f"迁移中: {moving}")
+    elif command == "split":
+        for shard, count in split_catalog().items():
+            print(f"分片 {shard}: 复制 {count} 个工作区")
+    elif command == "move" and len(argv) == 3:
+        print(f"迁移 {move_workspace(int(argv[1]), int(argv[2]))} 个集合项")
+    elif command == "rebalance":
+        moves = plan_rebalance(shard_loads())
+        for workspace_id, source, target in moves:
+            print(f"工作区 {workspace_id}: 分片 {source} -> {target}")
+            if "--dry-run" not in argv:
+                move_workspace(workspace_id, target)
+        if not moves:
+            print("各分片已均衡")
+    else:
+        sys.exit(USAGE)
+
+
+if __name__ == "__main__":
+    # 运维工具，见 USAGE；须在与服务相同的工作目录与 WEB_SHARDS 下执行
+    main(sys.argv[1:])
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用：同一时刻只执行一次，其余调用方等待并共享结果
+
+    共享结果会被多个调用方同时持有，调用方不应修改它。执行在独立任务中进行，
+    单个调用方被取消不会影响其他等待者。
+    """
+
+    def __init__(self):
+        self.executions = 0
+        self.shared = 0
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._calls.get(key)
+        if future is None:
+            self.executions += 1
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # 所有调用方都已取消时，避免出现 “exception was never retrieved” 警告
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> dict:
+        return {"executions": self.executions, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+# 服务层读取使用的合并器
+read_flight = SingleFlight()
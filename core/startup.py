@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+from typing import Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+# 导入应用与 lifespan 启动耗时之和的预算（秒），负载较高的 CI 可通过环境变量放宽
+STARTUP_BUDGET_SECONDS = float(os.environ.get("WEB_STARTUP_BUDGET_SECONDS", "3.0"))
+
+_MEASURE = """
+import json, time, asyncio
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def lifespan():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        main.app.openapi()
+        return ready, time.perf_counter()
+
+ready, documented = asyncio.run(lifespan())
+print(json.dumps({"import": imported - started, "lifespan": ready - imported, "openapi": documented - ready}))
+"""
+
+
+def measure(cwd: str) -> Dict[str, float]:
+    """在 cwd 中以全新的解释器测量 导入应用 / lifespan 启动 / 首次生成 OpenAPI 文档 的耗时（秒）"""
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    result = subprocess.run(
+        [sys.executable, "-c", _MEASURE], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,47 @@
+import os
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+# 本地媒体文件根目录，集合项的 image_path 均为相对该目录的路径
+MEDIA_ROOT = Path("./media")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def resolve_media_path(image_path: str) -> Path:
+    """将 image_path 解析为 MEDIA_ROOT 下的绝对路径，拒绝越界路径"""
+    root = MEDIA_ROOT.resolve()
+    path = (root / image_path).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"非法的媒体路径: {image_path}")
+    return path
+
+
+def file_digest(path: Path) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def media_stat(path: Path) -> Optional[os.stat_result]:
+    """在线程池中获取媒体文件的 stat，文件不存在时返回 None"""
+    try:
+        return await run_in_threadpool(os.stat, path)
+    except OSError:
+        return None
+
+
+async def media_digest(image_path: Optional[str]) -> Optional[str]:
+    """在线程池中计算媒体文件的内容哈希，文件不存在或路径非法时返回 None"""
+    if not image_path:
+        return None
+    try:
+        return await run_in_threadpool(file_digest, resolve_media_path(image_path))
+    except (ValueError, OSError):
+        return None
@@ -0,0 +1,247 @@
+import os
+import time
+import asyncio
+import importlib.util
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from core.singleflight import SingleFlight
+
+# 可用的缩略图边长（像素）
+THUMBNAIL_SIZES = (64, 256, 512)
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+THUMBNAIL_CACHE_DIR = Path("./media_cache/thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+THUMBNAIL_WORKERS = max((os.cpu_count() or 2) // 2, 1)
+
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+CacheKey = Tuple[str, int]
+
+
+def render_thumbnail(source: str, target: str, size: int) -> None:
+    """在子进程中解码、缩放并编码缩略图"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        # JPEG 等格式可直接以较低分辨率解码
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+        image.thumbnail((size, size))
+        image.save(target, format=THUMBNAIL_FORMAT, quality=80)
+
+
+class ThumbnailMetrics:
+    """缩略图生成指标"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+        self.generation_seconds_total = 0.0
+        self.generation_seconds_max = 0.0
+        self.queue_depth = 0
+
+    def observe_generation(self, seconds: float) -> None:
+        self.generated += 1
+        self.generation_seconds_total += seconds
+        self.generation_seconds_max = max(self.generation_seconds_max, seconds)
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "generated": self.generated,
+            "failed": self.failed,
+            "generation_seconds_avg": self.generation_seconds_total / self.generated if self.generated else 0.0,
+            "generation_seconds_max": self.generation_seconds_max,
+            "queue_depth": self.queue_depth,
+        }
+
+
+class ThumbnailCache:
+    """
+    按字节数限制容量的磁盘 LRU 缓存，键为 (内容哈希, 边长)
+
+    索引保存在内存中，首次访问时在线程中扫描目录、按文件修改时间重建；命中时刷新修改时间以便重启后保留访问顺序。
+    多个 worker 进程共享同一缓存目录，各自的索引可能过期，因此命中前以磁盘上的文件为准。
+    索引只在事件循环线程中修改，因此不需要加锁；文件的扫描、重命名与删除都在线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[CacheKey, int]" = OrderedDict()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def path_for(self, key: CacheKey) -> Path:
+        content_hash, size = key
+        return self.directory / content_hash[:2] / f"{content_hash}_{size}.{THUMBNAIL_FORMAT.lower()}"
+
+    def _scan(self) -> List[Tuple[float, CacheKey, int]]:
+        """扫描缓存目录，在线程中执行"""
+        if not self.directory.exists():
+            return []
+        files = []
+        for path in self.directory.glob("*/*_*.*"):
+            content_hash, _, size = path.stem.rpartition("_")
+            if not size.isdigit():
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, (content_hash, int(size)), stat.st_size))
+        return sorted(files)
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for _, key, nbytes in await asyncio.to_thread(self._scan):
+                if key not in self._entries:
+                    self._entries[key] = nbytes
+                    self.total_bytes += nbytes
+            self._loaded = True
+            await self._evict()
+
+    @staticmethod
+    def _touch(path: Path) -> Optional[int]:
+        """刷新文件修改时间并返回文件大小，文件不存在时返回 None"""
+        try:
+            os.utime(path)
+            return path.stat().st_size
+        except FileNotFoundError:
+            return None
+
+    async def get(self, key: CacheKey) -> Optional[Path]:
+        await self._ensure_loaded()
+        path = self.path_for(key)
+        # 文件可能已被其他 worker 淘汰，也可能由其他 worker 生成而不在本进程的索引中
+        nbytes = await asyncio.to_thread(self._touch, path)
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)
+        if nbytes is None:
+            return None
+        self._entries[key] = nbytes
+        self.total_bytes += nbytes
+        await self._evict(keep=key)
+        return path
+
+    async def temp_path_for(self, key: CacheKey) -> Path:
+        path = self.path_for(key)
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+    @staticmethod
+    def _replace(temp_path: Path, path: Path) -> int:
+        """将临时文件重命名为缓存文件并返回文件大小"""
+        os.replace(temp_path, path)
+        return path.stat().st_size
+
+    async def put(self, key: CacheKey, temp_path: Path) -> Path:
+        """将已生成的临时文件原子地移入缓存"""
+        await self._ensure_loaded()
+        path = self.path_for(key)
+        nbytes = await asyncio.to_thread(self._replace, temp_path, path)
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)
+        self._entries[key] = nbytes
+        self.total_bytes += nbytes
+        await self._evict(keep=key)
+        return path
+
+    @staticmethod
+    def _remove(paths: List[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    async def _evict(self, keep: Optional[CacheKey] = None) -> None:
+        # 先在事件循环线程中更新索引，再在线程中删除被淘汰的文件
+        victims = []
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, nbytes = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self.total_bytes -= nbytes
+            victims.append(self.path_for(key))
+            self.evictions += 1
+        if victims:
+            await asyncio.to_thread(self._remove, victims)
+
+
+class ThumbnailGenerator:
+    """按需生成缩略图：进程池渲染，相同缩略图的并发请求合并为一个任务"""
+
+    def __init__(self, cache: ThumbnailCache, workers: int = THUMBNAIL_WORKERS):
+        self.cache = cache
+        self.workers = workers
+        self.metrics = ThumbnailMetrics()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._flight = SingleFlight()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def get(self, source: Path, content_hash: str, size: int) -> Path:
+        """返回缩略图文件路径，缓存未命中时生成"""
+        key = (content_hash, size)
+        path = await self.cache.get(key)
+        if path is not None:
+            self.metrics.hits += 1
+            return path
+        self.metrics.misses += 1
+        return await self._flight.do(key, lambda: self._generate(source, key))
+
+    async def _generate(self, source: Path, key: CacheKey) -> Path:
+        temp_path = await self.cache.temp_path_for(key)
+        loop = asyncio.get_running_loop()
+        self.metrics.queue_depth += 1
+        started = time.perf_counter()
+        try:
+            await loop.run_in_executor(self._get_pool(), render_thumbnail, str(source), str(temp_path), key[1])
+        except BaseException:
+            self.metrics.failed += 1
+            # 不等待删除完成：请求被取消时也不应在事件循环中阻塞或再次挂起
+            loop.run_in_executor(None, ThumbnailCache._remove, [temp_path])
+            raise
+        finally:
+            self.metrics.queue_depth -= 1
+        self.metrics.observe_generation(time.perf_counter() - started)
+        return await self.cache.put(key, temp_path)
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics.snapshot(),
+            "coalesced": self._flight.shared,
+            "cache_bytes": self.cache.total_bytes,
+            "cache_entries": len(self.cache),
+            "cache_evictions": self.cache.evictions,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+thumbnail_generator = ThumbnailGenerator(ThumbnailCache(THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES))
@@ -0,0 +1,196 @@
+import logging
+import functools
+from time import perf_counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Server-Timing 中输出的阶段，app 为未归入其他阶段的剩余耗时
+SERVER_TIMING_PHASES = ("auth", "authz", "db", "serialize", "app")
+# 结构化耗时日志默认关闭，开启后只记录不低于阈值的请求
+TIMING_LOG_ENABLED = False
+TIMING_LOG_THRESHOLD_MS = 200.0
+# 未匹配到路由的请求统一使用此标签，避免任意路径造成标签基数膨胀
+UNMATCHED_ROUTE = "<unmatched>"
+
+logger = logging.getLogger("app.timing")
+
+
+class RequestTimer:
+    """
+    单个请求的分阶段耗时
+
+    phase() 统计的阶段可嵌套使用，嵌套时各阶段分别累计；SQL 耗时只在没有活动阶段时计入 db，
+    因此 auth、authz 中的查询归属各自阶段，db 仅反映处理函数自身的查询（SQL 耗时由 core.querylog 上报）。
+    parent 为外层请求（如批量请求）的计时器，SQL 同时计入外层请求。
+    """
+
+    __slots__ = ("started", "durations", "queries", "handler_end", "timings", "parent", "_depth")
+
+    def __init__(self, parent: Optional["RequestTimer"] = None):
+        self.started = perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.queries = 0
+        self.handler_end: Optional[float] = None
+        # 响应开始发送时计算的各阶段耗时（毫秒），供访问日志等读取
+        self.timings: Optional[Dict[str, float]] = None
+        self.parent = parent
+        self._depth = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def observe_query(self, seconds: float) -> None:
+        self.queries += 1
+        if self._depth == 0:
+            self.add("db", seconds)
+        if self.parent is not None:
+            self.parent.observe_query(seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = perf_counter()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.add(name, perf_counter() - started)
+
+    def finish(self, now: Optional[float] = None) -> Dict[str, float]:
+        """结束计时，返回各阶段耗时（毫秒），包含 app 与 total"""
+        now = perf_counter() if now is None else now
+        if self.handler_end is not None:
+            # 处理函数返回后到响应开始发送之间为响应模型校验与序列化
+            self.add("serialize", now - self.handler_end)
+            self.handler_end = None
+        total = now - self.started
+        result = {name: seconds * 1000 for name, seconds in self.durations.items()}
+        result["app"] = max(total * 1000 - sum(result.values()), 0.0)
+        result["total"] = total * 1000
+        self.timings = result
+        return result
+
+
+_current_timer: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return _current_timer.get()
+
+
+@contextmanager
+def phase(name: str):
+    """在当前请求的计时器上统计一个阶段，不在请求上下文中时不做任何事"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    if getattr(endpoint, "__timed__", False):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timer = _current_timer.get()
+            if timer is not None:
+                timer.handler_end = perf_counter()
+
+    wrapper.__timed__ = True
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """记录处理函数结束时间的路由，用于区分处理耗时与响应序列化耗时"""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+
+def route_template(scope: Scope) -> str:
+    """
+    请求对应的路由模板，如 ``/api/v1/workspaces/{workspace_id}``
+
+    由实际路径与路径参数还原，与路由的挂载方式无关；未匹配到路由时返回 UNMATCHED_ROUTE。
+    """
+    if "endpoint" not in scope:
+        return UNMATCHED_ROUTE
+    path_params = scope.get("path_params")
+    if not path_params:
+        return scope["path"]
+    pending = [(str(value), name) for name, value in path_params.items()]
+    segments = scope["path"].split("/")
+    for index, segment in enumerate(segments):
+        if pending and segment == pending[0][0]:
+            segments[index] = "{" + pending.pop(0)[1] + "}"
+    return "/".join(segments)
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    parts = [f"{name};dur={timings[name]:.2f}" for name in SERVER_TIMING_PHASES if name in timings]
+    parts.append(f"total;dur={timings['total']:.2f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    为每个 HTTP 请求建立计时器，在响应头中输出 Server-Timing
+
+    在外层请求中分发的子请求（批量请求）使用各自的计时器，SQL 同时计入外层请求的计时器。
+
+    log 为 True 时，耗时不低于 log_threshold_ms 的请求额外输出一条结构化日志。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        log: bool = TIMING_LOG_ENABLED,
+        log_threshold_ms: float = TIMING_LOG_THRESHOLD_MS,
+    ):
+        self.app = app
+        self.log = log
+        self.log_threshold_ms = log_threshold_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer(parent=_current_timer.get())
+        token = _current_timer.set(timer)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                timings = timer.finish()
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append("server-timing", format_server_timing(timings))
+                if self.log and timings["total"] >= self.log_threshold_ms:
+                    self._log(scope, message["status"], timer.queries, timings)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_timer.reset(token)
+
+    @staticmethod
+    def _log(scope: Scope, status_code: int, queries: int, timings: Dict[str, float]) -> None:
+        logger.info("request_timing", extra={
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route_template(scope),
+            "status": status_code,
+            "queries": queries,
+            **{f"{name}_ms": round(value, 3) for name, value in timings.items()},
+        })
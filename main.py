@@ -1,20 +1,44 @@
-import uvicorn
-
 from typing import cast
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, status, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import StatementError
 
+from app.auth.dependences import is_superuser_request
 from app.routers import api_router
-from core.database import init_db, db_session
+from app.workspace.services import WorkspaceStatsService
+from core.admission import AdmissionMiddleware, admission_controller
+from core.cache import response_cache
+from core.compression import CompressionMiddleware
+from core.database import engine, init_db, db_session
+from core.groupcommit import write_coalescer
+from core.idempotency import IdempotencyMiddleware, IdempotentReplay, idempotency_manager, idempotent_replay_handler
+from core.log import AccessLogMiddleware, setup_logging, shutdown_logging
+from core.metrics import MetricsMiddleware, default_registry, metrics_endpoint, pool_stats
+from core.openapi import install_openapi_cache
+from core.profiling import ProfilingMiddleware, background_sampler
+from core.querylog import QueryLogMiddleware, instrument_engine
+from core.ratelimit import RateLimitMiddleware, rate_limiter
+from core.sharding import (
+    SHARDING_ENABLED, ShardDirectoryUnavailable, ShardNotResolved,
+    shard_directory, shard_directory_unavailable_handler, shard_engines, shard_not_resolved_handler,
+)
+from core.singleflight import read_flight
+from core.thumbnails import thumbnail_generator
+from core.timing import ServerTimingMiddleware
+
+# 结构化日志：记录先进入内存队列，由后台线程批量写出
+log_handler = setup_logging()
 
 
 @asynccontextmanager
 async def lifespan(app_: FastAPI):
-    # 初始化数据库
-    await init_db()
+    # 初始化数据库；升级已有数据库补加了统计列时按实际数据重新计算
+    if await init_db():
+        async with db_session() as async_session:
+            await WorkspaceStatsService.reconcile(async_session)
 
     # 创建默认权限
     async with db_session() as async_session:
@@ -22,6 +46,10 @@ async def lifespan(app_: FastAPI):
 
     yield
 
+    thumbnail_generator.shutdown()
+    background_sampler.stop()
+    shutdown_logging()
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -31,10 +59,31 @@ app = FastAPI(lifespan=lifespan)
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"message": exc.detail}
+        content={"message": exc.detail},
+        headers=exc.headers
     )
 
 
+# 相同 Idempotency-Key 的重试直接返回首次执行保存的响应
+app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
+
+# 分片模式下无法从请求路径确定工作区的接口访问分片表时返回 400
+app.add_exception_handler(ShardNotResolved, shard_not_resolved_handler)
+
+# 分片目录等待写锁超时时返回 503，不长时间阻塞事件循环
+app.add_exception_handler(ShardDirectoryUnavailable, shard_directory_unavailable_handler)
+if SHARDING_ENABLED:
+    app.add_exception_handler(StatementError, shard_directory_unavailable_handler)
+
+# 保存占用了 Idempotency-Key 的请求的响应，位于压缩之内以保存未压缩的响应体
+app.add_middleware(IdempotencyMiddleware)
+
+# 限流响应头（RateLimit-*），限流策略由各路由的依赖声明
+app.add_middleware(RateLimitMiddleware)
+
+# 准入控制：按请求类别限制并发，过载时快速返回 503；位于 CORS 之内，使 503 响应也带有 CORS 头
+app.add_middleware(AdmissionMiddleware)
+
 # 配置 CORS
 origins = [
     "*"
@@ -48,9 +97,49 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有请求头
 )
 
+# 响应压缩（gzip，安装 zstandard / brotli 后自动支持 zstd / br）
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+# SQL 事件（分阶段计时、慢查询日志）；按请求统计 SQL，重复语句达到阈值时告警（疑似 N+1）
+instrument_engine(engine)
+for shard_engine in shard_engines:
+    instrument_engine(shard_engine)
+app.add_middleware(QueryLogMiddleware)
+
+# 请求指标，需位于 ServerTimingMiddleware 之内以读取每个请求的 SQL 条数
+app.add_middleware(MetricsMiddleware)
+
+# 访问日志，需位于 ServerTimingMiddleware 之内以读取分阶段耗时
+app.add_middleware(AccessLogMiddleware)
+
+# 分阶段耗时（Server-Timing 响应头），放在最外层以覆盖完整的请求处理
+app.add_middleware(ServerTimingMiddleware)
+
+# 按需剖析单个请求（X-Profile: 1，限超级用户或持有 PROFILE_SECRET），位于计时之外以免计入剖析开销
+app.add_middleware(ProfilingMiddleware, authorize=is_superuser_request)
+
+# Prometheus 指标，各组件已有的统计在抓取时读取
+default_registry.register_stats("db_pool", "SQLAlchemy connection pool", lambda: pool_stats(engine.pool))
+default_registry.register_stats("response_cache", "Serialized response cache", response_cache.stats)
+default_registry.register_stats("read_flight", "Coalesced service reads", read_flight.stats)
+default_registry.register_stats("thumbnails", "Thumbnail generation", thumbnail_generator.stats)
+default_registry.register_stats("log", "Queued log records", log_handler.stats)
+default_registry.register_stats("rate_limit", "Rate limit decisions", rate_limiter.stats)
+default_registry.register_stats("group_commit", "Coalesced write transactions", write_coalescer.stats)
+default_registry.register_stats("idempotency", "Idempotency-Key claims and replays", idempotency_manager.stats)
+default_registry.register_stats("sharding", "Workspace shard directory", shard_directory.stats)
+default_registry.register_stats("admission", "Admission control limits and queues", admission_controller.stats)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 # 注册路由
 app.include_router(api_router, prefix="/api/v1")
 
+# OpenAPI 文档按应用版本与代码指纹缓存到磁盘，可在部署时以 python -m core.openapi 预先生成
+install_openapi_cache(app)
 
+
+# 本地开发入口（单进程、自动重载）；生产环境使用 python -m core.server（多进程、预加载、平滑退出）
 if __name__ == '__main__':
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8002, reload=True)
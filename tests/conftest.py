@@ -0,0 +1,60 @@
+import os
+import tempfile
+import itertools
+
+import httpx
+import pytest
+
+# 数据库、限流与缓存文件均为相对于工作目录的路径（引擎在导入时即解析为绝对路径），导入应用之前切换到临时目录
+os.chdir(tempfile.mkdtemp(prefix="tests-"))
+
+from main import app  # noqa: E402
+from core.database import db_session, engine, init_db  # noqa: E402
+from app.user.models import User  # noqa: E402
+from app.auth.dependences import create_access_token  # noqa: E402
+
+_usernames = (f"user{n}" for n in itertools.count(1))
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    # 所有测试共用一个事件循环，连接池中的连接可在测试之间复用
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def database(anyio_backend):
+    await init_db()
+    yield
+    await engine.dispose()
+
+
+async def create_user(superuser: bool = False) -> User:
+    """创建新用户；每个测试使用不同用户，互不影响限流与授权缓存"""
+    async with db_session() as db:
+        user = User(username=next(_usernames), hashed_password="x", is_superuser=superuser)
+        db.add(user)
+        await db.commit()
+    return user
+
+
+def client_for(user: User) -> httpx.AsyncClient:
+    """以指定用户身份访问应用的客户端"""
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://test",
+        headers={"Authorization": f"Bearer {create_access_token({'sub': user.username})}"},
+    )
+
+
+@pytest.fixture
+async def client(database):
+    async with client_for(await create_user()) as client:
+        yield client
+
+
+@pytest.fixture
+async def workspace_id(client):
+    response = await client.post("/api/v1/workspaces/user-workspaces", json={"name": "test"})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
@@ -0,0 +1,32 @@
+import pytest
+
+from core.admission import admission_controller
+from core.metrics import HTTP_REQUESTS
+
+pytestmark = pytest.mark.anyio
+
+COLLECTIONS_ROUTE = "/api/v1/workspaces/user-workspaces/{workspace_id}/collections"
+
+
+async def test_subrequests_are_counted_and_admitted_individually(client, workspace_id):
+    created = HTTP_REQUESTS.value("POST", COLLECTIONS_ROUTE, "201")
+    listed = HTTP_REQUESTS.value("GET", COLLECTIONS_ROUTE, "200")
+    writes = admission_controller.limiters["write"].admitted
+    reads = admission_controller.limiters["read"].admitted
+
+    path = f"/workspaces/user-workspaces/{workspace_id}/collections"
+    response = await client.post("/api/v1/batch", json={"requests": [
+        {"method": "POST", "path": path, "body": {"name": "a"}},
+        {"method": "POST", "path": path, "body": {"name": "b"}},
+        {"method": "GET", "path": path},
+    ]})
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    assert [item["status"] for item in data] == [201, 201, 200]
+    assert "server-timing" in data[0]["headers"]
+
+    assert HTTP_REQUESTS.value("POST", COLLECTIONS_ROUTE, "201") == created + 2
+    assert HTTP_REQUESTS.value("GET", COLLECTIONS_ROUTE, "200") == listed + 1
+    # 写类子请求各占一个 write 名额，读类子请求随批量请求本身的 bulk 名额执行
+    assert admission_controller.limiters["write"].admitted == writes + 2
+    assert admission_controller.limiters["read"].admitted == reads
@@ -0,0 +1,56 @@
+import pytest
+
+from core.database import db_session
+from core.querylog import assert_max_queries
+from app.permissions.models import WorkspaceRolePermissions
+from app.workspace.models import WorkspaceRole, WorkspaceUser
+
+from conftest import client_for, create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def join_workspace(workspace_id: int, paths) -> "httpx.AsyncClient":
+    """新用户以只有指定路径读取权限的角色加入工作区"""
+    user = await create_user()
+    async with db_session() as db:
+        role = WorkspaceRole(name="auditor", workspace_id=workspace_id)
+        db.add(role)
+        await db.flush()
+        db.add_all(
+            WorkspaceRolePermissions(workspace_role_id=role.id, path=path, action="read", allow=True) for path in paths
+        )
+        db.add(WorkspaceUser(user_id=user.id, workspace_id=workspace_id, role_id=role.id))
+        await db.commit()
+    return client_for(user)
+
+
+async def test_search_hides_items_without_items_read_grant(client, workspace_id):
+    response = await client.post(f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections", json={"name": "apples"})
+    collection_id = response.json()["id"]
+    await client.post(
+        f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections/{collection_id}/items", json={"name": "apple pie"}
+    )
+
+    async with await join_workspace(workspace_id, [f"/workspaces/{workspace_id}/collections"]) as auditor:
+        response = await auditor.get("/api/v1/search", params={"q": "apple"})
+    assert response.status_code == 200
+    assert [hit["kind"] for hit in response.json()["data"]] == ["collection"]
+
+    items_path = f"/workspaces/{workspace_id}/collections/{collection_id}/items"
+    async with await join_workspace(workspace_id, [items_path]) as reader:
+        response = await reader.get("/api/v1/search", params={"q": "apple"})
+    assert [hit["name"] for hit in response.json()["data"]] == ["apple pie"]
+
+
+async def test_search_loads_grants_in_constant_queries(database):
+    owner = await create_user()
+    async with client_for(owner) as client:
+        for n in range(6):
+            response = await client.post("/api/v1/workspaces/user-workspaces", json={"name": f"tenant {n}"})
+            workspace_id = response.json()["id"]
+            await client.post(f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections", json={"name": f"pear {n}"})
+        # 认证 1 条、成员关系 1 条、授权 1 条、集合 1 条、全文检索 1 条
+        with assert_max_queries(5):
+            response = await client.get("/api/v1/search", params={"q": "pear"})
+    assert len(response.json()["data"]) == 6
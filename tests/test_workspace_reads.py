@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from core import storage
+from core.database import db_session
+from core.querylog import assert_max_queries
+from app.workspace.services import WorkspaceCollectionService
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_identical_reads_share_one_query(client, workspace_id):
+    response = await client.post(f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections", json={"name": "c"})
+    collection_id = response.json()["id"]
+    base = f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections/{collection_id}/items"
+    for n in range(3):
+        await client.post(base, json={"name": f"item {n}"})
+
+    async def read():
+        async with db_session() as db:
+            return await WorkspaceCollectionService.get_collection_items(db, collection_id, version=3)
+
+    with assert_max_queries(1):
+        results = await asyncio.gather(*(read() for _ in range(20)))
+    assert all(result is results[0] for result in results)
+    assert [item.name for item in results[0]] == ["item 0", "item 1", "item 2"]
+
+
+async def test_reads_of_different_versions_do_not_share_a_query(client, workspace_id):
+    async def read(version):
+        async with db_session() as db:
+            return await WorkspaceCollectionService.get_collections(db, workspace_id, version=version)
+
+    with assert_max_queries(2) as recorder:
+        await asyncio.gather(read(0), read(0), read(1))
+    assert recorder.count == 2
+
+
+async def test_expanded_workspace_detail_query_count_is_bounded(client, workspace_id):
+    base = f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections"
+    for n in range(5):
+        response = await client.post(base, json={"name": f"collection {n}"})
+        for m in range(3):
+            await client.post(f"{base}/{response.json()['id']}/items", json={"name": f"item {m}"})
+
+    # 认证 1 条，路由与服务中的授权各 2 条，工作区、集合、角色、集合项各 1 条，与集合数量无关
+    with assert_max_queries(9):
+        response = await client.get(
+            f"/api/v1/workspaces/{workspace_id}", params={"expand": "collections,collections.items,roles"}
+        )
+    assert response.status_code == 200
+    detail = response.json()
+    assert len(detail["collections"]) == 5
+    assert all(len(collection["items"]) == 3 for collection in detail["collections"])
+
+
+async def test_image_etag_changes_when_file_is_replaced(client, workspace_id):
+    media = storage.MEDIA_ROOT / f"replaced-{workspace_id}.bin"
+    media.parent.mkdir(parents=True, exist_ok=True)
+    media.write_bytes(b"original")
+    base = f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections"
+    collection_id = (await client.post(base, json={"name": "images"})).json()["id"]
+    response = await client.post(f"{base}/{collection_id}/items", json={"name": "i", "image_path": media.name})
+    url = f"{base}/{collection_id}/items/{response.json()['id']}/image"
+
+    etag = (await client.get(url)).headers["etag"]
+    assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+
+    # 入库的内容哈希不变，但文件已被替换：不能再应答 304 或按旧 ETag 返回区间
+    media.write_bytes(b"replaced with new content")
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content == b"replaced with new content"
+    assert response.headers["etag"] != etag
+    assert (await client.get(url, headers={"Range": "bytes=0-3", "If-Range": etag})).status_code == 200
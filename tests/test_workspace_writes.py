@@ -0,0 +1,35 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_create_collection_creates_once(client, workspace_id):
+    url = f"/api/v1/workspaces/user-workspaces/{workspace_id}/collections"
+    responses = await asyncio.gather(*(client.post(url, json={"name": "race"}) for _ in range(10)))
+    assert Counter(response.status_code for response in responses) == {201: 1, 409: 9}
+
+    response = await client.get(url)
+    assert [collection["name"] for collection in response.json()] == ["race"]
+    assert (await client.get(f"/api/v1/workspaces/{workspace_id}/overview")).json()["collection_count"] == 1
+
+
+async def test_delete_missing_or_foreign_rows_returns_404(client, workspace_id):
+    base = "/api/v1/workspaces/user-workspaces"
+    other_id = (await client.post(base, json={"name": "other"})).json()["id"]
+    collection_id = (await client.post(f"{base}/{other_id}/collections", json={"name": "c"})).json()["id"]
+    item_id = (await client.post(f"{base}/{other_id}/collections/{collection_id}/items", json={"name": "i"})).json()["id"]
+
+    assert (await client.delete(f"{base}/{workspace_id}/collections/{collection_id}/items/999999")).status_code == 404
+    # 其他工作区的集合项与集合不能经由本工作区的路由删除
+    assert (await client.delete(f"{base}/{workspace_id}/collections/{collection_id}/items/{item_id}")).status_code == 404
+    assert (await client.delete(f"{base}/{workspace_id}/collections/{collection_id}")).status_code == 404
+    assert (await client.delete(f"{base}/{workspace_id}/collections/999999")).status_code == 404
+
+    overview = (await client.get(f"/api/v1/workspaces/{other_id}/overview")).json()
+    assert (overview["collection_count"], overview["item_count"]) == (1, 1)
+
+    assert (await client.delete(f"{base}/{other_id}/collections/{collection_id}/items/{item_id}")).status_code == 200
+    assert (await client.delete(f"{base}/{other_id}/collections/{collection_id}")).status_code == 200